@@ -0,0 +1,48 @@
+"""
+Benchmarks for the polls app.
+
+Every benchmark is a module run from the project root, for example
+``python -m benchmarks.vote_shards``. It works on its own SQLite database
+in a temporary directory, so the development database is never touched.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+
+def setup(database=None):
+    """
+    Set up Django on a fresh, migrated benchmark database.
+
+    Return the path of the database file.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    if database is None:
+        directory = tempfile.mkdtemp(prefix='polls-bench-')
+        database = os.path.join(directory, 'db.sqlite3')
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+    settings.ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return database
+
+
+def teardown(database):
+    """
+    Remove a benchmark database created by setup().
+    """
+    from django.db import connections
+    connections.close_all()
+    shutil.rmtree(os.path.dirname(database), ignore_errors=True)
+
+
+def report(benchmark, **results):
+    """
+    Print one result of a benchmark as a line of JSON.
+    """
+    print(json.dumps(dict(benchmark=benchmark, **results), sort_keys=True))
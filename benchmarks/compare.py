@@ -0,0 +1,74 @@
+"""
+Compare two benchmarks.endpoints --output files, from a base and a new
+commit, and exit with status 1 if any endpoint regressed.
+
+    python -m benchmarks.compare BASE NEW [--threshold 10]
+
+An endpoint regressed if its throughput fell or its p95 latency rose by
+more than --threshold percent, or if it makes more queries per request.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks import report
+
+
+def change(base, new):
+    """
+    Return the change from base to new in percent.
+    """
+    if not base or new is None:
+        return None
+    return round((new - base) / base * 100, 1)
+
+
+def compare(base, new, threshold):
+    """
+    Report every endpoint measured in both runs. Return whether any of
+    them regressed.
+    """
+    base_results = {(result['mode'], result['endpoint']): result
+                    for result in base['results']}
+    regressed = False
+    for result in new['results']:
+        before = base_results.get((result['mode'], result['endpoint']))
+        if before is None or 'latency_ms' not in result \
+                or 'latency_ms' not in before:
+            continue
+        throughput = change(before['requests_per_second'],
+                            result['requests_per_second'])
+        p95 = change(before['latency_ms']['p95'], result['latency_ms']['p95'])
+        queries = None
+        old_queries = before.get('queries_per_request')
+        new_queries = result.get('queries_per_request')
+        if old_queries is not None and new_queries is not None:
+            queries = round(new_queries - old_queries, 2)
+        regression = any((
+            throughput is not None and throughput < -threshold,
+            p95 is not None and p95 > threshold,
+            queries is not None and queries > 0))
+        regressed = regressed or regression
+        report('compare', mode=result['mode'], endpoint=result['endpoint'],
+               base=base.get('commit'), new=new.get('commit'),
+               requests_per_second=result['requests_per_second'],
+               requests_per_second_change_percent=throughput,
+               p95_ms=result['latency_ms']['p95'], p95_change_percent=p95,
+               queries_change=queries, regression=regression)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10,
+                        help="Percent of allowed change.")
+    args = parser.parse_args()
+    with open(args.base) as base, open(args.new) as new:
+        regressed = compare(json.load(base), json.load(new), args.threshold)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+Throughput, latency and queries of the index, detail, results and vote
+endpoints, over seeded data of a chosen size. Needs gunicorn for --http.
+
+    python -m benchmarks.endpoints [--questions 1000] [--choices 4]
+        [--users 200] [--votes 20000] [--requests 500] [--http]
+        [--seconds 10] [--processes 2] [--connections 50] [--workers 2]
+        [--output results.json]
+
+Every endpoint is first driven through the Django test client in this
+process. With --http it is then loaded over HTTP by --processes client
+processes with --connections keep-alive connections each, against
+gunicorn with --workers worker processes; the queries per request then
+come from the /metrics of one worker. Results are printed as JSON lines
+and, with --output, saved with the current commit for benchmarks.compare.
+The data is made from a fixed random seed, so runs on different commits
+measure the same thing.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.http import (
+    fetch, serve_wsgi, session_cookies, start_server, stop_server,
+    without_rate_limits)
+
+ENDPOINTS = ('index', 'detail', 'results', 'vote')
+METRICS_TOKEN = 'benchmark'
+
+
+def serve(database, workers, port):
+    """
+    Serve the site with gunicorn and metrics on.
+    """
+    without_rate_limits()
+    os.environ['METRICS_ENABLED'] = 'True'
+    os.environ['METRICS_TOKEN'] = METRICS_TOKEN
+    setup(database)
+    serve_wsgi(port, workers=workers, threads=8)
+
+
+def seed(questions, choices, users, votes):
+    """
+    Insert questions published over the last 30 days, half of them still
+    open, with their choices, users and votes of random users.
+    """
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+    from polls.models import Choice, Question, Vote
+
+    rng = random.Random(0)
+    now = timezone.now()
+    with transaction.atomic():
+        new = []
+        for number in range(questions):
+            pub_date = now - datetime.timedelta(
+                minutes=rng.randrange(60, 30 * 24 * 60))
+            end_date = pub_date + datetime.timedelta(
+                days=rng.randrange(1, 60))
+            question = Question(question_text='Question {}?'.format(number),
+                                pub_date=pub_date, end_date=end_date)
+            question.status = question.status_at(now)
+            new.append(question)
+        Question.objects.bulk_create(new, batch_size=500)
+        question_ids = list(Question.objects.values_list('pk', flat=True))
+        Choice.objects.bulk_create(
+            (Choice(question_id=pk, choice_text='Choice {}'.format(number))
+             for pk in question_ids for number in range(choices)),
+            batch_size=500)
+        User.objects.bulk_create(
+            (User(username='user{}'.format(number))
+             for number in range(users)), batch_size=500)
+        user_ids = list(User.objects.values_list('pk', flat=True))
+        choice_ids = {}
+        for question_id, pk in Choice.objects.values_list('question_id',
+                                                          'pk'):
+            choice_ids.setdefault(question_id, []).append(pk)
+        pairs = rng.sample(range(len(user_ids) * len(question_ids)),
+                           min(votes, len(user_ids) * len(question_ids)))
+        rows = []
+        counts = {}
+        for pair in pairs:
+            user_id = user_ids[pair // len(question_ids)]
+            question_id = question_ids[pair % len(question_ids)]
+            choice_id = rng.choice(choice_ids[question_id])
+            rows.append(Vote(user_id=user_id, question_id=question_id,
+                             choice_id=choice_id))
+            counts[choice_id] = counts.get(choice_id, 0) + 1
+        Vote.objects.bulk_create(rows, batch_size=500)
+        Choice.objects.add_votes(counts)
+
+
+def targets():
+    """
+    Return the paths requested of each endpoint, and for vote the forms.
+    """
+    from django.urls import reverse
+    from polls.models import Choice, Question
+
+    published = list(Question.objects.published()
+                     .values_list('pk', flat=True))
+    open_ids = set(Question.objects.open_for_voting()
+                   .values_list('pk', flat=True))
+    votes = [(reverse('polls:vote', args=(question_id,)), {'choice': pk})
+             for question_id, pk in Choice.objects.filter(
+                 question_id__in=open_ids).values_list('question_id', 'pk')]
+    return {
+        'index': [(reverse('polls:index'), None)],
+        'detail': [(reverse('polls:detail', args=(pk,)), None)
+                   for pk in published],
+        'results': [(reverse('polls:results', args=(pk,)), None)
+                    for pk in published],
+        'vote': votes,
+    }
+
+
+def summary(timings, errors, seconds):
+    """
+    Return throughput and latency percentiles of request timings in seconds.
+    """
+    timings = sorted(timings)
+    if not timings:
+        return {'requests': 0, 'errors': errors}
+
+    def percentile(q):
+        timing = timings[min(int(len(timings) * q), len(timings) - 1)]
+        return round(timing * 1000, 2)
+
+    return {'requests': len(timings), 'errors': errors,
+            'requests_per_second': round(len(timings) / seconds, 1),
+            'latency_ms': {'mean': round(statistics.mean(timings) * 1000, 2),
+                           'p50': percentile(0.5), 'p95': percentile(0.95),
+                           'p99': percentile(0.99)}}
+
+
+def client_run(endpoint, requests, count):
+    """
+    Request an endpoint count times through the test client.
+    """
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    client.force_login(User.objects.order_by('pk').first())
+    rng = random.Random(0)
+    expected = 302 if endpoint == 'vote' else 200
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    timings = []
+    errors = 0
+    start = time.perf_counter()
+    with connection.execute_wrapper(count_query):
+        for number in range(count):
+            path, form = rng.choice(requests)
+            began = time.perf_counter()
+            response = client.post(path, form) if form is not None \
+                else client.get(path)
+            timings.append(time.perf_counter() - began)
+            if response.status_code != expected:
+                errors += 1
+    result = summary(timings, errors, time.perf_counter() - start)
+    result['queries_per_request'] = round(queries[0] / count, 2)
+    return result
+
+
+async def connection_load(port, requests, cookie, token, deadline, seed):
+    """
+    Send requests over one keep-alive connection until the deadline.
+    """
+    rng = random.Random(seed)
+    timings = []
+    errors = 0
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < deadline:
+            path, form = rng.choice(requests)
+            began = time.perf_counter()
+            if form is None:
+                status, body = await fetch(reader, writer, 'GET', path,
+                                           {'Cookie': cookie})
+            else:
+                status, body = await fetch(
+                    reader, writer, 'POST', path, {'Cookie': cookie},
+                    dict(form, csrfmiddlewaretoken=token))
+            timings.append(time.perf_counter() - began)
+            if status != (200 if form is None else 302):
+                errors += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors += 1
+    finally:
+        writer.close()
+    return timings, errors
+
+
+def process_load(job):
+    """
+    Run the connections of one client process. Return timings and errors.
+    """
+    port, requests, cookies, token, seconds, number = job
+
+    async def load():
+        deadline = time.perf_counter() + seconds
+        return await asyncio.gather(*(
+            connection_load(port, requests, cookie, token, deadline,
+                            number * len(cookies) + index)
+            for index, cookie in enumerate(cookies)))
+
+    timings = []
+    errors = 0
+    for connection_timings, connection_errors in asyncio.run(load()):
+        timings.extend(connection_timings)
+        errors += connection_errors
+    return timings, errors
+
+
+def http_run(port, requests, cookies, token, args):
+    """
+    Load an endpoint over HTTP from several client processes.
+    """
+    jobs = [(port, requests, cookies[number::args.processes], token,
+             args.seconds, number) for number in range(args.processes)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(process_load, jobs)
+    seconds = time.perf_counter() - start
+    return summary([timing for timings, errors in results
+                    for timing in timings],
+                   sum(errors for timings, errors in results), seconds)
+
+
+async def scrape_queries(port):
+    """
+    Return the SQL queries per request of each view from /metrics.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        status, body = await fetch(
+            reader, writer, 'GET', '/metrics',
+            {'Authorization': 'Bearer {}'.format(METRICS_TOKEN)})
+    finally:
+        writer.close()
+    sums = {}
+    counts = {}
+    for line in body.decode().splitlines():
+        for name, found in (('view_sql_queries_sum', sums),
+                            ('view_sql_queries_count', counts)):
+            if line.startswith(name + '{'):
+                view = line.split('"')[1]
+                found[view] = float(line.rsplit(' ', 1)[1])
+    return {view: round(sums[view] / counts[view], 2)
+            for view in counts if counts[view]}
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--choices', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--votes', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=500,
+                        help="Test client requests per endpoint.")
+    parser.add_argument('--http', action='store_true')
+    parser.add_argument('--seconds', type=float, default=10,
+                        help="HTTP load time per endpoint.")
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--connections', type=int, default=50,
+                        help="Connections per client process.")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS,
+                        default=list(ENDPOINTS))
+    parser.add_argument('--output')
+    parser.add_argument('--serve', nargs=3,
+                        metavar=('DATABASE', 'WORKERS', 'PORT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]), int(args.serve[2]))
+        return
+    database = setup()
+    results = []
+    try:
+        from django.conf import settings
+        from django.contrib.auth.models import User
+
+        settings.VOTE_RATE_LIMIT_IP = settings.VOTE_RATE_LIMIT_USER = 0
+        seed(args.questions, args.choices, args.users, args.votes)
+        requests = targets()
+        data = {'questions': args.questions, 'choices': args.choices,
+                'users': args.users, 'votes': args.votes}
+        for endpoint in args.endpoints:
+            result = dict(mode='client', endpoint=endpoint, **data,
+                          **client_run(endpoint, requests[endpoint],
+                                       args.requests))
+            report('endpoints', **result)
+            results.append(result)
+        if args.http:
+            from django.db import connections
+            connections.close_all()
+            cookies, token = session_cookies(User.objects.order_by('pk')[
+                :args.processes * args.connections])
+            cookies = (cookies * (args.processes * args.connections))[
+                :args.processes * args.connections]
+            server, port = start_server('benchmarks.endpoints', database,
+                                        args.workers)
+            try:
+                http_results = []
+                for endpoint in args.endpoints:
+                    http_results.append(dict(
+                        mode='http', endpoint=endpoint, **data,
+                        **http_run(port, requests[endpoint], cookies, token,
+                                   args)))
+                queries = asyncio.run(scrape_queries(port))
+                for result in http_results:
+                    result['queries_per_request'] = queries.get(
+                        'polls:' + result['endpoint'])
+                    report('endpoints', **result)
+                    results.append(result)
+            finally:
+                stop_server(server)
+    finally:
+        teardown(database)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'commit': commit(), 'options': vars(args),
+                       'results': results}, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Memory use of the streaming export of five million votes, against building
+the whole export in memory first.
+
+    python -m benchmarks.export_memory [--votes 5000000] [--eager]
+
+Memory is the growth of the peak resident set size of the process, so the
+streaming export runs first and the eager one, if asked for, last.
+"""
+import argparse
+import resource
+import time
+
+from benchmarks import report, setup, teardown
+
+QUESTIONS = 100
+CHOICES = 4
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_votes(count):
+    """
+    Insert count votes spread over QUESTIONS questions, one vote per voter
+    and question, with SQL that generates the rows in the database.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    now = timezone.now()
+    voters = -(-count // QUESTIONS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_question (id, question_text, pub_date, "
+            "end_date, current_vote, version, modified) "
+            "SELECT i, 'Question ' || i, %s, %s, '', 0, %s FROM n",
+            [QUESTIONS, now, now, now])
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_choice (id, question_id, choice_text, votes) "
+            "SELECT q.id * %s + n.i, q.id, 'Choice ' || n.i, 0 "
+            "FROM polls_question q, n",
+            [CHOICES - 1, CHOICES])
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO auth_user (id, password, is_superuser, username, "
+            "first_name, last_name, email, is_staff, is_active, date_joined) "
+            "SELECT i, '', 0, 'voter' || i, '', '', '', 0, 1, %s FROM n",
+            [voters, now])
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_vote (user_id, question_id, choice_id) "
+            "SELECT i / %s + 1, i %% %s + 1, (i %% %s + 1) * %s + i %% %s "
+            "FROM n",
+            [count - 1, QUESTIONS, QUESTIONS, QUESTIONS, CHOICES, CHOICES])
+
+
+def staff_client():
+    """
+    Return a test client logged in as a staff user.
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    client = Client()
+    client.force_login(User.objects.create_user(
+        username='analyst', password='secret', is_staff=True))
+    return client
+
+
+def stream(client, format):
+    """
+    Read the streaming export of votes and return (rows, bytes).
+    """
+    from django.urls import reverse
+
+    response = client.get(reverse('polls:api-export', args=('votes', format)))
+    rows = size = 0
+    for chunk in response.streaming_content:
+        rows += chunk.count(b'\n')
+        size += len(chunk)
+    response.close()
+    return rows, size
+
+
+def eager(format):
+    """
+    Build the export of votes as one string from a list of all rows, the
+    way a view without a cursor would, and return (rows, bytes).
+    """
+    from polls.api import EXPORTS, FORMATS
+
+    fields, queryset = EXPORTS['votes']
+    rows = list(queryset().order_by('pk').values_list(*fields))
+    body = ''.join(FORMATS[format][0](fields, rows)).encode()
+    return body.count(b'\n'), len(body)
+
+
+def measure(name, export, *args):
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    rows, size = export(*args)
+    seconds = time.perf_counter() - start
+    report('export_memory', export=name, format=args[-1], rows=rows,
+           mb=round(size / 2 ** 20, 1), seconds=round(seconds, 1),
+           rows_per_second=round(rows / seconds),
+           peak_rss_growth_mb=round(peak_rss_mb() - before, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--votes', type=int, default=5000000)
+    parser.add_argument('--eager', action='store_true',
+                        help='also build the export in memory')
+    args = parser.parse_args()
+    database = setup()
+    try:
+        seed_votes(args.votes)
+        client = staff_client()
+        for format in ('ndjson', 'csv'):
+            measure('streaming', stream, client, format)
+        if args.eager:
+            measure('eager', eager, 'csv')
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Local servers and raw HTTP/1.1 clients for the load benchmarks.
+
+Servers run in a child process started with ``--serve`` by the benchmark
+module itself. Clients speak keep-alive HTTP/1.1 over asyncio streams, so
+one process can hold thousands of connections.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(module, *args):
+    """
+    Run python -m module --serve *args PORT and wait until it listens.
+
+    Return the process and the port.
+    """
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', module, '--serve',
+         *[str(arg) for arg in args], str(port)])
+    for attempt in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port)).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return server, port
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def serve_wsgi(port, workers=1, threads=32):
+    """
+    Serve mysite.wsgi with gunicorn gthread workers. Call after setup().
+    """
+    from gunicorn.app.base import BaseApplication
+    from mysite.wsgi import application
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                    'bind': '127.0.0.1:{}'.format(port), 'workers': workers,
+                    'worker_class': 'gthread', 'threads': threads,
+                    'worker_connections': 2000, 'backlog': 8192,
+                    'keepalive': 60, 'loglevel': 'error'}.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return application
+
+    Server().run()
+
+
+def without_rate_limits():
+    """
+    Turn the vote rate limits off for a server started after this.
+
+    Load clients vote far faster than any person.
+    """
+    os.environ['VOTE_RATE_LIMIT_IP'] = os.environ['VOTE_RATE_LIMIT_USER'] = '0'
+
+
+def session_cookies(users):
+    """
+    Log the users in without requests.
+
+    Return a Cookie header for each user, with a CSRF cookie, and the CSRF
+    token to post with it.
+    """
+    from django.contrib.auth import (
+        BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY)
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.middleware.csrf import get_token
+    from django.test import RequestFactory
+
+    request = RequestFactory().get('/')
+    token = get_token(request)
+    csrf_cookie = request.META['CSRF_COOKIE']
+    cookies = []
+    for user in users:
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = \
+            'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookies.append('sessionid={}; csrftoken={}'.format(
+            session.session_key, csrf_cookie))
+    return cookies, token
+
+
+async def fetch(reader, writer, method, path, headers=None, form=None):
+    """
+    Send one request over a keep-alive connection. Return the status and
+    the body of the response.
+    """
+    lines = ['{} {} HTTP/1.1'.format(method, path), 'Host: localhost']
+    lines.extend('{}: {}'.format(name, value)
+                 for name, value in (headers or {}).items())
+    body = b''
+    if form is not None:
+        body = urlencode(form).encode()
+        lines.append('Content-Type: application/x-www-form-urlencoded')
+        lines.append('Content-Length: {}'.format(len(body)))
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    return status, await reader.readexactly(length)
@@ -0,0 +1,90 @@
+"""
+Rows per second of the import_polls command against creating the same
+questions and choices one save() at a time, and of a re-run of the import.
+
+    python -m benchmarks.import_polls [--questions 50000] [--naive 2000]
+"""
+import argparse
+import io
+import json
+import os
+import time
+
+from benchmarks import report, setup, teardown
+
+CHOICES = 4
+
+
+def write_polls(path, count, first=0):
+    """
+    Write a JSONL file of count questions with CHOICES choices each.
+    """
+    with open(path, 'w') as file:
+        for number in range(first, first + count):
+            file.write(json.dumps({
+                'external_id': 'bench-{}'.format(number),
+                'question_text': 'Question {}?'.format(number),
+                'pub_date': '2020-10-01T00:00:00+00:00',
+                'end_date': '2020-11-01T00:00:00+00:00',
+                'choices': ['Choice {}'.format(choice)
+                            for choice in range(CHOICES)],
+            }) + '\n')
+
+
+def naive_import(path):
+    """
+    Import a JSONL file with one create() per question and choice.
+    """
+    from django.utils.dateparse import parse_datetime
+    from polls.models import Question
+
+    with open(path) as lines:
+        for line in lines:
+            row = json.loads(line)
+            question = Question.objects.create(
+                external_id=row['external_id'],
+                question_text=row['question_text'],
+                pub_date=parse_datetime(row['pub_date']),
+                end_date=parse_datetime(row['end_date']))
+            for text in row['choices']:
+                question.choice_set.create(choice_text=text)
+
+
+def command_import(path):
+    from django.core.management import call_command
+
+    call_command('import_polls', path, stdout=io.StringIO())
+
+
+def measure(name, function, path, questions):
+    start = time.perf_counter()
+    function(path)
+    seconds = time.perf_counter() - start
+    rows = questions * (1 + CHOICES)
+    report('import_polls', method=name, questions=questions, rows=rows,
+           seconds=round(seconds, 2), rows_per_second=round(rows / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=50000)
+    parser.add_argument('--naive', type=int, default=2000,
+                        help='questions for the naive loop, which is slow')
+    args = parser.parse_args()
+    database = setup()
+    try:
+        directory = os.path.dirname(database)
+        bulk = os.path.join(directory, 'bulk.jsonl')
+        naive = os.path.join(directory, 'naive.jsonl')
+        write_polls(bulk, args.questions)
+        write_polls(naive, args.naive, first=args.questions)
+        measure('naive', naive_import, naive, args.naive)
+        measure('import_polls', command_import, bulk, args.questions)
+        # Every question exists now, so this run only updates.
+        measure('import_polls rerun', command_import, bulk, args.questions)
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
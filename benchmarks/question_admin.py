@@ -0,0 +1,81 @@
+"""
+Latency and queries of the question changelist over many questions, with
+the default question admin and the one for large tables.
+
+    python -m benchmarks.question_admin [--questions 200000] [--requests 20]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.question_indexes import seed_questions
+
+
+def measure(client, url, params, requests):
+    """
+    Request a changelist page and return the mean latency and time in SQL
+    in ms, and the queries per request.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for number in range(requests):
+            start = time.perf_counter()
+            response = client.get(url, params)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.status_code
+    sql = sum(float(query['time']) for query in queries)
+    return {'mean_ms': round(statistics.mean(timings), 1),
+            'sql_ms': round(sql * 1000 / requests, 1),
+            'queries_per_request': len(queries) // requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        import importlib
+
+        from django.conf import settings
+        from django.contrib import admin
+        from django.contrib.auth.models import User
+        from django.test import Client
+        from django.urls import clear_url_caches, reverse
+        from polls.admin import LargeQuestionAdmin, QuestionAdmin
+        from polls.models import Question
+
+        seed_questions(args.questions)
+        client = Client()
+        client.force_login(User.objects.create_superuser('admin'))
+        url = reverse('admin:polls_question_changelist')
+        votable = QuestionAdmin.list_display.index('votable') + 1
+        pages = {
+            'first_page': {},
+            'page_50': {'p': 50},
+            'sort_votable': {'o': '-{}'.format(votable)},
+            'search': {'q': '"Question 12345"'},
+            'filter_open': {'status__exact': Question.OPEN},
+        }
+        for name, model_admin in (('default', QuestionAdmin),
+                                  ('large', LargeQuestionAdmin)):
+            admin.site.unregister(Question)
+            admin.site.register(Question, model_admin)
+            # The admin views are bound when the URLconf is imported.
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+            clear_url_caches()
+            for page, params in pages.items():
+                report('question_admin', admin=name, page=page,
+                       questions=args.questions,
+                       **measure(client, url, params, args.requests))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
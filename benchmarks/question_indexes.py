@@ -0,0 +1,101 @@
+"""
+Latency of the index and detail pages over a million questions, with and
+without the Question date indexes.
+
+    python -m benchmarks.question_indexes [--questions 1000000]
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+INDEXES = ('question_pub_date_id_idx', 'question_end_pub_date_idx')
+
+
+def seed_questions(count):
+    """
+    Insert questions published over the last five years and the next month.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    rows = []
+    for number in range(count):
+        pub_date = now - datetime.timedelta(
+            minutes=random.randrange(-30 * 24 * 60, 5 * 365 * 24 * 60))
+        end_date = pub_date + datetime.timedelta(days=random.randrange(1, 60))
+        status = Question(pub_date=pub_date, end_date=end_date).status_at(now)
+        rows.append(('Question {}'.format(number), pub_date, end_date, '', 0,
+                     now, status))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO polls_question (question_text, pub_date, end_date, "
+            "current_vote, version, modified, status) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)", rows)
+        cursor.execute(
+            "INSERT INTO polls_choice (question_id, choice_text, votes) "
+            "SELECT id, 'Yes', 0 FROM polls_question")
+        cursor.execute("ANALYZE")
+
+
+def measure(client, urls):
+    """
+    Request every url and return the mean and p95 latency in ms.
+    """
+    timings = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    timings.sort()
+    return {'mean_ms': round(statistics.mean(timings), 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95)], 2)}
+
+
+def run(label, requests, count):
+    from django.test import Client
+    from django.urls import reverse
+    from polls.models import Question
+    from polls.views import encode_cursor
+
+    client = Client()
+    index = reverse('polls:index')
+    published = list(Question.objects.published().order_by('?')
+                     .only('pk', 'pub_date')[:requests])
+    deep = ['{}?after={}'.format(index, encode_cursor(question))
+            for question in published]
+    details = [reverse('polls:detail', args=(question.pk,))
+               for question in published]
+    report('question_indexes', indexes=label, questions=count,
+           index_first_page=measure(client, [index] * requests),
+           index_deep_page=measure(client, deep),
+           detail=measure(client, details))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.db import connection
+
+        seed_questions(args.questions)
+        run('with', args.requests, args.questions)
+        with connection.cursor() as cursor:
+            for name in INDEXES:
+                cursor.execute('DROP INDEX {}'.format(name))
+        run('without', args.requests, args.questions)
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Latency of searching a million questions with the full-text index, with
+the ORM fallback, and with a plain icontains filter on question_text.
+
+    python -m benchmarks.question_search [--questions 1000000] [--searches 50]
+"""
+import argparse
+import datetime
+import itertools
+import random
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa')
+
+# 1000 words of three syllables.
+WORDS = [''.join(parts) for parts in itertools.product(SYLLABLES, repeat=3)]
+
+
+def sentence(length):
+    return ' '.join(random.choice(WORDS) for number in range(length))
+
+
+def seed(count):
+    """
+    Insert questions of six random words with two choices of two words
+    each. The triggers of the full-text index run on every row.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    questions = []
+    for number in range(count):
+        pub_date = now - datetime.timedelta(
+            minutes=random.randrange(0, 5 * 365 * 24 * 60))
+        questions.append((sentence(6) + '?', pub_date,
+                          pub_date + datetime.timedelta(days=30), '', 0, now,
+                          Question(pub_date=pub_date).status_at(now)))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO polls_question (question_text, pub_date, end_date, "
+            "current_vote, version, modified, status) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)", questions)
+        cursor.execute("SELECT id FROM polls_question")
+        choices = [(pk, sentence(2)) for pk, in cursor.fetchall()
+                   for number in range(2)]
+        cursor.executemany(
+            "INSERT INTO polls_choice (question_id, choice_text, votes) "
+            "VALUES (%s, %s, 0)", choices)
+        cursor.execute("ANALYZE")
+
+
+def icontains(text, offset=0, limit=20):
+    """
+    Return the newest published questions whose text contains every word.
+    """
+    from polls.models import Question
+
+    questions = Question.objects.published()
+    for word in text.split():
+        questions = questions.filter(question_text__icontains=word)
+    return list(questions.order_by('-pub_date', '-id')[offset:offset + limit])
+
+
+def measure(search, searches):
+    """
+    Run every search and return the mean and p95 latency in ms and the
+    mean number of results.
+    """
+    timings = []
+    found = []
+    for text in searches:
+        start = time.perf_counter()
+        found.append(len(search(text)))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {'mean_ms': round(statistics.mean(timings), 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95)], 2),
+            'results': round(statistics.mean(found), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--searches', type=int, default=50)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.conf import settings
+        from polls.search import search_questions
+
+        start = time.perf_counter()
+        seed(args.questions)
+        report('question_search', seed_s=round(time.perf_counter() - start),
+               questions=args.questions)
+        kinds = {
+            'word': [random.choice(WORDS) for number in range(args.searches)],
+            'prefix': [random.choice(WORDS)[:4]
+                       for number in range(args.searches)],
+            'two_words': ['{} {}'.format(*random.sample(WORDS, 2))
+                          for number in range(args.searches)],
+        }
+        for kind, searches in kinds.items():
+            settings.POLL_SEARCH_FTS = True
+            report('question_search', search='fts', kind=kind,
+                   questions=args.questions,
+                   **measure(search_questions, searches))
+            settings.POLL_SEARCH_FTS = False
+            report('question_search', search='orm_fallback', kind=kind,
+                   questions=args.questions,
+                   **measure(search_questions, searches))
+            report('question_search', search='icontains', kind=kind,
+                   questions=args.questions, **measure(icontains, searches))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Cost of filtering questions on their status against comparing their dates
+to the time, and of keeping the statuses up to date.
+
+    python -m benchmarks.question_status [--questions 1000000]
+
+Reports the latency of the open and closed question filters both ways, the
+per-request check of StatusSchedulerMiddleware, and one scheduler run that
+opens and closes the questions whose boundary passed.
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.question_indexes import seed_questions
+
+
+def measure(function, repeat):
+    """
+    Call function repeat times and return the mean and p95 latency in ms.
+    """
+    timings = []
+    for number in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {'mean_ms': round(statistics.mean(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95)], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.utils import timezone
+        from polls.models import Question
+        from polls.scheduler import StatusScheduler
+
+        seed_questions(args.questions)
+        questions = Question.objects
+        now = timezone.now()
+        for name, by_date, by_status in (
+                ('open_count', lambda: questions.open_for_voting(now).count(),
+                 lambda: questions.open_for_voting().count()),
+                ('closed_page', lambda: list(questions.closed(now)
+                                             .order_by('-end_date')[:20]),
+                 lambda: list(questions.closed().order_by('-end_date')[:20])),
+                ('next_to_close', lambda: questions.open_for_voting(now)
+                 .order_by('end_date').first(),
+                 lambda: questions.open_for_voting().order_by('end_date')
+                 .first())):
+            report('question_status', query=name, questions=args.questions,
+                   by_date=measure(by_date, args.repeat),
+                   by_status=measure(by_status, args.repeat))
+
+        scheduler = StatusScheduler(horizon=3600)
+        scheduler.run_due()
+        checks = 100000
+        start = time.perf_counter()
+        for number in range(checks):
+            scheduler.due()
+        check_us = (time.perf_counter() - start) * 1e6 / checks
+        # Jump an hour ahead, past every boundary in the heap.
+        later = timezone.now() + datetime.timedelta(hours=1)
+        due = len(scheduler._heap)
+        start = time.perf_counter()
+        changed = scheduler.run_due(later)
+        report('question_status', questions=args.questions,
+               middleware_check_us=round(check_us, 2),
+               boundaries_in_hour=due, changed=len(changed),
+               scheduler_run_ms=round((time.perf_counter() - start) * 1000,
+                                      2))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
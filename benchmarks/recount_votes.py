@@ -0,0 +1,121 @@
+"""
+Time and memory of "manage.py recount_votes" over ten million votes, with
+one process and with a pool.
+
+    python -m benchmarks.recount_votes [--votes 10000000] [--questions 100000]
+
+About one choice in a hundred gets a counter that is off, which the first
+fixing run corrects and the last run finds none of.
+"""
+import argparse
+import io
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks import report, setup, teardown
+
+CHOICES = 4
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Return the peak resident set size of this process, or of its largest
+    child, in MB.
+    """
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def seed_votes(count, questions):
+    """
+    Insert count votes spread over questions questions, one vote per voter
+    and question, with SQL that generates the rows in the database. The
+    vote counters are set from the votes, and about one in a hundred is
+    then put off.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    now = timezone.now()
+    voters = -(-count // questions)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_question (id, question_text, pub_date, "
+            "end_date, current_vote, version, modified, status) "
+            "SELECT i, 'Question ' || i, %s, %s, '', 0, %s, 'closed' FROM n",
+            [questions, now, now, now])
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_choice (id, question_id, choice_text, votes) "
+            "SELECT q.id * %s + n.i, q.id, 'Choice ' || n.i, 0 "
+            "FROM polls_question q, n",
+            [CHOICES - 1, CHOICES])
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO auth_user (id, password, is_superuser, username, "
+            "first_name, last_name, email, is_staff, is_active, date_joined) "
+            "SELECT i, '', 0, 'voter' || i, '', '', '', 0, 1, %s FROM n",
+            [voters, now])
+        # Question by question, so the indexes grow at their end.
+        cursor.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n "
+            "WHERE i < %s) "
+            "INSERT INTO polls_vote (question_id, user_id, choice_id) "
+            "SELECT i / %s + 1, i %% %s + 1, "
+            "(i / %s + 1) * %s + abs(random()) %% %s FROM n",
+            [count - 1, voters, voters, voters, CHOICES, CHOICES])
+        cursor.execute(
+            "UPDATE polls_choice SET votes = (SELECT COUNT(*) FROM polls_vote "
+            "WHERE choice_id = polls_choice.id)")
+        cursor.execute(
+            "UPDATE polls_choice SET votes = votes + 1 + abs(random()) % 5 "
+            "WHERE abs(random()) % 100 = 0")
+        cursor.execute("ANALYZE")
+
+
+def recount(name, *args):
+    """
+    Run recount_votes with the arguments and report its time, summary and
+    the growth of the peak memory of this process and of its workers.
+    """
+    from django.core.management import call_command
+
+    before = peak_rss_mb()
+    out = io.StringIO()
+    start = time.perf_counter()
+    call_command('recount_votes', *args, verbosity=0, stdout=out)
+    seconds = time.perf_counter() - start
+    report('recount_votes', run=name, seconds=round(seconds, 1),
+           summary=out.getvalue().strip(),
+           peak_rss_growth_mb=round(peak_rss_mb() - before, 1),
+           worker_peak_rss_mb=round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--votes', type=int, default=10000000)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        start = time.perf_counter()
+        seed_votes(args.votes, args.questions)
+        report('recount_votes', votes=args.votes, questions=args.questions,
+               seed_seconds=round(time.perf_counter() - start, 1))
+        checkpoint = os.path.join(tempfile.gettempdir(),
+                                  'recount-{}.json'.format(os.getpid()))
+        recount('report')
+        recount('fix', '--fix', '--checkpoint', checkpoint)
+        recount('report_pool', '--processes', str(args.processes))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
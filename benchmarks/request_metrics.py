@@ -0,0 +1,83 @@
+"""
+Overhead of MetricsMiddleware on the index and results pages, with metrics
+disabled and enabled.
+
+    python -m benchmarks.request_metrics [--requests 2000]
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+
+def seed():
+    """
+    Create 20 open questions with four choices each and return their ids.
+    """
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    ids = []
+    for number in range(20):
+        question = Question.objects.create(
+            question_text='Question {}?'.format(number),
+            pub_date=now - datetime.timedelta(days=1, minutes=number),
+            end_date=now + datetime.timedelta(days=1))
+        for text in ('A', 'B', 'C', 'D'):
+            question.choice_set.create(choice_text=text, votes=number)
+        ids.append(question.pk)
+    return ids
+
+
+def measure(urls, requests):
+    """
+    Request the urls in turn and return the mean and p95 latency in us.
+    """
+    from django.test import Client
+
+    # A new client loads the middleware with the current settings.
+    client = Client()
+    for url in urls:
+        client.get(url)
+    timings = []
+    for number in range(requests):
+        start = time.perf_counter()
+        response = client.get(urls[number % len(urls)])
+        timings.append((time.perf_counter() - start) * 1e6)
+        assert response.status_code == 200, response.status_code
+    timings.sort()
+    return {'mean_us': round(statistics.mean(timings), 1),
+            'p95_us': round(timings[int(len(timings) * 0.95)], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.conf import settings
+        from django.urls import reverse
+
+        ids = seed()
+        pages = {'index': [reverse('polls:index')],
+                 'results': [reverse('polls:results', args=(pk,))
+                             for pk in ids]}
+        for page, urls in pages.items():
+            results = {}
+            for enabled in (False, True):
+                settings.METRICS_ENABLED = enabled
+                results['enabled' if enabled else 'disabled'] = \
+                    measure(urls, args.requests)
+            overhead = results['enabled']['mean_us'] - results['disabled']['mean_us']
+            report('request_metrics', page=page, requests=args.requests,
+                   overhead_us=round(overhead, 1), **results)
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
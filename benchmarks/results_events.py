@@ -0,0 +1,202 @@
+"""
+Memory per open results event stream and the latency of a vote event, with
+thousands of local subscribers to one question. Needs uvicorn.
+
+    python -m benchmarks.results_events [--subscribers 5000] [--votes 20]
+
+The ASGI application runs under uvicorn in a child process, so its memory
+is measured apart from the clients. Votes are counted in the server process
+like vote() counts them, and the latency is the time from counting a vote to
+its event arriving at each subscriber.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.http import free_port
+
+
+def serve(database, port):
+    """
+    Serve mysite.asgi with uvicorn and count a vote for each line of stdin.
+    """
+    setup(database)
+    import uvicorn
+    from django.db import connection
+    from mysite.asgi import application
+    from polls.models import Choice
+
+    def count_votes():
+        choice = Choice.objects.get()
+        for line in sys.stdin:
+            Choice.objects.add_vote(choice.question_id, choice.pk)
+        connection.close()
+
+    threading.Thread(target=count_votes, daemon=True).start()
+    uvicorn.run(application, host='127.0.0.1', port=port, log_level='error',
+                backlog=8192, timeout_keep_alive=600)
+
+
+def seed_question():
+    """
+    Create an open question with one choice and return its id.
+    """
+    import datetime
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    question = Question.objects.create(
+        question_text='Question?', pub_date=now - datetime.timedelta(days=1),
+        end_date=now + datetime.timedelta(days=1))
+    question.choice_set.create(choice_text='Yes')
+    return question.pk
+
+
+def rss_kb(pid):
+    """
+    Return the resident set size of a process in kB.
+    """
+    with open('/proc/{}/status'.format(pid)) as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+
+def cpu_seconds(pid):
+    """
+    Return the user and system CPU time of a process in seconds.
+    """
+    with open('/proc/{}/stat'.format(pid)) as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+class Subscriber:
+    """
+    Client of one event stream that records when each event arrives.
+    """
+
+    def __init__(self):
+        self.arrivals = []
+        self.changed = asyncio.Event()
+
+    async def run(self, port, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write('GET {} HTTP/1.1\r\nHost: localhost\r\n'
+                     'Accept: text/event-stream\r\n\r\n'.format(path).encode())
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b'data: '):
+                    self.arrivals.append(time.perf_counter())
+                    self.changed.set()
+        finally:
+            writer.close()
+
+
+async def wait_for_events(subscribers, count, timeout=60):
+    """
+    Wait until every subscriber has received count events.
+    """
+    async def wait(subscriber):
+        while len(subscriber.arrivals) < count:
+            subscriber.changed.clear()
+            await subscriber.changed.wait()
+    await asyncio.wait_for(
+        asyncio.gather(*(wait(subscriber) for subscriber in subscribers)),
+        timeout)
+
+
+async def load_test(server, port, path, count, votes):
+    rss_before = rss_kb(server.pid)
+    subscribers = [Subscriber() for number in range(count)]
+    tasks = []
+    start = time.perf_counter()
+    for subscriber in subscribers:
+        tasks.append(asyncio.ensure_future(subscriber.run(port, path)))
+        if len(tasks) % 500 == 0:
+            await asyncio.sleep(0.05)
+    await wait_for_events(subscribers, 1, timeout=300)
+    connect_seconds = time.perf_counter() - start
+    # Let the server settle before measuring.
+    await asyncio.sleep(1)
+    rss_after = rss_kb(server.pid)
+    latencies = []
+    cpu_before = cpu_seconds(server.pid)
+    for number in range(votes):
+        sent = time.perf_counter()
+        server.stdin.write(b'vote\n')
+        server.stdin.flush()
+        await wait_for_events(subscribers, number + 2)
+        latencies.extend((subscriber.arrivals[number + 1] - sent) * 1000
+                         for subscriber in subscribers)
+        await asyncio.sleep(0.2)
+    cpu = cpu_seconds(server.pid) - cpu_before
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    latencies.sort()
+    report('results_events', subscribers=count, votes=votes,
+           connect_seconds=round(connect_seconds, 2),
+           server_rss_before_mb=round(rss_before / 1024, 1),
+           server_rss_after_mb=round(rss_after / 1024, 1),
+           kb_per_subscriber=round((rss_after - rss_before) / count, 1),
+           server_cpu_ms_per_vote=round(cpu * 1000 / votes, 1),
+           latency_ms={
+               'p50': round(statistics.median(latencies), 1),
+               'p95': round(latencies[int(len(latencies) * 0.95)], 1),
+               'max': round(latencies[-1], 1)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--votes', type=int, default=20)
+    parser.add_argument('--serve', nargs=2, metavar=('DATABASE', 'PORT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]))
+        return
+    database = setup()
+    try:
+        from django.urls import reverse
+        question_id = seed_question()
+        path = reverse('polls:events', args=(question_id,))
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.results_events',
+             '--serve', database, str(port)], stdin=subprocess.PIPE)
+        try:
+            for attempt in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port)).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            asyncio.get_event_loop().run_until_complete(load_test(
+                server, port, path, args.subscribers, args.votes))
+        finally:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Latency and queries of the results page of closed questions, rendered from
+the database, from the results cache and from their snapshots.
+
+    python -m benchmarks.results_snapshots [--requests 2000]
+"""
+import argparse
+import datetime
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks import report, setup, teardown
+
+
+def seed():
+    """
+    Create 20 closed questions with four choices each and return their ids.
+    """
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    ids = []
+    for number in range(20):
+        question = Question.objects.create(
+            question_text='Question {}?'.format(number),
+            pub_date=now - datetime.timedelta(days=2, minutes=number),
+            end_date=now - datetime.timedelta(days=1))
+        for text in ('A', 'B', 'C', 'D'):
+            question.choice_set.create(choice_text=text, votes=number)
+        ids.append(question.pk)
+    return ids
+
+
+def measure(urls, requests, clear_cache):
+    """
+    Request the urls in turn and return the mean and p95 latency in us and
+    the queries per request.
+    """
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    for url in urls:
+        client.get(url)
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for number in range(requests):
+            if clear_cache:
+                caches['results'].clear()
+            start = time.perf_counter()
+            response = client.get(urls[number % len(urls)])
+            timings.append((time.perf_counter() - start) * 1e6)
+            assert response.status_code == 200, response.status_code
+    timings.sort()
+    return {'mean_us': round(statistics.mean(timings), 1),
+            'p95_us': round(timings[int(len(timings) * 0.95)], 1),
+            'queries_per_request': round(len(queries) / requests, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    database = setup()
+    directory = tempfile.mkdtemp(prefix='polls-snapshots-')
+    try:
+        from django.conf import settings
+        from django.urls import reverse
+
+        urls = [reverse('polls:results', args=(pk,)) for pk in seed()]
+        settings.POLL_SNAPSHOT_DIR = ''
+        for source, clear_cache in (('database', True), ('cache', False)):
+            report('results_snapshots', source=source, requests=args.requests,
+                   **measure(urls, args.requests, clear_cache))
+        settings.POLL_SNAPSHOT_DIR = directory
+        report('results_snapshots', source='snapshot', requests=args.requests,
+               **measure(urls, args.requests, False))
+    finally:
+        shutil.rmtree(directory)
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Votes and page reads under concurrency with the development and production
+database profiles. Needs gunicorn.
+
+    python -m benchmarks.sqlite_profile [--voters 100] [--readers 50]
+        [--seconds 10] [--workers 4]
+
+Each arm serves a copy of the same seeded database from gunicorn with
+--workers worker processes. Voters move their vote between the choices of
+a few questions as fast as the server answers, while readers load the
+detail pages. Arms:
+
+    defaults    development profile, no retries (SQLite defaults)
+    wal         production profile, no retries
+    production  production profile, with retries on a locked database
+
+Failed votes are mostly "database is locked" errors.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.http import (
+    fetch, serve_wsgi, session_cookies, start_server, stop_server,
+    without_rate_limits)
+
+# Name, DATABASE_PROFILE and VOTE_BUSY_RETRIES of every arm.
+ARMS = (('defaults', 'development', 0), ('wal', 'production', 0),
+        ('production', 'production', 3))
+QUESTIONS = 4
+
+
+def serve(arm, database, workers, port):
+    """
+    Serve the site with the profile and retries of an arm.
+    """
+    name, profile, retries = next(a for a in ARMS if a[0] == arm)
+    os.environ['DATABASE_PROFILE'] = profile
+    os.environ['VOTE_BUSY_RETRIES'] = str(retries)
+    without_rate_limits()
+    setup(database)
+    serve_wsgi(port, workers=workers, threads=16)
+
+
+def seed(voters):
+    """
+    Create open questions with two choices and a session for each voter.
+
+    Return the vote forms by path, the detail paths, the CSRF token and the
+    cookies of every voter.
+    """
+    import datetime
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    votes = {}
+    details = []
+    for number in range(QUESTIONS):
+        question = Question.objects.create(
+            question_text='Question {}?'.format(number),
+            pub_date=now - datetime.timedelta(days=1),
+            end_date=now + datetime.timedelta(days=1))
+        votes[reverse('polls:vote', args=(question.pk,))] = [
+            question.choice_set.create(choice_text=text).pk
+            for text in ('Yes', 'No')]
+        details.append(reverse('polls:detail', args=(question.pk,)))
+    User.objects.bulk_create(User(username='voter{}'.format(number))
+                             for number in range(voters))
+    cookies, token = session_cookies(User.objects.order_by('pk'))
+    return votes, details, token, cookies
+
+
+async def client(port, requests, cookie, deadline, results):
+    """
+    Send requests, (method, path, form) from requests(), over one keep-alive
+    connection until the deadline.
+    """
+    method, path, form = requests()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, body = await fetch(reader, writer, method, path,
+                                       {'Cookie': cookie}, form)
+            results.append((method, status, time.perf_counter() - start))
+            method, path, form = requests()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        results.append((method, 0, 0))
+    finally:
+        writer.close()
+
+
+async def load_test(port, votes, details, token, cookies, readers, seconds):
+    """
+    Return the method, status and seconds of every request, and the seconds
+    until the last answer.
+    """
+    rng = random.Random(0)
+
+    def vote():
+        path = rng.choice(list(votes))
+        return 'POST', path, {'choice': rng.choice(votes[path]),
+                              'csrfmiddlewaretoken': token}
+
+    def read():
+        return 'GET', rng.choice(details), None
+
+    results = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(
+        *(client(port, vote, cookie, deadline, results)
+          for cookie in cookies),
+        *(client(port, read, cookies[number % len(cookies)], deadline,
+                 results) for number in range(readers)))
+    return results, time.perf_counter() - start
+
+
+def summary(results, method, success, elapsed):
+    done = sorted(seconds for kind, status, seconds in results
+                  if kind == method and status == success)
+    failed = sum(1 for kind, status, seconds in results
+                 if kind == method and status != success)
+    return {'done': len(done), 'failed': failed,
+            'error_rate': round(failed / ((len(done) + failed) or 1), 4),
+            'per_second': round(len(done) / elapsed, 1),
+            'latency_ms': {'p50': round(statistics.median(done) * 1000, 1),
+                           'p95': round(done[int(len(done) * 0.95)] * 1000,
+                                        1)} if done else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--voters', type=int, default=100)
+    parser.add_argument('--readers', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--serve', nargs=4,
+                        metavar=('ARM', 'DATABASE', 'WORKERS', 'PORT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], args.serve[1], int(args.serve[2]),
+              int(args.serve[3]))
+        return
+    database = setup()
+    try:
+        votes, details, token, cookies = seed(args.voters)
+        from django.db import connections
+        connections.close_all()
+        for arm, profile, retries in ARMS:
+            copy = '{}.{}'.format(database, arm)
+            shutil.copy(database, copy)
+            server, port = start_server('benchmarks.sqlite_profile', arm,
+                                        copy, args.workers)
+            try:
+                results, elapsed = asyncio.run(load_test(
+                    port, votes, details, token, cookies, args.readers,
+                    args.seconds))
+            finally:
+                stop_server(server)
+            report('sqlite_profile', arm=arm, profile=profile,
+                   retries=retries, voters=args.voters,
+                   readers=args.readers, workers=args.workers,
+                   votes=summary(results, 'POST', 302, elapsed),
+                   reads=summary(results, 'GET', 200, elapsed))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Render time of the index and detail pages with the template loaders of the
+development and production profiles, with and without fragment caching.
+
+    python -m benchmarks.template_render [--questions 20] [--renders 2000]
+
+Without fragment caching the fragments go to a dummy cache, so every one
+of them is rendered on every request, as before they were cached.
+"""
+import argparse
+import datetime
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+FILE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+LOADERS = {
+    'development': FILE_LOADERS,
+    'production': [('django.template.loaders.cached.Loader', FILE_LOADERS)],
+}
+
+FRAGMENT_CACHES = {
+    'off': 'django.core.cache.backends.dummy.DummyCache',
+    'on': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def seed(count, choices=4):
+    """
+    Create count open questions with their choices.
+    """
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    for number in range(count):
+        question = Question.objects.create(
+            question_text='Question {}?'.format(number),
+            pub_date=now - datetime.timedelta(days=1, minutes=number),
+            end_date=now + datetime.timedelta(days=1))
+        for choice in range(choices):
+            question.choice_set.create(choice_text='Choice {}'.format(choice))
+
+
+def pages():
+    """
+    Return (template name, context) of the index and of the detail of the
+    newest question, read as the views read them.
+    """
+    from polls.models import Question
+
+    questions = list(Question.objects.published().with_votable()
+                     .order_by('-pub_date', '-id')[:20])
+    question = Question.objects.get(pk=questions[0].pk)
+    return {
+        'index': ('polls/index.html', {'latest_question_list': questions,
+                                       'next_cursor': None}),
+        'detail': ('polls/detail.html', {'question': question}),
+    }
+
+
+def engine(loaders):
+    """
+    Return a template engine like the one of the settings, with loaders.
+    """
+    from django.conf import settings
+    from django.template.backends.django import DjangoTemplates
+
+    options = dict(settings.TEMPLATES[0]['OPTIONS'], loaders=loaders)
+    return DjangoTemplates({'NAME': 'benchmark', 'DIRS': [],
+                            'APP_DIRS': False, 'OPTIONS': options})
+
+
+def measure(templates, name, context, request, renders):
+    """
+    Load and render the template as a view does, and return the mean and
+    p95 time in us.
+    """
+    timings = []
+    for number in range(renders):
+        start = time.perf_counter()
+        templates.get_template(name).render(context, request)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {'mean_us': round(statistics.mean(timings), 1),
+            'p95_us': round(timings[int(len(timings) * 0.95)], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--renders', type=int, default=2000)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.conf import settings
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory, override_settings
+
+        seed(args.questions)
+        request = RequestFactory().get('/polls/')
+        request.user = AnonymousUser()
+        for profile, loaders in LOADERS.items():
+            for fragments, backend in FRAGMENT_CACHES.items():
+                caches = dict(settings.CACHES, template_fragments={
+                    'BACKEND': backend, 'LOCATION': 'benchmark'})
+                with override_settings(CACHES=caches):
+                    templates = engine(loaders)
+                    for page, (name, context) in pages().items():
+                        report('template_render', page=page,
+                               profile=profile, fragments=fragments,
+                               **measure(templates, name, context, request,
+                                         args.renders))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Cost of vote rollups: the time a vote takes with and without them, and the
+latency of the results history of a question over 30 days as its number
+of votes grows.
+
+    python -m benchmarks.vote_history [--votes 1000000] [--requests 200]
+"""
+import argparse
+import datetime
+import random
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+
+def create_question(choices=4):
+    """
+    Create a question open for the last 30 days and the next one.
+    """
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    question = Question.objects.create(
+        question_text='History?', pub_date=now - datetime.timedelta(days=30),
+        end_date=now + datetime.timedelta(days=1))
+    for number in range(choices):
+        question.choice_set.create(choice_text=str(number))
+    return question
+
+
+def measure_votes(question, votes):
+    """
+    Cast votes of different users and return the mean latency in us.
+    """
+    from django.contrib.auth.models import User
+    from polls.models import Vote
+
+    prefix = 'voter-{}-'.format(question.pk)
+    User.objects.bulk_create([User(username=prefix + str(number))
+                              for number in range(votes)])
+    users = User.objects.filter(username__startswith=prefix)
+    choices = list(question.choice_set.values_list('pk', flat=True))
+    timings = []
+    for user in users:
+        choice_id = random.choice(choices)
+        start = time.perf_counter()
+        Vote.objects.cast(user, question.pk, choice_id)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return round(statistics.mean(timings), 1)
+
+
+def seed_rollups(question, votes):
+    """
+    Count votes at random times of the last 30 days into rollups, as votes
+    would have been, and compact them.
+    """
+    from django.utils import timezone
+    from polls.models import VoteRollup, bucket_start
+
+    now = timezone.now()
+    choices = list(question.choice_set.values_list('pk', flat=True))
+    counts = {}
+    for number in range(votes):
+        moment = now - datetime.timedelta(
+            seconds=random.randrange(30 * 24 * 3600))
+        choice_id = random.choice(choices)
+        for resolution in VoteRollup.RESOLUTIONS:
+            key = (choice_id, resolution, bucket_start(moment, resolution))
+            counts[key] = counts.get(key, 0) + 1
+    VoteRollup.objects.merge(counts)
+    VoteRollup.objects.compact(now)
+    return VoteRollup.objects.filter(choice__question=question).count()
+
+
+def measure_history(client, url, params, requests):
+    """
+    Request the history and return the mean and p95 latency in ms and the
+    number of buckets.
+    """
+    timings = []
+    for number in range(requests):
+        start = time.perf_counter()
+        response = client.get(url, params)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    timings.sort()
+    return {'mean_ms': round(statistics.mean(timings), 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95)], 2),
+            'buckets': len(response.json()['buckets'])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--votes', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.conf import settings
+        from django.test import Client
+        from django.urls import reverse
+        from django.utils import timezone
+
+        settings.VOTE_RATE_LIMIT_IP = settings.VOTE_RATE_LIMIT_USER = 0
+        for rollups in (False, True):
+            settings.VOTE_ROLLUPS = rollups
+            report('vote_history', rollups=rollups,
+                   vote_us=measure_votes(create_question(), 2000))
+        client = Client()
+        now = timezone.now()
+        ranges = {
+            '30_days': {},
+            'last_day': {'start': (now - datetime.timedelta(days=1))
+                         .isoformat()},
+            'last_6_hours': {'start': (now - datetime.timedelta(hours=6))
+                             .isoformat()},
+        }
+        votes = 1000
+        while votes <= args.votes:
+            question = create_question()
+            rows = seed_rollups(question, votes)
+            url = reverse('polls:api-history', args=(question.pk,))
+            for name, params in ranges.items():
+                report('vote_history', votes=votes, rollup_rows=rows,
+                       range=name,
+                       **measure_history(client, url, params, args.requests))
+            votes *= 10
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Per-request overhead of the vote rate limit, and the cost of a rejected vote.
+
+    python -m benchmarks.vote_rate_limit [--requests 100000] [--clients 1000]
+
+The overhead is the time vote_rate_limit adds to a view that does nothing,
+for requests spread over many client addresses and sessions, all allowed.
+A rejected vote is timed through the whole middleware stack.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+
+def percentiles(timings):
+    timings.sort()
+    return {'mean_us': round(statistics.mean(timings), 2),
+            'p50_us': round(timings[len(timings) // 2], 2),
+            'p99_us': round(timings[int(len(timings) * 0.99)], 2)}
+
+
+def overhead(count, clients):
+    """
+    Return the timings in us of a bare and a rate limited no-op view.
+    """
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from polls.views import vote_rate_limit
+
+    def view(request):
+        return HttpResponse()
+
+    limited = vote_rate_limit(view)
+    factory = RequestFactory()
+    requests = []
+    for number in range(clients):
+        request = factory.post('/', REMOTE_ADDR='10.0.{}.{}'.format(
+            number // 256, number % 256))
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = \
+            'session{:032d}'.format(number)
+        requests.append(request)
+    results = {}
+    for name, function in (('bare', view), ('limited', limited)):
+        timings = []
+        for number in range(count):
+            request = requests[number % clients]
+            start = time.perf_counter()
+            response = function(request)
+            timings.append((time.perf_counter() - start) * 1e6)
+            assert response.status_code == 200, response.status_code
+        results[name] = timings
+    return results
+
+
+def rejected_vote(count):
+    """
+    Return the timings in us of votes rejected by the user limit.
+    """
+    import datetime
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    question = Question.objects.create(
+        question_text='Question?', pub_date=now - datetime.timedelta(days=1),
+        end_date=now + datetime.timedelta(days=1))
+    choice = question.choice_set.create(choice_text='Yes')
+    client = Client()
+    client.force_login(User.objects.create(username='voter'))
+    url = reverse('polls:vote', args=(question.pk,))
+    data = {'choice': choice.pk}
+    while client.post(url, data).status_code != 429:
+        pass
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for number in range(count):
+            start = time.perf_counter()
+            response = client.post(url, data)
+            timings.append((time.perf_counter() - start) * 1e6)
+            assert response.status_code == 429, response.status_code
+    return timings, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=1000)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        from django.conf import settings
+        # Allow every request, so each one pays the full check.
+        settings.VOTE_RATE_LIMIT_IP = settings.VOTE_RATE_LIMIT_USER = \
+            args.requests
+        results = overhead(args.requests, args.clients)
+        bare = statistics.mean(results['bare'])
+        report('vote_rate_limit', requests=args.requests,
+               clients=args.clients, cache=settings.CACHES['ratelimit']
+               ['BACKEND'].rsplit('.', 1)[-1],
+               bare=percentiles(results['bare']),
+               limited=percentiles(results['limited']),
+               overhead_us=round(statistics.mean(results['limited']) - bare,
+                                 2))
+        settings.VOTE_RATE_LIMIT_USER = 10
+        timings, queries = rejected_vote(args.requests // 100)
+        report('vote_rate_limit', rejected_votes=len(timings),
+               queries=queries, rejected=percentiles(timings))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Vote throughput of the WSGI application under gunicorn against the ASGI
+application with the async vote view under uvicorn, with 100 and 1000
+concurrent clients. Needs gunicorn and uvicorn.
+
+    python -m benchmarks.vote_servers [--clients 100 1000] [--seconds 10]
+
+Each server runs in a child process with one worker. Every client is a
+logged-in voter with a keep-alive connection that moves its vote between
+two choices as fast as the server answers.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+from benchmarks.http import (
+    fetch, serve_wsgi, session_cookies, start_server, stop_server,
+    without_rate_limits)
+
+WSGI_THREADS = 32
+
+
+def serve(kind, database, port):
+    """
+    Serve the WSGI application with gunicorn or the ASGI one with uvicorn.
+    """
+    if kind == 'asgi':
+        os.environ['ASYNC_VOTE'] = 'True'
+    without_rate_limits()
+    setup(database)
+    if kind == 'asgi':
+        import uvicorn
+        from mysite.asgi import application
+        uvicorn.run(application, host='127.0.0.1', port=port,
+                    log_level='error', backlog=8192)
+    else:
+        serve_wsgi(port, threads=WSGI_THREADS)
+
+
+def seed(voters):
+    """
+    Create an open question with two choices and a session for each voter.
+
+    Return the vote path, the choice ids, the CSRF token and the cookies of
+    every voter.
+    """
+    import datetime
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from django.utils import timezone
+    from polls.models import Question
+
+    now = timezone.now()
+    question = Question.objects.create(
+        question_text='Question?', pub_date=now - datetime.timedelta(days=1),
+        end_date=now + datetime.timedelta(days=1))
+    choices = [question.choice_set.create(choice_text=text).pk
+               for text in ('Yes', 'No')]
+    User.objects.bulk_create(User(username='voter{}'.format(number))
+                             for number in range(voters))
+    cookies, token = session_cookies(User.objects.order_by('pk'))
+    return reverse('polls:vote', args=(question.pk,)), choices, token, cookies
+
+
+async def voter(port, path, choices, token, cookie, deadline, results):
+    """
+    Vote over one keep-alive connection until the deadline.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    number = 0
+    try:
+        while time.perf_counter() < deadline:
+            form = {'choice': choices[number % 2],
+                    'csrfmiddlewaretoken': token}
+            number += 1
+            start = time.perf_counter()
+            status, body = await fetch(reader, writer, 'POST', path,
+                                       {'Cookie': cookie}, form)
+            results.append((status, time.perf_counter() - start))
+    except (ConnectionError, asyncio.IncompleteReadError):
+        results.append((0, 0))
+    finally:
+        writer.close()
+
+
+async def load_test(port, path, choices, token, cookies, seconds):
+    """
+    Return the status and seconds of every vote, and the seconds until the
+    last answer.
+    """
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        voter(port, path, choices, token, cookie, start + seconds, results)
+        for cookie in cookies))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--serve', nargs=3,
+                        metavar=('KIND', 'DATABASE', 'PORT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve[0], args.serve[1], int(args.serve[2]))
+        return
+    database = setup()
+    try:
+        path, choices, token, cookies = seed(max(args.clients))
+        for kind in ('wsgi', 'asgi'):
+            server, port = start_server('benchmarks.vote_servers', kind,
+                                        database)
+            try:
+                for clients in args.clients:
+                    loop = asyncio.get_event_loop()
+                    results, elapsed = loop.run_until_complete(load_test(
+                        port, path, choices, token, cookies[:clients],
+                        args.seconds))
+                    voted = sorted(seconds for status, seconds in results
+                                   if status == 302)
+                    report('vote_servers', server=kind, clients=clients,
+                           votes=len(voted),
+                           errors=len(results) - len(voted),
+                           votes_per_second=round(len(voted) / elapsed),
+                           latency_ms={
+                               'p50': round(statistics.median(voted) * 1000),
+                               'p95': round(voted[int(len(voted) * 0.95)] * 1000)} if voted else None)
+            finally:
+                stop_server(server)
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Write throughput of votes for one hot choice at 1, 8 and 64 shards.
+
+    python -m benchmarks.vote_shards [--threads 16] [--seconds 3]
+"""
+import argparse
+import threading
+import time
+
+from benchmarks import report, setup, teardown
+
+
+def run(shards, threads, seconds):
+    """
+    Vote for one choice from many threads and count the votes per second.
+    """
+    from django.conf import settings
+    from django.db import OperationalError, connection
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    settings.VOTE_SHARDS = shards
+    now = timezone.now()
+    question = Question.objects.create(question_text='Hot question',
+                                       pub_date=now, end_date=now)
+    choice = question.choice_set.create(choice_text='Yes')
+    counted, errors = [0] * threads, [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(number):
+        while time.perf_counter() < deadline:
+            try:
+                Choice.objects.add_vote(question.id, choice.id)
+                counted[number] += 1
+            except OperationalError:
+                errors[number] += 1
+        connection.close()
+
+    workers = [threading.Thread(target=worker, args=(number,))
+               for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    total = Choice.objects.with_totals().get(pk=choice.pk).total_votes
+    report('vote_shards', shards=shards, threads=threads,
+           votes_per_second=round(sum(counted) / seconds, 1),
+           lock_errors=sum(errors), lost_votes=sum(counted) - total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        for shards in (0, 1, 8, 64):
+            run(shards, args.threads, args.seconds)
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Cost of one vote while the Vote table grows to millions of rows.
+
+    python -m benchmarks.vote_table [--sizes 0 10000 100000 1000000]
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import report, setup, teardown
+
+QUESTIONS = 1000
+CHOICES = 4
+
+
+def seed_polls():
+    """
+    Create the questions and choices the votes are spread over.
+    """
+    from django.utils import timezone
+    from polls.models import Choice, Question
+
+    now = timezone.now()
+    Question.objects.bulk_create(
+        Question(question_text='Question {}'.format(number), pub_date=now,
+                 end_date=now) for number in range(QUESTIONS))
+    Choice.objects.bulk_create(
+        Choice(question=question, choice_text='Choice {}'.format(number))
+        for question in Question.objects.all() for number in range(CHOICES))
+    return list(Choice.objects.order_by('pk')
+                .values_list('question_id', 'pk'))
+
+
+def seed_voters(first, count):
+    """
+    Insert voters first to first + count - 1 with raw SQL, which is much
+    faster than creating users through the ORM.
+    """
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    now = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO auth_user (id, password, is_superuser, username, "
+            "first_name, last_name, email, is_staff, is_active, date_joined) "
+            "VALUES (%s, '', 0, %s, '', '', '', 0, 1, %s)",
+            [(user_id, 'voter{}'.format(user_id), now)
+             for user_id in range(first, first + count)])
+
+
+def seed_votes(first, count, choices):
+    """
+    Give voters first to first + count - 1 a vote on one question each.
+    """
+    from django.db import connection, transaction
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO polls_vote (user_id, question_id, choice_id) "
+            "VALUES (%s, %s, %s)",
+            [(user_id,) + choices[user_id % len(choices)]
+             for user_id in range(first, first + count)])
+
+
+def time_votes(voters, choices):
+    """
+    Cast one vote for each of the voters and return the times in µs.
+    """
+    from django.contrib.auth.models import User
+    from polls.models import Vote
+
+    timings = []
+    for user_id, (question_id, choice_id) in zip(voters, choices):
+        user = User(pk=user_id)
+        start = time.perf_counter()
+        Vote.objects.cast(user, question_id, choice_id)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    return {'mean_us': round(statistics.mean(timings), 1),
+            'p95_us': round(timings[int(len(timings) * 0.95)], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[0, 10000, 100000, 1000000])
+    parser.add_argument('--rounds', type=int, default=1000)
+    args = parser.parse_args()
+    database = setup()
+    try:
+        choices = seed_polls()
+        seeded = 0
+        next_voter = 1
+        for size in sorted(args.sizes):
+            if size > seeded:
+                seed_voters(next_voter, size - seeded)
+                seed_votes(next_voter, size - seeded, choices)
+                next_voter += size - seeded
+                seeded = size
+            # New voters cast their first vote.
+            new_voters = range(next_voter, next_voter + args.rounds)
+            seed_voters(next_voter, args.rounds)
+            picked = [user_id % len(choices) for user_id in new_voters]
+            first = time_votes(new_voters,
+                               [choices[index] for index in picked])
+            # The same voters move their vote to another choice of the
+            # same question.
+            moved = time_votes(new_voters, [
+                choices[index - index % CHOICES + (index + 1) % CHOICES]
+                for index in picked])
+            next_voter += args.rounds
+            seeded += args.rounds
+            report('vote_table', vote_rows=size,
+                   first_vote=summary(first), changed_vote=summary(moved))
+    finally:
+        teardown(database)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+ASGI config for mysite project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Besides the Django application it serves the results event streams of
+polls, which need no worker thread per open stream, and it counts votes
+with the async vote view.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+os.environ.setdefault('ASYNC_VOTE', 'True')
+
+django_application = get_asgi_application()
+
+from django.urls import Resolver404, resolve  # noqa: E402
+
+from polls.events import results_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Stream results events of polls, and serve everything else with Django.
+    """
+    if scope['type'] == 'http':
+        try:
+            match = resolve(scope['path'])
+        except Resolver404:
+            match = None
+        if match is not None and match.view_name == 'polls:events':
+            return await results_events.stream(match.kwargs['pk'],
+                                               receive, send)
+    await django_application(scope, receive, send)
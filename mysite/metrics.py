@@ -0,0 +1,263 @@
+"""
+Per-view performance metrics, served in the Prometheus text format.
+
+With METRICS_ENABLED, MetricsMiddleware records for every request the wall
+time, the number and total time of SQL queries, and the time spent
+rendering templates, in histograms per view. /metrics serves them, with
+the p50, p95 and p99 of each histogram, to staff users and to clients that
+send METRICS_TOKEN as a bearer token. Without METRICS_ENABLED the
+middleware removes itself, so requests pay nothing. The hits and misses
+of the results cache of the process are served with them as counters.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template
+from polls.results_cache import results_cache
+
+# Upper bounds of the histogram buckets, in seconds and in queries.
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRICS = (
+    ('view_request_seconds', 'Wall time of requests.', SECONDS_BUCKETS),
+    ('view_sql_queries', 'SQL queries per request.', QUERIES_BUCKETS),
+    ('view_sql_seconds', 'Time in SQL queries per request.', SECONDS_BUCKETS),
+    ('view_template_seconds', 'Time rendering templates per request, '
+                              'including queries run by them.',
+     SECONDS_BUCKETS),
+)
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, with their sum.
+
+    Not thread-safe; Registry holds a lock around it.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by interpolating inside its bucket, like
+        Prometheus' histogram_quantile().
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    # Above the last bound, which is all that is known.
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Registry:
+    """
+    Histograms of every metric per view name, shared by the threads of a
+    process.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, values):
+        """
+        Add one request of a view, with a value for each of METRICS.
+        """
+        with self._lock:
+            histograms = self._histograms.get(view)
+            if histograms is None:
+                histograms = self._histograms[view] = [
+                    Histogram(buckets) for name, help, buckets in METRICS]
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def exposition(self):
+        """
+        Return all metrics in the Prometheus text format.
+        """
+        with self._lock:
+            views = sorted((view, [(list(histogram.counts), histogram.sum,
+                                    histogram.count,
+                                    [histogram.quantile(q)
+                                     for q in QUANTILES])
+                                   for histogram in histograms])
+                           for view, histograms in self._histograms.items())
+        lines = []
+        for index, (name, help, buckets) in enumerate(METRICS):
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} histogram'.format(name))
+            for view, histograms in views:
+                counts, total, count, quantiles = histograms[index]
+                label = 'view="{}"'.format(escape(view))
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                        name, label, bound, cumulative))
+                lines.append('{}_sum{{{}}} {}'.format(name, label, total))
+                lines.append('{}_count{{{}}} {}'.format(name, label, count))
+            lines.append('# HELP {}_quantile Estimated from {}.'.format(
+                name, name))
+            lines.append('# TYPE {}_quantile gauge'.format(name))
+            for view, histograms in views:
+                label = 'view="{}"'.format(escape(view))
+                for q, value in zip(QUANTILES, histograms[index][3]):
+                    if value is not None:
+                        lines.append('{}_quantile{{{},quantile="{}"}} {}'
+                                     .format(name, label, q, value))
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')\
+        .replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def cache_exposition():
+    """
+    Return the lookups of the results cache in the Prometheus text format.
+    """
+    stats = results_cache.stats()
+    lines = []
+    for name, help in (('hits', 'Lookups found in the results cache.'),
+                       ('misses', 'Lookups missing from the results cache.')):
+        metric = 'results_cache_{}_total'.format(name)
+        lines.append('# HELP {} {}'.format(metric, help))
+        lines.append('# TYPE {} counter'.format(metric))
+        lines.append('{} {}'.format(metric, stats[name]))
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    """
+    Measurements of the request being served.
+    """
+    __slots__ = ('queries', 'sql', 'template')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Time a query, as a database execute wrapper.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+def _timed_render(render):
+    """
+    Wrap Template.render of the Django template backend to add its time to
+    the request being measured.
+
+    Included templates are rendered inside it, so are not counted twice.
+    """
+    @functools.wraps(render)
+    def timed(self, *args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.template += time.perf_counter() - start
+    timed.timed = True
+    return timed
+
+
+class MetricsMiddleware:
+    """
+    Record the metrics of every request in the registry.
+
+    Put it first in MIDDLEWARE, so it times the other middleware too. The
+    queries are timed on the connections of the thread serving the request.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        registry.observe(view, (time.perf_counter() - start, timings.queries,
+                                timings.sql, timings.template))
+        return response
+
+
+def metrics(request):
+    """
+    Serve the metrics of this process to staff users or to METRICS_TOKEN.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404("Metrics are disabled.")
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    token = settings.METRICS_TOKEN
+    # Bytes, since compare_digest() refuses str with non-ASCII characters.
+    authorized = token and hmac.compare_digest(
+        authorization.encode(), 'Bearer {}'.format(token).encode())
+    if not (authorized or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(registry.exposition() + cache_exposition(),
+                        content_type='text/plain; version=0.0.4')
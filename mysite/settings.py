@@ -1,130 +1,402 @@
-"""
-Django settings for mysite project.
-
-Generated by 'django-admin startproject' using Django 2.2.5.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/2.2/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/2.2/ref/settings/
-"""
-
-import os
-from decouple import config
-
-# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = config('SECRET_KEY')
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = config('DEBUG', default=False, cast=bool)
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'polls.apps.PollsConfig',
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'mysite.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'mysite.wsgi.application'
-
-
-# Database
-# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
-}
-
-
-# Password validation
-# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.'
-                'UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.'
-                'MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.'
-                'CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.'
-                'NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/2.2/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'Asia/Bangkok'
-
-USE_I18N = True
-
-USE_L10N = True
-
-USE_TZ = True
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/2.2/howto/static-files/
-
-STATIC_URL = '/static/'
-
-LOGIN_REDIRECT_URL = '/polls/'
-
-LOGOUT_REDIRECT_URL = '/polls/'
+"""
+Django settings for mysite project.
+
+Generated by 'django-admin startproject' using Django 2.2.5.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/2.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/2.2/ref/settings/
+"""
+
+import os
+import tempfile
+from decouple import Choices, Csv, config
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = config('SECRET_KEY')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = config('DEBUG', default=False, cast=bool)
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'polls.apps.PollsConfig',
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+]
+
+MIDDLEWARE = [
+    'mysite.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'polls.scheduler.StatusSchedulerMiddleware',
+    'polls.replicas.ReplicaMiddleware',
+]
+
+ROOT_URLCONF = 'mysite.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+# "development" leaves the loaders to Django, which reads templates from
+# disk on every render while DEBUG is on. "production" always keeps the
+# compiled templates in memory for the life of the process.
+TEMPLATE_PROFILE = config('TEMPLATE_PROFILE', default='development',
+                          cast=Choices(['development', 'production']))
+
+if TEMPLATE_PROFILE == 'production':
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
+WSGI_APPLICATION = 'mysite.wsgi.application'
+
+ASGI_APPLICATION = 'mysite.asgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/2.2/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Tests use a file as well. Connections of several threads wait for
+        # each other's locks on a file, but fail at once on the shared
+        # in-memory database that is the default for tests.
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'polls-test.sqlite3'),
+        },
+    }
+}
+
+# "development" keeps the SQLite defaults. "production" keeps connections
+# open between requests and tunes SQLite for concurrent requests: readers
+# and the writer do not block each other in WAL mode, commits wait for the
+# disk only at checkpoints, and writers wait for the lock instead of
+# failing at once.
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='development',
+                          cast=Choices(['development', 'production']))
+
+# PRAGMAs run on every new SQLite connection.
+SQLITE_PRAGMAS = {}
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = config(
+        'DATABASE_CONN_MAX_AGE', default=600, cast=int)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        # Milliseconds to wait for a lock.
+        'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000,
+                               cast=int),
+        # Bytes of the file to read through memory mapping.
+        'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024,
+                            cast=int),
+        # Page cache per connection, in KiB when negative.
+        'cache_size': config('SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    }
+
+# Read replicas
+# SQLite files holding copies of the database, kept up to date outside
+# Django, as a comma-separated list. Read-only poll views read polls from
+# them in turn; writes and everything else use the primary "default".
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+
+# Aliases of the replicas in DATABASES.
+REPLICA_DATABASES = []
+
+for number, name in enumerate(DATABASE_REPLICAS, 1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = dict(DATABASES['default'], NAME=name,
+                            TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['polls.replicas.ReplicaRouter']
+
+# Seconds between health checks of each replica.
+REPLICA_CHECK_INTERVAL = config('REPLICA_CHECK_INTERVAL', default=5,
+                                cast=float)
+
+# Seconds a client that wrote reads from the primary only; more than the
+# replicas lag behind.
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+
+# Times to retry a vote that found the database locked, waiting twice as
+# long before each retry, from VOTE_BUSY_RETRY_DELAY seconds.
+VOTE_BUSY_RETRIES = config('VOTE_BUSY_RETRIES', default=3, cast=int)
+
+VOTE_BUSY_RETRY_DELAY = config('VOTE_BUSY_RETRY_DELAY', default=0.05,
+                               cast=float)
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+RESULTS_CACHE_TIMEOUT = config('RESULTS_CACHE_TIMEOUT', default=60, cast=int)
+
+RESULTS_CACHE_SIZE = config('RESULTS_CACHE_SIZE', default=1000, cast=int)
+
+# Rendered fragments of poll pages kept by the local memory cache. Their
+# keys carry the version of the question, so they never need to expire.
+FRAGMENT_CACHE_SIZE = config('FRAGMENT_CACHE_SIZE', default=5000, cast=int)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ratelimit': {
+        # Use a backend shared by all processes, such as memcached, so the
+        # limits hold across them.
+        'BACKEND': config('RATE_LIMIT_CACHE_BACKEND',
+                          default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('RATE_LIMIT_CACHE_LOCATION',
+                           default='polls-ratelimit'),
+    },
+    'results': {
+        # Local memory caches evict the least recently used entries.
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'polls-results',
+        'TIMEOUT': RESULTS_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': RESULTS_CACHE_SIZE,
+        },
+    },
+    'template_fragments': {
+        # Use a backend shared by all processes, such as memcached, so each
+        # fragment is rendered once for all of them.
+        'BACKEND': config('FRAGMENT_CACHE_BACKEND',
+                          default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('FRAGMENT_CACHE_LOCATION',
+                           default='polls-fragments'),
+        'OPTIONS': {
+            'MAX_ENTRIES': FRAGMENT_CACHE_SIZE,
+        },
+    },
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+                'UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+                'MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+                'CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+                'NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/2.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'Asia/Bangkok'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/2.2/howto/static-files/
+
+STATIC_URL = '/static/'
+
+LOGIN_REDIRECT_URL = '/polls/'
+
+LOGOUT_REDIRECT_URL = '/polls/'
+
+
+# Vote buffer
+# Collect votes in memory and write them to the database in batches.
+
+VOTE_BUFFER = config('VOTE_BUFFER', default=False, cast=bool)
+
+VOTE_BUFFER_FLUSH_INTERVAL = config('VOTE_BUFFER_FLUSH_INTERVAL',
+                                    default=500, cast=int)
+
+VOTE_BUFFER_FLUSH_SIZE = config('VOTE_BUFFER_FLUSH_SIZE',
+                                default=1000, cast=int)
+
+VOTE_BUFFER_FLUSH_ON_EXIT = config('VOTE_BUFFER_FLUSH_ON_EXIT',
+                                   default=True, cast=bool)
+
+# Path prefix of the journal files of buffered votes, which must survive a
+# crash, so not a temporary directory. The default files are ignored by git.
+VOTE_BUFFER_JOURNAL = config('VOTE_BUFFER_JOURNAL',
+                             default=os.path.join(BASE_DIR, 'vote_journal'))
+
+VOTE_BUFFER_FSYNC = config('VOTE_BUFFER_FSYNC', default=False, cast=bool)
+
+
+# Vote shards
+# Spread the votes of each choice over this many rows (0 to disable). The
+# rows are made by the first vote counted in them, and votes counted before
+# shards were enabled stay in Choice.votes, which is part of every total.
+
+VOTE_SHARDS = config('VOTE_SHARDS', default=0, cast=int)
+
+
+# Vote rollups
+# Count the votes of each choice per minute, hour and day for result history
+# charts. Run "manage.py compact_vote_rollups" from cron to remove old
+# buckets. Off by default: every vote written directly also updates the
+# three buckets of its choice, rows that all votes of the choice lock, which
+# undoes VOTE_SHARDS. With VOTE_BUFFER on, the buckets are written once per
+# flush instead.
+
+VOTE_ROLLUPS = config('VOTE_ROLLUPS', default=False, cast=bool)
+
+# Hours minute buckets are kept.
+VOTE_ROLLUP_MINUTE_RETENTION = config('VOTE_ROLLUP_MINUTE_RETENTION',
+                                      default=48, cast=int)
+
+# Days hour buckets are kept. Day buckets are kept for good.
+VOTE_ROLLUP_HOUR_RETENTION = config('VOTE_ROLLUP_HOUR_RETENTION',
+                                    default=90, cast=int)
+
+
+# Metrics
+# Record the time, SQL queries and template rendering of every request per
+# view, served on /metrics to staff users and to clients sending
+# "Authorization: Bearer <METRICS_TOKEN>".
+
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Poll schedule
+# Questions open and close by their status, which the status scheduler moves
+# on at pub_date and end_date. Seconds of upcoming dates it keeps in memory;
+# dates changed by other processes are seen within this time.
+
+POLL_SCHEDULE_HORIZON = config('POLL_SCHEDULE_HORIZON', default=60,
+                               cast=float)
+
+
+# Admin
+# Use the question admin for large tables: capped counts and prefix search.
+
+ADMIN_LARGE_TABLES = config('ADMIN_LARGE_TABLES', default=False, cast=bool)
+
+
+# Search
+# Search questions with the SQLite FTS5 index where the database has one,
+# instead of scanning them with the ORM.
+
+POLL_SEARCH_FTS = config('POLL_SEARCH_FTS', default=True, cast=bool)
+
+# Questions per page of search results.
+POLL_SEARCH_PAGE_SIZE = config('POLL_SEARCH_PAGE_SIZE', default=20, cast=int)
+
+
+# Poll snapshots
+# Directory of the pre-rendered results of closed questions, which are
+# served from it without the database (empty to disable). Run
+# "manage.py rebuild_snapshots" after changing the results template.
+
+POLL_SNAPSHOT_DIR = config('POLL_SNAPSHOT_DIR', default='')
+
+# Seconds browsers and proxies may keep a snapshot.
+POLL_SNAPSHOT_MAX_AGE = config('POLL_SNAPSHOT_MAX_AGE',
+                               default=7 * 24 * 3600, cast=int)
+
+
+# Vote rate limits
+# Votes allowed per client IP address and per logged-in user in a sliding
+# window of VOTE_RATE_LIMIT_WINDOW seconds (0 for no limit). Other votes are
+# answered with 429; those over the limit of the IP address or of the
+# session cookie without touching the database.
+
+VOTE_RATE_LIMIT_IP = config('VOTE_RATE_LIMIT_IP', default=120, cast=int)
+
+VOTE_RATE_LIMIT_USER = config('VOTE_RATE_LIMIT_USER', default=10, cast=int)
+
+VOTE_RATE_LIMIT_WINDOW = config('VOTE_RATE_LIMIT_WINDOW', default=60,
+                                cast=int)
+
+# Reverse proxies in front of the site, each adding a hop to
+# X-Forwarded-For. The client address is taken from the hop of the
+# farthest one; with 0 the header is ignored, since clients can forge it.
+TRUSTED_PROXIES = config('TRUSTED_PROXIES', default=0, cast=int)
+
+
+# Async vote
+# Count votes with an async view, which only pays off under ASGI.
+# mysite/asgi.py turns it on unless ASYNC_VOTE is set.
+
+ASYNC_VOTE = config('ASYNC_VOTE', default=False, cast=bool)
+
+# Threads that run the database work of async views.
+ASYNC_VOTE_THREADS = config('ASYNC_VOTE_THREADS', default=4, cast=int)
+
+
+# Results events
+# Push the results of questions to server-sent event streams (ASGI only).
+
+# Seconds between checks for votes counted by other processes (0 to
+# disable). Votes counted by this process are pushed at once.
+RESULTS_EVENTS_POLL_INTERVAL = config('RESULTS_EVENTS_POLL_INTERVAL',
+                                      default=2.0, cast=float)
+
+# Seconds between comments that keep idle streams open.
+RESULTS_EVENTS_KEEPALIVE = config('RESULTS_EVENTS_KEEPALIVE',
+                                  default=15.0, cast=float)
@@ -1,30 +1,189 @@
-from django.contrib import admin
-
-from .models import Choice, Question
-
-
-class ChoiceInline(admin.TabularInline):
-    """
-    Choice for admin.
-    """
-    model = Choice
-    extra = 3
-
-
-class QuestionAdmin(admin.ModelAdmin):
-    """
-    Question for admin.
-    """
-    fieldsets = [
-        (None, {'fields': ['question_text']}),
-        ('Date information', {'fields': ['pub_date', 'end_date'],
-                              'classes': ['collapse']}),
-    ]
-    inlines = [ChoiceInline]
-    list_display = ('question_text', 'pub_date',
-                    'was_published_recently', 'is_published', 'can_vote')
-    list_filter = ['pub_date']
-    search_fields = ['question_text']
-
-
-admin.site.register(Question, QuestionAdmin)
+import datetime
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import search, snapshots
+from .models import Choice, Question
+from .results_cache import results_cache
+from .signals import questions_closed
+from .versions import forget_stamps
+
+
+class ChoiceInline(admin.TabularInline):
+    """
+    Choice for admin.
+    """
+    model = Choice
+    extra = 3
+
+
+class QuestionChangeList(ChangeList):
+    """
+    Change list that adds choice_count and total_votes to the questions of
+    the page, from one query.
+    """
+
+    def get_results(self, request):
+        super().get_results(request)
+        totals = {question.pk: [0, 0] for question in self.result_list}
+        for question_id, votes in Choice.objects.with_totals()\
+                .filter(question_id__in=list(totals))\
+                .values_list('question_id', 'total_votes'):
+            totals[question_id][0] += 1
+            totals[question_id][1] += votes
+        for question in self.result_list:
+            question.choice_count, question.total_votes = totals[question.pk]
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that counts at most count_cap rows, so the changelist of a
+    large table does not scan all of it on every page.
+    """
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list.values('pk').order_by()[:self.count_cap]\
+            .count()
+
+
+def questions_changed(question_ids, closed=False):
+    """
+    Drop the caches and snapshots of questions changed by an UPDATE, which
+    sends no post_save.
+    """
+    forget_stamps(question_ids, index=True)
+    results_cache.invalidate(question_ids)
+    if closed:
+        transaction.on_commit(lambda: questions_closed.send(
+            sender=Question, question_ids=question_ids))
+    else:
+        transaction.on_commit(lambda: snapshots.remove(question_ids))
+
+
+class QuestionAdmin(admin.ModelAdmin):
+    """
+    Question for admin.
+
+    The recently published, published and votable columns are annotations,
+    so they sort in SQL, and the bulk actions are one UPDATE each.
+    """
+    fieldsets = [
+        (None, {'fields': ['question_text']}),
+        ('Date information', {'fields': ['pub_date', 'end_date'],
+                              'classes': ['collapse']}),
+    ]
+    inlines = [ChoiceInline]
+    list_display = ('question_text', 'pub_date', 'end_date', 'status',
+                    'published_recently', 'published', 'votable',
+                    'choice_count', 'total_votes')
+    list_filter = ['status', 'pub_date']
+    search_fields = ['question_text']
+    actions = ['close', 'reopen', 'extend']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_admin_columns()
+
+    def get_changelist(self, request, **kwargs):
+        return QuestionChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search questions and choices with the full-text index, where there
+        is one.
+        """
+        terms = search.search_terms(search_term)
+        if terms and search.uses_fts(queryset.db):
+            return search.filter_questions(queryset, terms), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def published_recently(self, question):
+        return question.published_recently
+
+    published_recently.admin_order_field = 'published_recently'
+    published_recently.boolean = True
+    published_recently.short_description = 'Published recently?'
+
+    def published(self, question):
+        return question.published
+
+    published.admin_order_field = 'published'
+    published.boolean = True
+    published.short_description = 'Published?'
+
+    def votable(self, question):
+        return question.votable
+
+    votable.admin_order_field = 'votable'
+    votable.boolean = True
+    votable.short_description = 'Can vote?'
+
+    def choice_count(self, question):
+        return question.choice_count
+
+    choice_count.short_description = 'Choices'
+
+    def total_votes(self, question):
+        return question.total_votes
+
+    total_votes.short_description = 'Votes'
+
+    def close(self, request, queryset):
+        """
+        End the selected questions now.
+        """
+        ids = queryset.close()
+        questions_changed(ids, closed=True)
+        self.message_user(request, "Closed {} question(s).".format(len(ids)),
+                          messages.SUCCESS)
+
+    close.short_description = 'Close selected questions now'
+
+    def reopen(self, request, queryset):
+        """
+        Open the selected closed questions for another day.
+        """
+        ids = queryset.reopen(timezone.now() + datetime.timedelta(days=1))
+        questions_changed(ids)
+        self.message_user(request,
+                          "Reopened {} question(s).".format(len(ids)),
+                          messages.SUCCESS)
+
+    reopen.short_description = 'Reopen selected questions for a day'
+
+    def extend(self, request, queryset):
+        """
+        Move the end date of the selected questions a week later.
+        """
+        ids = queryset.extend(datetime.timedelta(days=7))
+        questions_changed(ids)
+        self.message_user(request,
+                          "Extended {} question(s).".format(len(ids)),
+                          messages.SUCCESS)
+
+    extend.short_description = 'Extend selected questions by a week'
+
+
+class LargeQuestionAdmin(QuestionAdmin):
+    """
+    Question for admin on hundreds of thousands of questions.
+
+    Counts stop at CappedCountPaginator.count_cap, the total count is not
+    shown, and without the full-text index search matches the start of
+    question texts, which the case-insensitive index of question_text
+    serves.
+    """
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    search_fields = ['^question_text']
+
+
+admin.site.register(Question, LargeQuestionAdmin if settings.ADMIN_LARGE_TABLES
+                    else QuestionAdmin)
@@ -0,0 +1,242 @@
+"""
+Read-only JSON API and bulk export of the polls.
+"""
+import csv
+import datetime
+
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views import generic
+
+from .models import Choice, Question, Vote, VoteRollup, bucket_start
+from .views import IndexView, ResultsView
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'questions': (('id', 'question_text', 'pub_date', 'end_date'),
+                  Question.objects.all),
+    'choices': (('id', 'question_id', 'choice_text', 'total_votes'),
+                Choice.objects.with_totals),
+    'votes': (('id', 'question_id', 'choice_id', 'user_id'),
+              Vote.objects.all),
+}
+
+
+def question_json(question):
+    """
+    Return the fields of a question shared by every API response.
+    """
+    return {
+        'id': question.pk,
+        'question_text': question.question_text,
+        'pub_date': question.pub_date,
+        'end_date': question.end_date,
+    }
+
+
+def results_json(question):
+    """
+    Return the results of a question from count_results().
+    """
+    data = question_json(question)
+    data['total_votes'] = question.total_votes
+    data['choices'] = [{
+        'id': choice.pk,
+        'choice_text': choice.choice_text,
+        'votes': choice.total_votes,
+        'percentage': choice.percentage,
+    } for choice in question.choices]
+    return data
+
+
+class QuestionListJson(IndexView):
+    """
+    API view for one page of the published questions, newest first.
+    """
+
+    def render_to_response(self, context, **response_kwargs):
+        questions = []
+        for question in context['latest_question_list']:
+            data = question_json(question)
+            data['votable'] = question.votable
+            data['results'] = reverse('polls:api-results',
+                                      args=(question.pk,))
+            questions.append(data)
+        next_page = None
+        if context['next_cursor']:
+            next_page = '{}?after={}'.format(reverse('polls:api-questions'),
+                                             context['next_cursor'])
+        return JsonResponse({'questions': questions, 'next': next_page})
+
+
+class ResultsJson(ResultsView):
+    """
+    API view for the results of a question.
+    """
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(results_json(context['question']))
+
+
+# The finest resolution whose buckets fit in a range of at most this long.
+HISTORY_RESOLUTIONS = [
+    (datetime.timedelta(hours=6), VoteRollup.MINUTE),
+    (datetime.timedelta(days=14), VoteRollup.HOUR),
+]
+
+HISTORY_MAX_BUCKETS = 2000
+
+BUCKET_LENGTHS = {
+    VoteRollup.MINUTE: datetime.timedelta(minutes=1),
+    VoteRollup.HOUR: datetime.timedelta(hours=1),
+    VoteRollup.DAY: datetime.timedelta(days=1),
+}
+
+
+def parse_moment(value, default):
+    """
+    Return the ISO 8601 time in value, in the current time zone if it has
+    none, or default if value is empty.
+    """
+    if not value:
+        return default
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise Http404("Invalid time.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def history_range(params, question):
+    """
+    Return the start, end and resolution of a history request.
+
+    The range defaults to the question's pub_date until now, and the
+    resolution to the finest one that keeps the number of buckets low. The
+    start is moved back to the start of its bucket.
+    """
+    start = parse_moment(params.get('start'), question.pub_date)
+    end = parse_moment(params.get('end'), timezone.now())
+    if end <= start:
+        raise Http404("Invalid range.")
+    resolution = params.get('resolution')
+    if resolution is None:
+        resolution = next((resolution for span, resolution in
+                           HISTORY_RESOLUTIONS if end - start <= span),
+                          VoteRollup.DAY)
+    elif resolution not in VoteRollup.RESOLUTIONS:
+        raise Http404("Invalid resolution.")
+    if (end - start) / BUCKET_LENGTHS[resolution] > HISTORY_MAX_BUCKETS:
+        raise Http404("Too many buckets.")
+    return bucket_start(start, resolution), end, resolution
+
+
+class HistoryJson(generic.DetailView):
+    """
+    API view for the votes of each choice of a question over time.
+
+    Takes start and end times and a resolution of minute, hour or day, all
+    optional. Buckets without votes are left out, and votes[i] is the net
+    number of votes choices[i] gained in a bucket.
+    """
+    model = Question
+
+    def get_queryset(self):
+        return Question.objects.published()
+
+    def render_to_response(self, context, **response_kwargs):
+        question = context['question']
+        start, end, resolution = history_range(self.request.GET, question)
+        choices = list(question.choice_set.order_by('pk')
+                       .values_list('pk', 'choice_text'))
+        data = question_json(question)
+        data.update({
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'choices': [{'id': pk, 'choice_text': choice_text}
+                        for pk, choice_text in choices],
+            'buckets': [{
+                'start': bucket,
+                'votes': [counts.get(pk, 0) for pk, choice_text in choices],
+            } for bucket, counts in VoteRollup.objects.history(
+                question.pk, start, end, resolution)],
+        })
+        return JsonResponse(data)
+
+
+class Echo:
+    """
+    File-like object that returns what is written, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def ndjson_chunks(fields, rows):
+    """
+    Yield rows as lines of JSON objects, one chunk of rows at a time.
+    """
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(fields, row))))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(fields, rows):
+    """
+    Yield a header line and then rows as CSV, one chunk of rows at a time.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    'csv': (csv_chunks, 'text/csv'),
+}
+
+
+def export(request, table, format):
+    """
+    Stream every row of a table as NDJSON or CSV, for staff only.
+
+    Rows are read with a database cursor EXPORT_CHUNK_SIZE at a time and
+    sent as they are read, so memory use does not grow with the table.
+    """
+    if not request.user.is_staff:
+        raise PermissionDenied
+    if table not in EXPORTS or format not in FORMATS:
+        raise Http404("No such export.")
+    fields, queryset = EXPORTS[table]
+    rows = queryset().order_by('pk').values_list(*fields)
+    chunks, content_type = FORMATS[format]
+    response = StreamingHttpResponse(
+        chunks(fields, rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)),
+        content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(
+        table, format)
+    return response
@@ -1,8 +1,16 @@
-from django.apps import AppConfig
-
-
-class PollsConfig(AppConfig):
-    """
-    Polls config.
-    """
-    name = 'polls'
+from django.apps import AppConfig
+
+
+class PollsConfig(AppConfig):
+    """
+    Polls config.
+    """
+    name = 'polls'
+
+    def ready(self):
+        """
+        Connect the signal receivers of the database, the results cache,
+        versions, results events, the status scheduler and snapshots.
+        """
+        from . import (  # noqa: F401
+            database, events, results_cache, scheduler, snapshots, versions)
@@ -0,0 +1,57 @@
+"""
+Tuning and lock handling of the SQLite database.
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Run SQLITE_PRAGMAS on a new SQLite connection.
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def is_busy(error):
+    """
+    Tell if an OperationalError is SQLite failing to get a lock.
+    """
+    return 'locked' in str(error)
+
+
+def retry_on_busy(function):
+    """
+    Retry a function that writes in its own transaction when the database
+    is locked, up to VOTE_BUSY_RETRIES times.
+
+    Locks held across a busy timeout are not waited for by SQLite when
+    waiting could deadlock, such as a reader that wants to write after
+    another writer committed; those transactions must start over. Each
+    retry waits about twice as long as the one before, with jitter so
+    colliding writers spread out. Inside an outer transaction nothing is
+    retried, as only the outer transaction can start over.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        delay = settings.VOTE_BUSY_RETRY_DELAY
+        for attempt in range(settings.VOTE_BUSY_RETRIES):
+            try:
+                return function(*args, **kwargs)
+            except OperationalError as error:
+                if not is_busy(error) or connection.in_atomic_block:
+                    raise
+            time.sleep(delay * random.uniform(1, 2))
+            delay *= 2
+        return function(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,269 @@
+"""
+Live results of questions as server-sent events.
+
+Streams are served by the ASGI application in mysite/asgi.py, outside the
+Django request cycle, so an open stream costs a socket and a coroutine
+instead of a worker thread.
+"""
+import asyncio
+import json
+import logging
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.dispatch import receiver
+
+from .models import Choice, Question
+from .signals import votes_changed
+from .versions import question_stamp
+
+log = logging.getLogger("polls")
+
+KEEPALIVE = b': keepalive\n\n'
+
+
+def read_results(known, force=()):
+    """
+    Return {question id: (version, message)} of the questions whose version
+    is not the known one, or that are in force.
+
+    known maps question ids to the version last sent, or None. Votes do not
+    bump the version of questions, so the version of a message is a
+    checksum of its results. The questions cost one query and the results
+    of all of them one more.
+    """
+    results = {pk: [] for pk in Question.objects.filter(pk__in=list(known))
+               .values_list('pk', flat=True)}
+    for question_id, pk, votes in Choice.objects.with_totals()\
+            .filter(question_id__in=list(results)).order_by('pk')\
+            .values_list('question_id', 'pk', 'total_votes'):
+        results[question_id].append({'id': pk, 'votes': votes})
+    messages = {}
+    for pk, choices in results.items():
+        total = sum(choice['votes'] for choice in choices)
+        for choice in choices:
+            choice['percentage'] = round(100 * choice['votes'] / total, 1) \
+                if total else 0
+        data = json.dumps({'question': pk, 'total_votes': total,
+                           'choices': choices})
+        version = '{:08x}'.format(zlib.crc32(data.encode()))
+        if version != known[pk] or pk in force:
+            messages[pk] = (version, 'id: {}\ndata: {}\n\n'.format(
+                version, data).encode())
+    return messages
+
+
+class Subscription:
+    """
+    Latest results message of one stream that it has not sent yet.
+
+    A stream that sends slower than results change skips to the latest
+    results instead of buffering them.
+    """
+    __slots__ = ('message', 'waiter')
+
+    def __init__(self):
+        self.message = None
+        self.waiter = None
+
+    def put(self, message):
+        self.message = message
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self, timeout):
+        """
+        Wait up to timeout seconds for a message or a wake(), and return the
+        message or None.
+        """
+        if self.message is None:
+            loop = asyncio.get_event_loop()
+            self.waiter = loop.create_future()
+            timer = loop.call_later(timeout, self.wake)
+            try:
+                await self.waiter
+            finally:
+                timer.cancel()
+                self.waiter = None
+        message, self.message = self.message, None
+        return message
+
+
+class ResultsEvents:
+    """
+    In-process fan-out of question results to server-sent event streams.
+
+    All streams of a process share one watcher task. It reads the results of
+    a question once when they change and sends the same message to every
+    stream of the question, so the number of queries does not grow with
+    the number of streams. Votes counted by this process are pushed at once
+    through the votes_changed signal; votes counted by other processes are
+    found by reading the results of all watched questions every
+    RESULTS_EVENTS_POLL_INTERVAL seconds, with two queries.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._latest = {}
+        self._waiting = {}
+        self._pending = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def subscribe(self, question_id):
+        """
+        Return a Subscription that receives the results messages of a
+        question, starting with the current results. Call from the event
+        loop.
+        """
+        self._start()
+        subscription = Subscription()
+        self._streams.setdefault(question_id, set()).add(subscription)
+        latest = self._latest.get(question_id)
+        if latest is not None:
+            subscription.put(latest[1])
+        else:
+            self._waiting.setdefault(question_id, set()).add(subscription)
+            self._pending.add(question_id)
+            self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, question_id, subscription):
+        """
+        Stop sending results to a subscription. Call from the event loop.
+        """
+        streams = self._streams.get(question_id, set())
+        streams.discard(subscription)
+        self._waiting.get(question_id, set()).discard(subscription)
+        if not streams:
+            self._streams.pop(question_id, None)
+            self._latest.pop(question_id, None)
+            self._waiting.pop(question_id, None)
+
+    def subscribers(self):
+        """
+        Return the number of open streams.
+        """
+        return sum(len(streams) for streams in self._streams.values())
+
+    def notify(self, question_ids):
+        """
+        Send the new results of the questions to their streams soon.
+
+        Safe to call from any thread. Does nothing in a process that serves
+        no streams.
+        """
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake, list(question_ids))
+
+    def _wake(self, question_ids):
+        watched = [pk for pk in question_ids if pk in self._streams]
+        if watched:
+            self._pending.update(watched)
+            self._wakeup.set()
+
+    def _start(self):
+        """
+        Start the watcher on the running event loop.
+        """
+        loop = asyncio.get_event_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._latest.clear()
+        self._waiting.clear()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        """
+        Read and send new results when notified or every poll interval.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    settings.RESULTS_EVENTS_POLL_INTERVAL or None)
+                polled = False
+            except asyncio.TimeoutError:
+                polled = True
+            self._wakeup.clear()
+            pending, self._pending = self._pending, set()
+            watched = self._streams if polled \
+                else pending & set(self._streams)
+            if not watched:
+                continue
+            known = {pk: self._latest[pk][0] if pk in self._latest else None
+                     for pk in watched}
+            try:
+                results = await sync_to_async(
+                    read_results, thread_sensitive=False)(known, pending)
+            except Exception:
+                log.exception("Could not read results for events.")
+                continue
+            for pk, latest in results.items():
+                if pk not in self._streams:
+                    continue
+                waiting = self._waiting.pop(pk, set())
+                if pk in self._latest and self._latest[pk][0] == latest[0]:
+                    # Read again for new streams, the others have it.
+                    streams = waiting
+                else:
+                    streams = self._streams[pk]
+                self._latest[pk] = latest
+                for subscription in streams:
+                    subscription.put(latest[1])
+
+    async def stream(self, question_id, receive, send):
+        """
+        ASGI application of the event stream of a question.
+        """
+        message = await receive()
+        while message.get('more_body'):
+            message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        stamp = await sync_to_async(question_stamp,
+                                    thread_sensitive=False)(question_id)
+        if stamp is None:
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body',
+                        'body': b'Not found.'})
+            return
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        subscription = self.subscribe(question_id)
+        # The next message of the client is its disconnect.
+        disconnect = asyncio.ensure_future(receive())
+        disconnect.add_done_callback(lambda future: subscription.wake())
+        try:
+            while True:
+                body = await subscription.wait(
+                    settings.RESULTS_EVENTS_KEEPALIVE)
+                if disconnect.done():
+                    break
+                await send({'type': 'http.response.body',
+                            'body': body or KEEPALIVE, 'more_body': True})
+        finally:
+            disconnect.cancel()
+            self.unsubscribe(question_id, subscription)
+
+
+results_events = ResultsEvents()
+
+
+@receiver(votes_changed)
+def push_voted_results(sender, question_ids, **kwargs):
+    """
+    Push results to streams when votes were counted by this process.
+    """
+    results_events.notify(question_ids)
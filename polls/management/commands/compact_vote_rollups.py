@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from polls.models import VoteRollup
+
+
+class Command(BaseCommand):
+    """
+    Remove old vote rollup buckets whose votes coarser ones hold.
+    """
+    help = ("Remove the minute buckets of vote rollups older than "
+            "VOTE_ROLLUP_MINUTE_RETENTION hours and the hour buckets older "
+            "than VOTE_ROLLUP_HOUR_RETENTION days, whose votes are kept in "
+            "hour and day buckets. Run it from cron, e.g. every hour.")
+
+    def handle(self, *args, **options):
+        removed = VoteRollup.objects.compact()
+        self.stdout.write(self.style.SUCCESS(
+            "Removed {} old vote rollup bucket(s).".format(removed)))
@@ -0,0 +1,227 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from polls import snapshots
+from polls.models import Choice, Question
+from polls.results_cache import results_cache
+from polls.versions import forget_stamps
+
+QUESTION_FIELDS = ('question_text', 'pub_date', 'end_date')
+# Ids per IN (...) lookup, below the SQLite limit of query parameters.
+LOOKUP_SIZE = 500
+
+
+def parse_date(value, line):
+    """
+    Return an aware datetime from an ISO 8601 string of the file.
+    """
+    date = parse_datetime(value or '')
+    if date is None:
+        raise CommandError("Line {}: invalid date {!r}.".format(line, value))
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def make_record(row, choices, line):
+    """
+    Return a question record of the importer from the fields of a row.
+    """
+    external_id = (row.get('external_id') or '').strip()
+    if not external_id:
+        raise CommandError("Line {}: missing external_id.".format(line))
+    return {
+        'external_id': external_id,
+        'question_text': row.get('question_text') or '',
+        'pub_date': parse_date(row.get('pub_date'), line),
+        'end_date': parse_date(row.get('end_date'), line),
+        'choices': choices,
+    }
+
+
+def read_jsonl(path):
+    """
+    Yield the questions of a JSONL file, one JSON object per line with the
+    question fields and a list of choice texts as "choices".
+    """
+    with open(path, encoding='utf-8') as lines:
+        for line, text in enumerate(lines, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as error:
+                raise CommandError("Line {}: {}.".format(line, error))
+            yield make_record(row, list(row.get('choices') or []), line)
+
+
+def read_csv(path):
+    """
+    Yield the questions of a CSV file with one row per choice.
+
+    Consecutive rows with the same external_id are one question, whose
+    fields are taken from its first row. A row without choice_text adds
+    no choice.
+    """
+    with open(path, encoding='utf-8', newline='') as lines:
+        # Line numbers start after the header and are exact for rows
+        # without line breaks inside fields.
+        rows = enumerate(csv.DictReader(lines), 2)
+        for external_id, group in itertools.groupby(
+                rows, key=lambda row: row[1].get('external_id')):
+            group = list(group)
+            choices = [row['choice_text'] for line, row in group
+                       if row.get('choice_text')]
+            yield make_record(group[0][1], choices, group[0][0])
+
+
+READERS = {
+    '.jsonl': read_jsonl,
+    '.csv': read_csv,
+}
+
+
+def questions_by_external_id(external_ids, fields=('pk',)):
+    """
+    Return a mapping of external id to the values of fields of the
+    questions that exist.
+    """
+    external_ids = list(external_ids)
+    questions = {}
+    for start in range(0, len(external_ids), LOOKUP_SIZE):
+        for row in Question.objects.filter(
+                external_id__in=external_ids[start:start + LOOKUP_SIZE])\
+                .values_list('external_id', *fields):
+            questions[row[0]] = row[1:]
+    return questions
+
+
+def import_chunk(records, batch_size):
+    """
+    Create or update a chunk of question records in one transaction.
+
+    Questions are matched on external_id. New questions and choices are
+    inserted with bulk_create. Existing questions are updated with
+    bulk_update only if their fields changed, and get only the choices
+    they do not have yet, so votes survive a re-run.
+    Return (created, updated, unchanged, choices).
+    """
+    # The last record wins if a chunk repeats an external id.
+    records = {record['external_id']: record for record in records}
+    with transaction.atomic():
+        existing = questions_by_external_id(records, ('pk',) + QUESTION_FIELDS)
+        ids = {external_id: values[0]
+               for external_id, values in existing.items()}
+        new = [Question(external_id=external_id,
+                        **{field: record[field] for field in QUESTION_FIELDS})
+               for external_id, record in records.items()
+               if external_id not in existing]
+        # bulk_create and bulk_update do not call save(), which sets the
+        # status from the dates.
+        for question in new:
+            question.status = question.status_at()
+        Question.objects.bulk_create(new, batch_size=batch_size)
+        if any(question.pk is None for question in new):
+            # The database does not return ids from bulk inserts, so map
+            # the new questions with one lookup per chunk.
+            ids.update((external_id, values[0]) for external_id, values
+                       in questions_by_external_id(
+                           question.external_id for question in new).items())
+        else:
+            ids.update((question.external_id, question.pk)
+                       for question in new)
+        changed = [Question(pk=values[0],
+                            **{field: records[external_id][field]
+                               for field in QUESTION_FIELDS})
+                   for external_id, values in existing.items()
+                   if values[1:] != tuple(records[external_id][field]
+                                          for field in QUESTION_FIELDS)]
+        for question in changed:
+            question.status = question.status_at()
+        Question.objects.bulk_update(changed, QUESTION_FIELDS + ('status',),
+                                     batch_size=batch_size)
+        old_choices = set()
+        existing_ids = list(ids[external_id] for external_id in existing)
+        for start in range(0, len(existing_ids), LOOKUP_SIZE):
+            old_choices.update(Choice.objects.filter(
+                question_id__in=existing_ids[start:start + LOOKUP_SIZE])
+                .values_list('question_id', 'choice_text'))
+        choices = [Choice(question_id=ids[external_id], choice_text=text)
+                   for external_id, record in records.items()
+                   for text in dict.fromkeys(record['choices'])
+                   if (ids[external_id], text) not in old_choices]
+        Choice.objects.bulk_create(choices, batch_size=batch_size)
+        # bulk_create and bulk_update send no signals, so do what the
+        # receivers of save() would do for the questions that changed.
+        created_ids = {ids[question.external_id] for question in new}
+        touched = sorted({question.pk for question in changed} | {
+            choice.question_id for choice in choices
+            if choice.question_id not in created_ids})
+        for start in range(0, len(touched), LOOKUP_SIZE):
+            Question.objects.touch(touched[start:start + LOOKUP_SIZE])
+        if new or touched:
+            forget_stamps(touched, index=True)
+        transaction.on_commit(lambda: results_cache.invalidate(touched))
+        transaction.on_commit(lambda: snapshots.remove(touched))
+    return (len(new), len(changed), len(existing) - len(changed),
+            len(choices))
+
+
+class Command(BaseCommand):
+    """
+    Import questions and their choices from CSV or JSONL files.
+    """
+    help = ("Create or update questions and their choices from CSV or JSONL "
+            "files, matching questions on external_id so a file can be "
+            "imported again. CSV files have the columns external_id, "
+            "question_text, pub_date, end_date and choice_text, with one row "
+            "per choice. JSONL files have one question per line, with its "
+            "choice texts in \"choices\".")
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', metavar='file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="File format, by default from the file "
+                                 "extension.")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Rows per INSERT or UPDATE statement.")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Questions per transaction.")
+
+    def handle(self, *args, **options):
+        created = updated = unchanged = choices = rows = 0
+        start = time.perf_counter()
+        for path in options['files']:
+            extension = '.' + options['format'] if options['format'] \
+                else os.path.splitext(path)[1].lower()
+            if extension not in READERS:
+                raise CommandError("Unknown format of {}.".format(path))
+            records = READERS[extension](path)
+            while True:
+                chunk = list(itertools.islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                rows += sum(1 + len(record['choices']) for record in chunk)
+                counts = import_chunk(chunk, options['batch_size'])
+                created += counts[0]
+                updated += counts[1]
+                unchanged += counts[2]
+                choices += counts[3]
+                self.stdout.write("{}: {} question(s) created, {} updated, "
+                                  "{} unchanged.".format(
+                                      path, created, updated, unchanged))
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            "Imported {} question(s) ({} created, {} updated, {} unchanged) "
+            "and {} new choice(s) from {} row(s) in {:.1f} s, {:.0f} rows/s."
+            .format(created + updated + unchanged, created, updated,
+                    unchanged, choices, rows, seconds,
+                    rows / seconds if seconds else 0)))
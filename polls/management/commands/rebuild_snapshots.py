@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import snapshots
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    """
+    Write the snapshots of every closed question again.
+    """
+    help = ("Render the results of every closed question into "
+            "POLL_SNAPSHOT_DIR again, after the results template changed, "
+            "and remove snapshots of questions that are no longer closed.")
+
+    def handle(self, *args, **options):
+        if not snapshots.enabled():
+            raise CommandError("Set POLL_SNAPSHOT_DIR to write snapshots.")
+        closed = set(Question.objects.closed().values_list('pk', flat=True))
+        stale = snapshots.saved_ids() - closed
+        snapshots.remove(stale)
+        written = snapshots.save_closed(sorted(closed), rebuild=True)
+        self.stdout.write(self.style.SUCCESS(
+            "Wrote the snapshots of {} question(s) and removed {}.".format(
+                written, len(stale))))
@@ -0,0 +1,214 @@
+import json
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import (
+    Count, F, IntegerField, Max, Min, OuterRef, Subquery, Sum)
+from django.db.models.functions import Coalesce
+
+from polls.database import retry_on_busy
+from polls.models import Choice, ChoiceVoteShard, Question, Vote
+from polls.signals import votes_changed
+
+
+def count_range(low, high):
+    """
+    Return (choice id, question id, recorded total, counted votes) of the
+    choices of questions with ids from low to below high.
+
+    It is one statement, so the totals and the counts are read from the
+    same state of the database. The votes of every choice are counted by
+    a GROUP BY on the index of Vote.choice.
+    """
+    counted = Vote.objects.filter(choice=OuterRef('pk')).order_by()\
+        .values('choice').annotate(count=Count('pk')).values('count')
+    shards = ChoiceVoteShard.objects.filter(choice=OuterRef('pk')).order_by()\
+        .values('choice').annotate(total=Sum('count')).values('total')
+    return list(Choice.objects.filter(question_id__gte=low,
+                                      question_id__lt=high)
+                .annotate(
+                    total=F('votes') + Coalesce(
+                        Subquery(shards, output_field=IntegerField()), 0),
+                    counted=Coalesce(
+                        Subquery(counted, output_field=IntegerField()), 0))
+                .values_list('pk', 'question_id', 'total', 'counted'))
+
+
+@retry_on_busy
+def fix_counts(deltas, question_ids, batch_size):
+    """
+    Add deltas, a mapping of choice id to the votes it is off by, to the
+    counters in one short transaction.
+
+    The counters are moved by the difference instead of being set, so
+    votes counted since the choices were read are kept.
+    """
+    with transaction.atomic():
+        Choice.objects.add_votes(deltas, batch_size, rollups=False)
+        transaction.on_commit(lambda: votes_changed.send(
+            sender=Choice, question_ids=question_ids))
+
+
+def recount_range(low, high, fix, batch_size):
+    """
+    Recount the votes of questions with ids from low to below high, and fix
+    the counters that are off if fix is set.
+
+    Return the range, the numbers of choices and votes checked, and the
+    mismatches as (question id, choice id, recorded, counted).
+    """
+    choices = count_range(low, high)
+    mismatches = [(question_id, pk, total, counted)
+                  for pk, question_id, total, counted in choices
+                  if total != counted]
+    if fix and mismatches:
+        fix_counts({pk: counted - total
+                    for question_id, pk, total, counted in mismatches},
+                   sorted({mismatch[0] for mismatch in mismatches}),
+                   batch_size)
+    return {
+        'low': low,
+        'high': high,
+        'choices': len(choices),
+        'votes': sum(choice[3] for choice in choices),
+        'mismatches': mismatches,
+    }
+
+
+def recount_range_star(args):
+    return recount_range(*args)
+
+
+def start_worker():
+    """
+    Set up Django in a worker process of the pool.
+    """
+    import django
+    django.setup()
+
+
+class Checkpoint:
+    """
+    Progress of a recount, saved to a JSON file after every range.
+
+    A recount started again with the same file and options skips the
+    ranges that are done. The file is removed when the recount finishes.
+    """
+
+    def __init__(self, path, options):
+        self.path = path
+        self.options = options
+        self.done = set()
+        self.totals = {'choices': 0, 'votes': 0, 'mismatches': 0}
+        if path and os.path.exists(path):
+            with open(path) as checkpoint:
+                state = json.load(checkpoint)
+            if state['options'] != options:
+                raise CommandError(
+                    "The checkpoint {} was made with {}; run with the same "
+                    "options or remove it.".format(path, state['options']))
+            self.done = set(state['done'])
+            self.totals = state['totals']
+
+    def add(self, result):
+        self.done.add(result['low'])
+        self.totals['choices'] += result['choices']
+        self.totals['votes'] += result['votes']
+        self.totals['mismatches'] += len(result['mismatches'])
+        if self.path:
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w') as checkpoint:
+                json.dump({'options': self.options,
+                           'done': sorted(self.done),
+                           'totals': self.totals}, checkpoint)
+            os.replace(temporary, self.path)
+
+    def finish(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Command(BaseCommand):
+    """
+    Recount the votes of choices from the votes of users.
+    """
+    help = ("Count the Vote rows of every choice, question id range by range, "
+            "report the choices whose vote counter is off and, with --fix, "
+            "correct them. Each range is read with one statement and fixed "
+            "in its own short transaction, so the site can stay up; stop "
+            "the vote buffer first, as its votes are recorded before they "
+            "are counted. With --checkpoint an interrupted recount resumes "
+            "where it stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Correct the counters that are off.")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Question ids per range.")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Choices per UPDATE statement.")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Processes that recount ranges in "
+                                 "parallel.")
+        parser.add_argument('--checkpoint',
+                            help="File to save progress to and resume from.")
+
+    def handle(self, *args, **options):
+        if options['fix'] and settings.VOTE_BUFFER:
+            self.stderr.write("VOTE_BUFFER is on: votes waiting in a buffer "
+                              "are counted twice if they are fixed now.")
+        checkpoint = Checkpoint(options['checkpoint'], {
+            'fix': options['fix'], 'chunk_size': options['chunk_size']})
+        if checkpoint.done:
+            self.stdout.write("Resuming after {} range(s).".format(
+                len(checkpoint.done)))
+        bounds = Question.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        size = options['chunk_size']
+        # Ranges start at multiples of the chunk size, so they stay the
+        # same when a resumed recount finds other questions.
+        ranges = [] if bounds['low'] is None else [
+            (low, low + size, options['fix'], options['batch_size'])
+            for low in range(bounds['low'] - bounds['low'] % size,
+                             bounds['high'] + 1, size)
+            if low not in checkpoint.done]
+        start = time.perf_counter()
+        if options['processes'] > 1:
+            # Workers open their own connections.
+            connections.close_all()
+            with multiprocessing.Pool(options['processes'],
+                                      initializer=start_worker) as pool:
+                for result in pool.imap_unordered(recount_range_star, ranges):
+                    self.record(checkpoint, result, options)
+        else:
+            for result in map(recount_range_star, ranges):
+                self.record(checkpoint, result, options)
+        checkpoint.finish()
+        seconds = time.perf_counter() - start
+        totals = checkpoint.totals
+        self.stdout.write(self.style.SUCCESS(
+            "Checked {} vote(s) of {} choice(s) in {:.1f} s, {:.0f} votes/s: "
+            "{} counter(s) {}.".format(
+                totals['votes'], totals['choices'], seconds,
+                totals['votes'] / seconds if seconds else 0,
+                totals['mismatches'],
+                'fixed' if options['fix'] else 'off')))
+
+    def record(self, checkpoint, result, options):
+        """
+        Report the mismatches of a finished range and save the progress.
+        """
+        if options['verbosity'] > 0:
+            for question_id, pk, total, counted in result['mismatches']:
+                self.stdout.write(
+                    "Question {} choice {}: {} vote(s) recorded, {} counted."
+                    .format(question_id, pk, total, counted))
+        checkpoint.add(result)
+        if options['verbosity'] > 1:
+            self.stdout.write("Questions {} to {}: {} vote(s) of {} "
+                              "choice(s).".format(
+                                  result['low'], result['high'] - 1,
+                                  result['votes'], result['choices']))
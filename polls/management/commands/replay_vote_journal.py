@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from polls.models import Choice
+from polls.vote_buffer import journal_files, read_journal
+
+
+class Command(BaseCommand):
+    """
+    Replay votes left in vote buffer journals.
+    """
+    help = ("Add the votes recorded in vote buffer journals to the database "
+            "and remove the journals. Run it while the site is stopped, "
+            "e.g. after a crash, so no running buffer still owns a journal.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal', default=settings.VOTE_BUFFER_JOURNAL,
+                            help="Journal path prefix (VOTE_BUFFER_JOURNAL).")
+
+    def handle(self, *args, **options):
+        paths = journal_files(options['journal'])
+        total = 0
+        for path in paths:
+            counts = read_journal(path)
+            with transaction.atomic():
+                Choice.objects.add_votes(counts)
+            os.remove(path)
+            total += sum(counts.values())
+            self.stdout.write("Replayed {} vote(s) from {}.".format(
+                sum(counts.values()), path))
+        self.stdout.write(self.style.SUCCESS(
+            "Replayed {} vote(s) from {} journal file(s).".format(
+                total, len(paths))))
@@ -0,0 +1,36 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from polls.scheduler import StatusScheduler
+
+
+class Command(BaseCommand):
+    """
+    Open and close questions at their pub_date and end_date.
+    """
+    help = ("Move the status of questions on when their pub_date or "
+            "end_date passes. Requests do this too, so run it where "
+            "questions must open and close on time while the site is idle, "
+            "or from cron with --once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Advance the statuses once and exit.")
+
+    def handle(self, *args, **options):
+        scheduler = StatusScheduler(settings.POLL_SCHEDULE_HORIZON)
+        if options['once']:
+            changed = scheduler.run_due()
+            self.stdout.write(self.style.SUCCESS(
+                "Changed the status of {} question(s).".format(len(changed))))
+            return
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stop.set())
+        self.stdout.write("Scheduling polls, stop with Ctrl-C.")
+        scheduler.run(stop)
+        connection.close()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from polls import snapshots
+
+
+class Command(BaseCommand):
+    """
+    Write the snapshots of closed questions that have none.
+    """
+    help = ("Render the results of closed questions without a snapshot "
+            "into POLL_SNAPSHOT_DIR. Questions closed by the scheduler get "
+            "one already; run this after importing closed questions.")
+
+    def handle(self, *args, **options):
+        if not snapshots.enabled():
+            raise CommandError("Set POLL_SNAPSHOT_DIR to write snapshots.")
+        written = snapshots.save_closed()
+        self.stdout.write(self.style.SUCCESS(
+            "Wrote the snapshots of {} question(s).".format(written)))
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def set_statuses(apps, schema_editor):
+    """
+    Set the status of existing questions from their dates.
+    """
+    Question = apps.get_model('polls', 'Question')
+    now = timezone.now()
+    Question.objects.filter(pub_date__lte=now, end_date__gte=now)\
+        .update(status='open')
+    Question.objects.filter(pub_date__lte=now, end_date__lt=now)\
+        .update(status='closed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0008_question_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='status',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('open', 'Open'), ('closed', 'Closed')], default='scheduled', editable=False, max_length=9),
+        ),
+        migrations.RunPython(set_statuses, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', 'pub_date'], name='question_status_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['status', 'end_date'], name='question_status_end_date_idx'),
+        ),
+    ]
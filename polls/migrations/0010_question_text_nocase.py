@@ -0,0 +1,16 @@
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0009_question_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(django.db.models.functions.comparison.Collate('question_text', 'NOCASE'), name='question_text_nocase_idx'),
+        ),
+    ]
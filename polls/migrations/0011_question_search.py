@@ -0,0 +1,105 @@
+from django.db import migrations
+
+# One row per question, whose rowid is the id of the question, with its
+# text and the texts of its choices. Triggers keep it in sync with every
+# write, bulk ones included. SQLite drops them when a later migration
+# rebuilds polls_question or polls_choice, as it does to alter most columns,
+# so such a migration must create the triggers of CREATE_SEARCH again;
+# polls.tests.test_search checks that they exist.
+CREATE_SEARCH = [
+    "CREATE VIRTUAL TABLE polls_question_search USING fts5("
+    "question_text, choice_text, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO polls_question_search (rowid, question_text, choice_text) "
+    "SELECT id, question_text, coalesce((SELECT group_concat(choice_text, ' ') "
+    "FROM polls_choice WHERE question_id = polls_question.id), '') "
+    "FROM polls_question",
+    "CREATE TRIGGER polls_question_search_insert AFTER INSERT ON polls_question "
+    "BEGIN "
+    "INSERT INTO polls_question_search (rowid, question_text, choice_text) "
+    "VALUES (new.id, new.question_text, ''); "
+    "END",
+    "CREATE TRIGGER polls_question_search_update "
+    "AFTER UPDATE OF question_text ON polls_question "
+    "BEGIN "
+    "UPDATE polls_question_search SET question_text = new.question_text "
+    "WHERE rowid = new.id; "
+    "END",
+    "CREATE TRIGGER polls_question_search_delete AFTER DELETE ON polls_question "
+    "BEGIN "
+    "DELETE FROM polls_question_search WHERE rowid = old.id; "
+    "END",
+]
+
+# The choice texts of a question are written again whenever one of its
+# choices is added, renamed, moved or removed.
+UPDATE_CHOICES = (
+    "UPDATE polls_question_search SET choice_text = coalesce("
+    "(SELECT group_concat(choice_text, ' ') FROM polls_choice "
+    "WHERE question_id = {row}.question_id), '') "
+    "WHERE rowid = {row}.question_id; "
+)
+
+CREATE_SEARCH += [
+    "CREATE TRIGGER polls_choice_search_insert AFTER INSERT ON polls_choice "
+    "BEGIN " + UPDATE_CHOICES.format(row='new') + "END",
+    "CREATE TRIGGER polls_choice_search_update "
+    "AFTER UPDATE OF choice_text, question_id ON polls_choice "
+    "BEGIN " + UPDATE_CHOICES.format(row='old')
+    + UPDATE_CHOICES.format(row='new') + "END",
+    "CREATE TRIGGER polls_choice_search_delete AFTER DELETE ON polls_choice "
+    "BEGIN " + UPDATE_CHOICES.format(row='old') + "END",
+]
+
+DROP_SEARCH = [
+    "DROP TRIGGER IF EXISTS polls_choice_search_delete",
+    "DROP TRIGGER IF EXISTS polls_choice_search_update",
+    "DROP TRIGGER IF EXISTS polls_choice_search_insert",
+    "DROP TRIGGER IF EXISTS polls_question_search_delete",
+    "DROP TRIGGER IF EXISTS polls_question_search_update",
+    "DROP TRIGGER IF EXISTS polls_question_search_insert",
+    "DROP TABLE IF EXISTS polls_question_search",
+]
+
+
+def has_fts5(schema_editor):
+    """
+    Check that the database is SQLite built with FTS5.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def create_search(apps, schema_editor):
+    """
+    Create the full-text index of questions, on SQLite with FTS5 only.
+
+    Other databases search with the ORM, see polls.search.
+    """
+    if has_fts5(schema_editor):
+        for statement in CREATE_SEARCH:
+            schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    """
+    Drop the full-text index of questions.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_SEARCH:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_question_text_nocase'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
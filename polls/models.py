@@ -1,71 +1,660 @@
-import datetime
-import django.contrib.auth.models
-
-from django.db import models
-from django.utils import timezone
-
-
-class Question(models.Model):
-    """
-    Question for model.
-    """
-    question_text = models.CharField(max_length=200)
-    pub_date = models.DateTimeField('date published')
-    end_date = models.DateTimeField('date ended')
-    current_vote = models.CharField(max_length=200)
-
-    def __str__(self):
-        """
-        String.
-        """
-        return self.question_text
-
-    def was_published_recently(self):
-        """
-        Check recently published question.
-        """
-        now = timezone.now()
-        return now - datetime.timedelta(days=1) <= self.pub_date <= now
-
-    was_published_recently.admin_order_field = 'pub_date'
-    was_published_recently.boolean = True
-    was_published_recently.short_description = 'Published recently?'
-
-    def is_published(self):
-        """
-        Check published question.
-        """
-        now = timezone.now()
-        if now >= self.pub_date:
-            return True
-        return False
-
-    def can_vote(self):
-        """
-        Check question which can be voted.
-        """
-        now = timezone.now()
-        if self.is_published() and now <= self.end_date:
-            return True
-        return False
-
-
-class Choice(models.Model):
-    """
-    Choice for model.
-    """
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    choice_text = models.CharField(max_length=200)
-    votes = models.IntegerField(default=0)
-
-    def __str__(self):
-        """
-        Return choice text.
-        """
-        return self.choice_text
-
-
-class Vote(models.Model):
-    question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
-    user = models.ForeignKey(django.contrib.auth.models.User, on_delete=models.CASCADE)
\ No newline at end of file
+import datetime
+import random
+import django.contrib.auth.models
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce, Collate
+from django.utils import timezone
+
+from .database import retry_on_busy
+from .signals import questions_closed, votes_changed
+
+
+class QuestionQuerySet(models.QuerySet):
+    """
+    Query set for question.
+
+    The filters use the status of questions, which the status scheduler
+    keeps up to date. Given a time instead, they compare dates to it.
+    """
+
+    def published(self, now=None):
+        """
+        Return questions published now, or at the given time.
+        """
+        if now is None:
+            return self.exclude(status=Question.SCHEDULED)
+        return self.filter(pub_date__lte=now)
+
+    def open_for_voting(self, now=None):
+        """
+        Return questions that can be voted on now, or at the given time.
+        """
+        if now is None:
+            return self.filter(status=Question.OPEN)
+        return self.filter(pub_date__lte=now, end_date__gte=now)
+
+    def closed(self, now=None):
+        """
+        Return questions whose voting has ended now, or at the given time.
+        """
+        if now is None:
+            return self.filter(status=Question.CLOSED)
+        return self.filter(end_date__lt=now)
+
+    def with_votable(self, now=None):
+        """
+        Annotate each question with votable, whether it can be voted on now,
+        or at the given time.
+        """
+        if now is None:
+            votable = When(status=Question.OPEN, then=Value(True))
+        else:
+            votable = When(pub_date__lte=now, end_date__gte=now,
+                           then=Value(True))
+        return self.annotate(votable=Case(
+            votable, default=Value(False), output_field=models.BooleanField()))
+
+    def with_admin_columns(self, now=None):
+        """
+        Annotate each question with published_recently, published and
+        votable as of now, or the given time, for sorting in SQL.
+        """
+        now = now or timezone.now()
+        return self.with_votable().annotate(
+            published_recently=Case(
+                When(pub_date__gte=now - datetime.timedelta(days=1),
+                     pub_date__lte=now, then=Value(True)),
+                default=Value(False), output_field=models.BooleanField()),
+            published=Case(
+                When(status=Question.SCHEDULED, then=Value(False)),
+                default=Value(True), output_field=models.BooleanField()))
+
+    def close(self, now=None):
+        """
+        End the open questions now, with one UPDATE. Return their ids.
+        """
+        now = now or timezone.now()
+        questions = self.filter(status=Question.OPEN)
+        ids = list(questions.values_list('pk', flat=True))
+        questions.update(end_date=now, status=Question.CLOSED,
+                         version=F('version') + 1, modified=now)
+        return ids
+
+    def extend(self, delta, now=None):
+        """
+        Move the end_date of the questions by delta, with one UPDATE that
+        also sets the status of the new dates. Return their ids.
+        """
+        now = now or timezone.now()
+        ids = list(self.values_list('pk', flat=True))
+        self.update(
+            end_date=F('end_date') + delta,
+            status=Case(
+                When(pub_date__gt=now, then=Value(Question.SCHEDULED)),
+                When(end_date__lt=now - delta, then=Value(Question.CLOSED)),
+                default=Value(Question.OPEN)),
+            version=F('version') + 1, modified=now)
+        return ids
+
+    def reopen(self, end_date, now=None):
+        """
+        Open the closed questions until end_date, with one UPDATE. Return
+        their ids.
+        """
+        now = now or timezone.now()
+        questions = self.filter(status=Question.CLOSED)
+        ids = list(questions.values_list('pk', flat=True))
+        questions.update(end_date=end_date, status=Question.OPEN,
+                         version=F('version') + 1, modified=now)
+        return ids
+
+    def with_results(self):
+        """
+        Prefetch the choices of each question, with their total_votes, in
+        choices.
+        """
+        return self.prefetch_related(models.Prefetch(
+            'choice_set', queryset=Choice.objects.with_totals().order_by('pk'),
+            to_attr='choices'))
+
+
+class QuestionManager(models.Manager.from_queryset(QuestionQuerySet)):
+    """
+    Manager for question.
+    """
+
+    def touch(self, question_ids):
+        """
+        Bump the version and modified time of edited questions.
+        """
+        return self.filter(pk__in=question_ids).update(
+            version=F('version') + 1, modified=timezone.now())
+
+    def advance_statuses(self, now=None):
+        """
+        Open and close the questions whose pub_date or end_date has passed.
+
+        Each change is one UPDATE that also checks the old status, so
+        schedulers of several processes can run it at the same time. The
+        changed questions are touched, and questions_closed is sent for the
+        closed ones. Return their ids.
+        """
+        now = now or timezone.now()
+        changed = []
+        closed = []
+        with transaction.atomic():
+            for statuses, dates, status in (
+                    ([Question.SCHEDULED, Question.OPEN],
+                     {'pub_date__lte': now, 'end_date__lt': now},
+                     Question.CLOSED),
+                    ([Question.SCHEDULED],
+                     {'pub_date__lte': now}, Question.OPEN)):
+                due = self.filter(status__in=statuses, **dates)
+                ids = list(due.values_list('pk', flat=True))
+                if ids:
+                    due.filter(pk__in=ids).update(
+                        status=status, version=F('version') + 1,
+                        modified=now)
+                    changed.extend(ids)
+                    if status == Question.CLOSED:
+                        closed.extend(ids)
+            if closed:
+                transaction.on_commit(lambda: questions_closed.send(
+                    sender=Question, question_ids=closed))
+        return changed
+
+
+class Question(models.Model):
+    """
+    Question for model.
+    """
+    SCHEDULED = 'scheduled'
+    OPEN = 'open'
+    CLOSED = 'closed'
+    STATUS_CHOICES = [
+        (SCHEDULED, 'Scheduled'),
+        (OPEN, 'Open'),
+        (CLOSED, 'Closed'),
+    ]
+
+    question_text = models.CharField(max_length=200)
+    pub_date = models.DateTimeField('date published')
+    end_date = models.DateTimeField('date ended')
+    current_vote = models.CharField(max_length=200)
+    # Bumped on every edit of the question or its choices and on status
+    # changes, but not on votes, see polls.versions.votes_stamp().
+    version = models.PositiveIntegerField(default=0, editable=False)
+    modified = models.DateTimeField(default=timezone.now, editable=False)
+    # Id of the question in the file it was imported from, see import_polls.
+    external_id = models.CharField(max_length=100, unique=True, null=True,
+                                   blank=True)
+    # Set from the dates by save() and moved on by the status scheduler.
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES,
+                              default=SCHEDULED, editable=False)
+
+    objects = QuestionManager()
+
+    class Meta:
+        indexes = [
+            # Newest published questions first, as on the index page.
+            models.Index(fields=['pub_date', 'id'],
+                         name='question_pub_date_id_idx'),
+            # Open and closed questions, and the next one to close.
+            models.Index(fields=['end_date', 'pub_date'],
+                         name='question_end_pub_date_idx'),
+            # Questions to open, and questions by status.
+            models.Index(fields=['status', 'pub_date'],
+                         name='question_status_pub_date_idx'),
+            # Questions to close.
+            models.Index(fields=['status', 'end_date'],
+                         name='question_status_end_date_idx'),
+            # Case-insensitive prefix search, as LIKE 'text%' in SQLite.
+            models.Index(Collate('question_text', 'NOCASE'),
+                         name='question_text_nocase_idx'),
+        ]
+
+    def __str__(self):
+        """
+        String.
+        """
+        return self.question_text
+
+    def save(self, *args, **kwargs):
+        """
+        Save the question with the status of its dates.
+        """
+        self.status = self.status_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['status']
+        super().save(*args, **kwargs)
+
+    def status_at(self, now=None):
+        """
+        Return the status of the question by its dates now, or at the given
+        time.
+        """
+        now = now or timezone.now()
+        if now < self.pub_date:
+            return self.SCHEDULED
+        if self.end_date is None or now <= self.end_date:
+            return self.OPEN
+        return self.CLOSED
+
+    def current_status(self):
+        """
+        Return the status, or for a question that was never saved the
+        status of its dates.
+        """
+        if self._state.adding:
+            return self.status_at()
+        return self.status
+
+    def was_published_recently(self):
+        """
+        Check recently published question.
+        """
+        now = timezone.now()
+        return now - datetime.timedelta(days=1) <= self.pub_date <= now
+
+    was_published_recently.admin_order_field = 'pub_date'
+    was_published_recently.boolean = True
+    was_published_recently.short_description = 'Published recently?'
+
+    def is_published(self):
+        """
+        Check published question.
+        """
+        return self.current_status() != self.SCHEDULED
+
+    def can_vote(self):
+        """
+        Check question which can be voted.
+        """
+        return self.current_status() == self.OPEN
+
+    def count_results(self):
+        """
+        Set total_votes, and the percentage of it of each choice, on a
+        question from with_results().
+        """
+        self.total_votes = sum(choice.total_votes for choice in self.choices)
+        for choice in self.choices:
+            choice.percentage = round(
+                100 * choice.total_votes / self.total_votes, 1)\
+                if self.total_votes else 0
+
+
+class ChoiceManager(models.Manager):
+    """
+    Manager for choice.
+    """
+
+    def add_vote(self, question_id, choice_id, count=1):
+        """
+        Add count votes (one by default) to a choice of the question.
+
+        The counter is incremented inside the database by a single UPDATE,
+        so concurrent votes cannot overwrite each other. With VOTE_SHARDS
+        set, the vote goes to a random ChoiceVoteShard of the choice instead.
+        Return True if the choice belongs to the question and the vote was
+        counted.
+        """
+        if settings.VOTE_SHARDS:
+            counted = ChoiceVoteShard.objects.add_vote(
+                question_id, choice_id, settings.VOTE_SHARDS, count)
+        else:
+            counted = self.filter(pk=choice_id, question_id=question_id)\
+                .update(votes=F('votes') + count) == 1
+        if counted:
+            if settings.VOTE_ROLLUPS:
+                VoteRollup.objects.add({choice_id: count})
+            transaction.on_commit(lambda: votes_changed.send(
+                sender=Choice, question_ids=[question_id]))
+        return counted
+
+    def add_votes(self, counts, batch_size=200, rollups=True):
+        """
+        Add many votes at once from a mapping of choice id to vote count.
+
+        Every batch of choices is incremented by one UPDATE with a CASE
+        expression instead of one statement per choice. Corrections that
+        are not votes of now pass rollups=False to leave the vote rollups
+        alone.
+        """
+        choice_ids = [pk for pk, count in counts.items() if count]
+        for start in range(0, len(choice_ids), batch_size):
+            batch = choice_ids[start:start + batch_size]
+            increment = Case(*[When(pk=pk, then=Value(counts[pk]))
+                               for pk in batch],
+                             default=Value(0), output_field=IntegerField())
+            self.filter(pk__in=batch).update(votes=F('votes') + increment)
+        if rollups and settings.VOTE_ROLLUPS:
+            VoteRollup.objects.add(counts)
+
+    def with_totals(self):
+        """
+        Annotate each choice with total_votes, its votes plus its shards.
+        """
+        return self.annotate(
+            total_votes=F('votes') + Coalesce(Sum('shards__count'), 0))
+
+
+class Choice(models.Model):
+    """
+    Choice for model.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice_text = models.CharField(max_length=200)
+    votes = models.IntegerField(default=0)
+
+    objects = ChoiceManager()
+
+    def __str__(self):
+        """
+        Return choice text.
+        """
+        return self.choice_text
+
+
+class ChoiceVoteShardManager(models.Manager):
+    """
+    Manager for choice vote shard.
+    """
+
+    def add_vote(self, question_id, choice_id, shards, count=1):
+        """
+        Add count votes to a random one of the first shards of a choice.
+
+        Spreading the votes of a popular choice over several rows lets
+        row-locking databases count them in parallel. A missing shard row
+        is created on its first vote. Return True if the choice belongs to
+        the question and the vote was counted.
+        """
+        shard_no = random.randrange(shards)
+        updated = self.filter(choice_id=choice_id, shard_no=shard_no,
+                              choice__question_id=question_id)\
+            .update(count=F('count') + count)
+        if updated:
+            return True
+        if not Choice.objects.filter(pk=choice_id,
+                                     question_id=question_id).exists():
+            return False
+        try:
+            with transaction.atomic():
+                self.create(choice_id=choice_id, shard_no=shard_no,
+                            count=count)
+        except IntegrityError:
+            self.filter(choice_id=choice_id, shard_no=shard_no)\
+                .update(count=F('count') + count)
+        return True
+
+
+class ChoiceVoteShard(models.Model):
+    """
+    Part of the vote count of a choice.
+
+    The total of a choice is its votes plus the count of all its shards.
+    """
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE,
+                               related_name='shards')
+    shard_no = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    objects = ChoiceVoteShardManager()
+
+    class Meta:
+        unique_together = ('choice', 'shard_no')
+
+
+def bucket_start(moment, resolution):
+    """
+    Return the start of the bucket of the given resolution, in UTC, that
+    holds the moment.
+    """
+    moment = moment.astimezone(datetime.timezone.utc)\
+        .replace(second=0, microsecond=0)
+    if resolution in (VoteRollup.HOUR, VoteRollup.DAY):
+        moment = moment.replace(minute=0)
+    if resolution == VoteRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+class VoteRollupManager(models.Manager):
+    """
+    Manager for vote rollup.
+    """
+
+    def add(self, counts, now=None):
+        """
+        Add votes, a mapping of choice id to count, to the minute, hour and
+        day buckets of now.
+
+        A single choice costs one UPDATE of its three buckets. A bucket only
+        exists with its coarser ones, so when fewer rows are updated the
+        missing ones are the finest and are inserted.
+        """
+        now = now or timezone.now()
+        buckets = [(resolution, bucket_start(now, resolution))
+                   for resolution in VoteRollup.RESOLUTIONS]
+        counts = {choice_id: count for choice_id, count in counts.items()
+                  if count}
+        if len(counts) == 1:
+            (choice_id, count), = counts.items()
+            # The choice is in every term, so each is a lookup of the
+            # unique index instead of a scan of the buckets of the choice.
+            condition = models.Q()
+            for resolution, bucket in buckets:
+                condition |= models.Q(choice_id=choice_id,
+                                      resolution=resolution, bucket=bucket)
+            updated = self.filter(condition)\
+                .update(count=F('count') + count)
+            buckets = buckets[:len(buckets) - updated]
+        self.merge({(choice_id, resolution, bucket): count
+                    for choice_id, count in counts.items()
+                    for resolution, bucket in buckets})
+
+    def merge(self, counts, batch_size=200):
+        """
+        Add counts, a mapping of (choice id, resolution, bucket start) to
+        count, to their buckets.
+
+        Every batch costs one SELECT of the existing buckets, one UPDATE
+        with a CASE expression for them and one INSERT for the others. A
+        bucket inserted by a parallel transaction is merged again.
+        """
+        keys = list(counts)
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            rows = self.filter(choice_id__in={key[0] for key in batch},
+                               resolution__in={key[1] for key in batch},
+                               bucket__in={key[2] for key in batch})
+            existing = set(rows.values_list(
+                'choice_id', 'resolution', 'bucket')) & set(batch)
+            if existing:
+                increment = Case(*[
+                    When(choice_id=key[0], resolution=key[1], bucket=key[2],
+                         then=Value(counts[key])) for key in existing],
+                    default=Value(0), output_field=IntegerField())
+                rows.update(count=F('count') + increment)
+            missing = [key for key in batch if key not in existing]
+            if not missing:
+                continue
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        VoteRollup(choice_id=key[0], resolution=key[1],
+                                   bucket=key[2], count=counts[key])
+                        for key in missing])
+            except IntegrityError:
+                self.merge({key: counts[key] for key in missing})
+
+    def retained_since(self, now=None):
+        """
+        Return a mapping of resolution to the start of its oldest bucket
+        kept by compact(), None for all of them.
+        """
+        now = now or timezone.now()
+        return {
+            VoteRollup.MINUTE: bucket_start(now - datetime.timedelta(
+                hours=settings.VOTE_ROLLUP_MINUTE_RETENTION),
+                VoteRollup.HOUR),
+            VoteRollup.HOUR: bucket_start(now - datetime.timedelta(
+                days=settings.VOTE_ROLLUP_HOUR_RETENTION), VoteRollup.DAY),
+            VoteRollup.DAY: None,
+        }
+
+    def compact(self, now=None):
+        """
+        Remove minute buckets older than VOTE_ROLLUP_MINUTE_RETENTION hours
+        and hour buckets older than VOTE_ROLLUP_HOUR_RETENTION days.
+
+        Every vote is counted into its hour and day buckets as well, so the
+        coarser buckets already hold the merged counts, and only whole hours
+        and days are removed. Return the number of buckets removed.
+        """
+        removed = 0
+        for resolution, since in self.retained_since(now).items():
+            if since is not None:
+                removed += self.filter(resolution=resolution,
+                                       bucket__lt=since).delete()[0]
+        return removed
+
+    def history(self, question_id, start, end, resolution, now=None):
+        """
+        Return [(bucket start, {choice id: count})] of a question, for the
+        buckets starting from start until end, oldest first.
+
+        The buckets are of the given resolution, or of the finest coarser
+        one kept for times whose buckets compact() removed. Only the
+        returned buckets are read, whatever the number of votes.
+        """
+        retained_since = self.retained_since(now)
+        condition = models.Q(pk__in=[])
+        until = end
+        for coarser in VoteRollup.RESOLUTIONS[
+                VoteRollup.RESOLUTIONS.index(resolution):]:
+            since = retained_since[coarser]
+            since = start if since is None else max(start, since)
+            if since < until:
+                condition |= models.Q(resolution=coarser, bucket__gte=since,
+                                      bucket__lt=until)
+                until = since
+            if until <= start:
+                break
+        history = {}
+        for choice_id, bucket, count in self.filter(
+                condition, choice__question_id=question_id)\
+                .values_list('choice_id', 'bucket', 'count'):
+            history.setdefault(bucket, {})[choice_id] = count
+        return sorted(history.items())
+
+
+class VoteRollup(models.Model):
+    """
+    Net votes a choice gained in one minute, hour or day.
+
+    Every vote is counted into the buckets of all three resolutions, and
+    old minute and hour buckets are removed, see VoteRollupManager.compact().
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    RESOLUTIONS = [MINUTE, HOUR, DAY]
+
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE,
+                               related_name='rollups')
+    resolution = models.CharField(
+        max_length=6, choices=[(resolution, resolution.capitalize())
+                               for resolution in RESOLUTIONS])
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    objects = VoteRollupManager()
+
+    class Meta:
+        unique_together = ('choice', 'resolution', 'bucket')
+
+
+class VoteManager(models.Manager):
+    """
+    Manager for vote.
+    """
+
+    @retry_on_busy
+    def cast(self, user, question_id, choice_id, counter=None):
+        """
+        Record the vote of a user, replacing their earlier vote on the question.
+
+        The vote row and the vote counters change in one transaction: the
+        new choice gains a vote and the previously chosen one loses it. A
+        repeated vote for the same choice writes nothing. counter is
+        anything with an add_vote() like ChoiceManager, which is used by
+        default. A transaction that finds the database locked is retried.
+        Return True if the choice belongs to the question.
+        """
+        if counter is None:
+            counter = Choice.objects
+        with transaction.atomic():
+            # The first statement writes, so SQLite takes its write lock at
+            # the start of the transaction instead of upgrading a read lock
+            # later, and parallel first votes of a user wait for each other.
+            if self._insert(user, question_id, choice_id):
+                counter.add_vote(question_id, choice_id)
+                return True
+            previous = self.filter(user=user, question_id=question_id)\
+                .values_list('choice_id', flat=True).first()
+            if previous is None:
+                # No vote, so the choice is not one of the question.
+                return False
+            if previous == choice_id:
+                return True
+            if not counter.add_vote(question_id, choice_id):
+                return False
+            self.filter(user=user, question_id=question_id)\
+                .update(choice_id=choice_id)
+            counter.add_vote(question_id, previous, -1)
+        return True
+
+    def _insert(self, user, question_id, choice_id):
+        """
+        Insert the vote of a user with one INSERT ... ON CONFLICT, unless they
+        voted on the question already or the choice is not one of it.
+        Return True if it was inserted.
+        """
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {} (user_id, question_id, choice_id) '
+                'SELECT %s, question_id, id FROM {} '
+                'WHERE id = %s AND question_id = %s '
+                'ON CONFLICT (user_id, question_id) DO NOTHING'.format(
+                    quote(self.model._meta.db_table),
+                    quote(Choice._meta.db_table)),
+                [user.pk, choice_id, question_id])
+            return cursor.rowcount == 1
+
+
+class Vote(models.Model):
+    """
+    Vote of a user on a question.
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    user = models.ForeignKey(django.contrib.auth.models.User, on_delete=models.CASCADE)
+
+    objects = VoteManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_user_question_vote'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'choice'],
+                         name='vote_question_choice_idx'),
+        ]
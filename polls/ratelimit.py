@@ -0,0 +1,114 @@
+"""
+Rate limits of views, counted in the ``ratelimit`` cache.
+
+Each limit is a sliding window: the hits of the current fixed window plus
+the share of the previous window that still falls within the last window
+seconds. Counters are changed with cache.incr(), which is atomic in every
+cache backend, so with a shared backend such as memcached the limit holds
+across worker processes.
+"""
+import asyncio
+import functools
+import hashlib
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+def _cache():
+    return caches['ratelimit']
+
+
+def counter_key(scope, identity, window_number):
+    # Identities come from request headers, so hash them into safe keys.
+    digest = hashlib.md5(identity.encode()).hexdigest()
+    return 'polls:rate:{}:{}:{}'.format(scope, digest, window_number)
+
+
+def hit(counters, window, now=None):
+    """
+    Count a hit for every (scope, identity, limit) in counters.
+
+    Return the seconds to wait before the next hit is allowed, or 0 if it
+    is allowed. Rejected hits are counted too, so a client that keeps
+    trying stays limited. Costs one cache call per counter plus one.
+    """
+    cache = _cache()
+    now = time.time() if now is None else now
+    number = int(now // window)
+    counts = []
+    for scope, identity, limit in counters:
+        key = counter_key(scope, identity, number)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # The first hit of the window, or a parallel request added it.
+            if cache.add(key, 1, math.ceil(window * 2)):
+                count = 1
+            else:
+                count = cache.incr(key)
+        counts.append(count)
+    previous = cache.get_many([
+        counter_key(scope, identity, number - 1)
+        for scope, identity, limit in counters])
+    # Share of the previous window still inside the sliding window.
+    weight = 1 - (now / window - number)
+    for (scope, identity, limit), count in zip(counters, counts):
+        old = previous.get(counter_key(scope, identity, number - 1), 0)
+        if old * weight + count > limit:
+            return math.ceil((number + 1) * window - now)
+    return 0
+
+
+def rate_limit(rules, window_setting):
+    """
+    Decorate a sync or async view to answer 429 to clients over a limit.
+
+    Each rule is (scope, key, limit_setting): key(request) returns who is
+    asking in that scope, or None to skip the rule, and the setting holds
+    the hits allowed per window (0 for no limit). The keys must not use the
+    database, so rejected requests never reach it; a key may read
+    request.user only below a decorator that has loaded it.
+    """
+    def counters(request):
+        found = []
+        for scope, key, limit_setting in rules:
+            limit = getattr(settings, limit_setting)
+            identity = key(request) if limit else None
+            if identity:
+                found.append((scope, identity, limit))
+        return found
+
+    def too_many(retry_after):
+        response = HttpResponse("Too many requests. Try again later.",
+                                status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def limited(request, *args, **kwargs):
+                found = counters(request)
+                if found:
+                    retry_after = await sync_to_async(
+                        hit, thread_sensitive=False)(
+                            found, getattr(settings, window_setting))
+                    if retry_after:
+                        return too_many(retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def limited(request, *args, **kwargs):
+                found = counters(request)
+                if found:
+                    retry_after = hit(found, getattr(settings, window_setting))
+                    if retry_after:
+                        return too_many(retry_after)
+                return view(request, *args, **kwargs)
+        return limited
+    return decorator
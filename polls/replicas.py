@@ -0,0 +1,200 @@
+"""
+Routing of read-only poll views to read replicas.
+
+Views wrapped with replica_reads() read the models of the polls app from
+the REPLICA_DATABASES in turn, skipping replicas that fail their health
+check. Everything else, including every write, the admin and the users
+and sessions of every view, uses the primary "default" database.
+
+A request that writes pins its client to the primary for
+REPLICA_PIN_SECONDS with a cookie, so a voter sees their own vote on the
+results page they are sent to, even if the replicas lag behind. Pinned
+requests also skip the results and stamp caches, which replica reads may
+have filled with data older than the vote.
+"""
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+PIN_COOKIE = 'pin_primary'
+
+# Models of these apps are read from replicas.
+REPLICA_APPS = {'polls'}
+
+
+class Routing:
+    """
+    Database routing of the request being served.
+    """
+    __slots__ = ('replica', 'pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.replica = None
+        self.pinned = pinned
+        self.wrote = False
+
+
+_current = contextvars.ContextVar('database_routing', default=None)
+
+
+def pinned_to_primary():
+    """
+    Tell if the request being served must see the latest writes.
+    """
+    routing = _current.get()
+    return routing is not None and routing.pinned
+
+
+class ReplicaPool:
+    """
+    Round-robin choice among the healthy REPLICA_DATABASES.
+
+    The health of each replica is checked with one query at most every
+    REPLICA_CHECK_INTERVAL seconds per process.
+    """
+
+    def __init__(self):
+        self._turn = itertools.count()
+        self._health = {}
+        self._lock = threading.Lock()
+
+    def choose(self):
+        """
+        Return the alias of the next healthy replica, or None.
+        """
+        aliases = settings.REPLICA_DATABASES
+        if not aliases:
+            return None
+        start = next(self._turn)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.healthy(alias):
+                return alias
+        return None
+
+    def healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            health = self._health.get(alias)
+        if health is not None \
+                and now - health[1] < settings.REPLICA_CHECK_INTERVAL:
+            return health[0]
+        healthy = self.check(alias)
+        with self._lock:
+            self._health[alias] = (healthy, now)
+        return healthy
+
+    def check(self, alias):
+        """
+        Tell if a replica answers queries on the polls tables.
+        """
+        from django.db import connections
+        from .models import Question
+
+        try:
+            Question.objects.using(alias).exists()
+        except DatabaseError:
+            # Reconnect on the next use, in case the replica comes back.
+            connections[alias].close()
+            return False
+        return True
+
+    def forget(self):
+        """
+        Check every replica again on its next use.
+        """
+        with self._lock:
+            self._health.clear()
+
+
+replica_pool = ReplicaPool()
+
+
+class ReplicaRouter:
+    """
+    Read the polls models of replica_reads() views from the replica chosen
+    for the request, and everything else from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is not None and routing.replica is not None \
+                and model._meta.app_label in REPLICA_APPS:
+            return routing.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+def replica_reads(view):
+    """
+    Mark a read-only view to read polls from a replica.
+    """
+    view.replica_reads = True
+    return view
+
+
+class ReplicaMiddleware:
+    """
+    Choose the database of every request and pin writing clients to the
+    primary.
+
+    Put it last in MIDDLEWARE, so writes of other middleware, such as
+    saving the session, do not pin the client.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(routing, response)
+
+    async def __acall__(self, request):
+        routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+        token = _current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(routing, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _current.get()
+        if routing is not None and not routing.pinned \
+                and getattr(view_func, 'replica_reads', False) \
+                and request.method in ('GET', 'HEAD'):
+            routing.replica = replica_pool.choose()
+
+    @staticmethod
+    def pin(routing, response):
+        if routing.wrote and settings.REPLICA_DATABASES:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
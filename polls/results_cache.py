@@ -0,0 +1,93 @@
+import threading
+
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Choice, Question
+from .signals import votes_changed
+
+
+class ResultsCache:
+    """
+    Cache of question results, keyed by question id.
+
+    Entries live in the ``results`` cache, whose TIMEOUT bounds how stale
+    they can get in processes that did not see an invalidation. Hits and
+    misses are counted per process.
+    """
+
+    def __init__(self, alias='results'):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def key(question_id):
+        return 'polls:results:{}'.format(question_id)
+
+    def get(self, question_id):
+        """
+        Return the cached results of a question, or None.
+        """
+        question = self.cache.get(self.key(question_id))
+        with self._lock:
+            if question is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return question
+
+    def set(self, question):
+        """
+        Cache a question with its results.
+        """
+        self.cache.set(self.key(question.pk), question)
+
+    def invalidate(self, question_ids):
+        """
+        Drop the cached results of the questions.
+        """
+        self.cache.delete_many([self.key(pk) for pk in question_ids])
+
+    def stats(self):
+        """
+        Return the hits and misses of this process.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_ratio': hits / lookups if lookups else 0.0}
+
+
+results_cache = ResultsCache()
+
+
+@receiver(votes_changed)
+def invalidate_voted_results(sender, question_ids, **kwargs):
+    """
+    Drop results when votes were counted.
+    """
+    results_cache.invalidate(question_ids)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_question_results(sender, instance, **kwargs):
+    """
+    Drop results when a question was edited or deleted.
+    """
+    results_cache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def invalidate_choice_results(sender, instance, **kwargs):
+    """
+    Drop results when a choice was edited or deleted, e.g. in the admin.
+    """
+    results_cache.invalidate([instance.question_id])
@@ -0,0 +1,177 @@
+"""
+Opening and closing of questions at their pub_date and end_date.
+
+Pages and votes read the status of a question instead of comparing its
+dates to the time, so something has to move statuses on as time passes.
+Every process keeps the upcoming pub_date and end_date boundaries in a heap,
+and StatusSchedulerMiddleware checks the earliest one on each request. Only
+the request that finds a boundary passed advances the statuses.
+"""
+import asyncio
+import datetime
+import heapq
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Question
+from .versions import forget_stamps
+
+log = logging.getLogger("polls")
+
+# A question closes once the time is past its end_date.
+CLOSE_DELAY = datetime.timedelta(microseconds=1)
+
+
+class StatusScheduler:
+    """
+    Time-ordered heap of the upcoming status changes of questions.
+
+    The heap holds every boundary up to horizon seconds ahead and is
+    reloaded from the database when the time reaches its end, which also
+    finds questions added or edited by other processes. Questions saved by
+    this process are added at once.
+    """
+
+    def __init__(self, horizon=60):
+        self.horizon = datetime.timedelta(seconds=horizon)
+        self._heap = []
+        self._loaded_until = None
+        self._lock = threading.Lock()
+
+    def next_run(self):
+        """
+        Return when the scheduler has work next, or None if it never ran.
+        """
+        if self._loaded_until is None:
+            return None
+        heap = self._heap
+        return min(heap[0][0], self._loaded_until) if heap \
+            else self._loaded_until
+
+    def due(self, now=None):
+        """
+        Return whether a status change or a reload is due. Costs no query.
+        """
+        next_run = self.next_run()
+        return next_run is None or next_run <= (now or timezone.now())
+
+    def schedule(self, question, now=None):
+        """
+        Add the boundaries of a saved question that fall before the next
+        reload.
+        """
+        now = now or timezone.now()
+        with self._lock:
+            if self._loaded_until is None:
+                return
+            for moment in (question.pub_date, question.end_date + CLOSE_DELAY):
+                if now < moment <= self._loaded_until:
+                    heapq.heappush(self._heap, (moment, question.pk))
+
+    def run_due(self, now=None):
+        """
+        Advance the statuses if a boundary has passed. Return the ids of the
+        questions whose status changed.
+
+        Stamps of every question whose boundary passed are dropped from the
+        cache of this process, also when another process changed the status.
+        """
+        with self._lock:
+            now = now or timezone.now()
+            if not self.due(now):
+                return []
+            passed = set()
+            while self._heap and self._heap[0][0] <= now:
+                passed.add(heapq.heappop(self._heap)[1])
+            if self._loaded_until is None or self._loaded_until <= now:
+                passed.update(self._reload(now))
+            changed = Question.objects.advance_statuses(now)
+            passed.update(changed)
+            if passed:
+                forget_stamps(passed, index=True)
+            return changed
+
+    def _reload(self, now):
+        """
+        Load the boundaries up to horizon ahead. Return the ids of questions
+        with a boundary between the previous load and now.
+        """
+        since = self._loaded_until or now
+        until = now + self.horizon
+        heap = []
+        passed = set()
+        for field, delay in (('pub_date', datetime.timedelta()),
+                             ('end_date', CLOSE_DELAY)):
+            for moment, pk in Question.objects.filter(**{
+                    field + '__gte': since - delay,
+                    field + '__lte': until - delay})\
+                    .values_list(field, 'pk'):
+                moment += delay
+                if moment <= now:
+                    passed.add(pk)
+                else:
+                    heap.append((moment, pk))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._loaded_until = until
+        return passed
+
+    def run(self, stop=None):
+        """
+        Run due status changes until stop, a threading.Event, is set.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                log.exception("Could not advance question statuses.")
+            next_run = self.next_run()
+            seconds = (next_run - timezone.now()).total_seconds() \
+                if next_run else 1
+            stop.wait(max(seconds, 0.01))
+
+
+status_scheduler = StatusScheduler(settings.POLL_SCHEDULE_HORIZON)
+
+
+class StatusSchedulerMiddleware:
+    """
+    Advance question statuses before a request reads them.
+
+    Most requests only compare the time to the earliest boundary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if status_scheduler.due():
+            status_scheduler.run_due()
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if status_scheduler.due():
+            await sync_to_async(status_scheduler.run_due)()
+        return await self.get_response(request)
+
+
+@receiver(post_save, sender=Question)
+def schedule_saved_question(sender, instance, **kwargs):
+    """
+    Add the boundaries of a saved question to the scheduler.
+    """
+    status_scheduler.schedule(instance)
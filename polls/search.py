@@ -0,0 +1,123 @@
+"""
+Search of published questions by the words of their text and choices.
+
+On SQLite built with FTS5 the search uses the polls_question_search table
+of migration 0011, which triggers keep in sync. Migrations that rebuild
+polls_question or polls_choice drop the triggers and must create them
+again. Elsewhere, or with POLL_SEARCH_FTS off, it falls back to the ORM,
+which scans the questions.
+"""
+import functools
+import re
+import sqlite3
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Choice, Question
+
+FTS_TABLE = 'polls_question_search'
+
+# Ranks matches in question texts above matches in choice texts.
+FTS_WEIGHTS = (2.0, 1.0)
+
+MAX_TERMS = 10
+
+# Results deeper than this are not served; skipping to them costs a scan
+# of every result before them.
+MAX_OFFSET = 10000
+
+WORD = re.compile(r'\w+')
+
+
+def search_terms(text):
+    """
+    Return the words of a search, at most MAX_TERMS of them.
+    """
+    return WORD.findall(text)[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """
+    Return the FTS5 query matching every term as a word or a word prefix.
+    """
+    return ' '.join('"{}"*'.format(term) for term in terms)
+
+
+@functools.lru_cache(maxsize=None)
+def sqlite_has_fts5():
+    """
+    Check that the SQLite library is built with FTS5.
+    """
+    connection = sqlite3.connect(':memory:')
+    try:
+        return ('ENABLE_FTS5',) in connection.execute(
+            "PRAGMA compile_options").fetchall()
+    finally:
+        connection.close()
+
+
+def uses_fts(using):
+    """
+    Check that searches on the database alias use the full-text index.
+    """
+    return settings.POLL_SEARCH_FTS \
+        and connections[using].vendor == 'sqlite' and sqlite_has_fts5()
+
+
+def matching_ids(terms):
+    """
+    Return SQL selecting the ids of questions matching all terms in the
+    full-text index, for use in a filter on pk.
+    """
+    return RawSQL('SELECT rowid FROM {} WHERE {} MATCH %s'.format(
+        FTS_TABLE, FTS_TABLE), [match_expression(terms)])
+
+
+def filter_questions(queryset, terms):
+    """
+    Filter questions to those matching all terms, for the admin.
+    """
+    if uses_fts(queryset.db):
+        return queryset.filter(pk__in=matching_ids(terms))
+    for term in terms:
+        in_choices = Exists(Choice.objects.filter(
+            question=OuterRef('pk'), choice_text__icontains=term))
+        queryset = queryset.filter(in_choices | Q(question_text__icontains=term))
+    return queryset
+
+
+def search_questions(text, offset=0, limit=20):
+    """
+    Return published questions matching every word of text, best first.
+
+    Each question is annotated with votable. Full-text results are ranked
+    by bm25 with FTS_WEIGHTS. Fallback results are ranked by how many words
+    the question text contains, then by publish date, newest first.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return []
+    using = router.db_for_read(Question)
+    if uses_fts(using):
+        return list(Question.objects.db_manager(using).raw(
+            "SELECT polls_question.*, "
+            "polls_question.status = %s AS votable "
+            "FROM {table} JOIN polls_question "
+            "ON polls_question.id = {table}.rowid "
+            "WHERE {table} MATCH %s AND polls_question.status != %s "
+            "ORDER BY bm25({table}, {weights}) "
+            "LIMIT %s OFFSET %s".format(
+                table=FTS_TABLE,
+                weights=', '.join(str(weight) for weight in FTS_WEIGHTS)),
+            [Question.OPEN, match_expression(terms), Question.SCHEDULED,
+             limit, offset]))
+    rank = sum((Case(When(question_text__icontains=term, then=Value(1)),
+                     default=Value(0), output_field=IntegerField())
+                for term in terms), Value(0))
+    questions = filter_questions(
+        Question.objects.using(using).published().with_votable(), terms)
+    return list(questions.annotate(rank=rank)
+                .order_by('-rank', '-pub_date', '-id')[offset:offset + limit])
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent once vote counts of questions have changed and been committed, with
+# question_ids, the ids of the changed questions.
+votes_changed = Signal()
+
+# Sent once questions have been closed by their end_date and the change has
+# been committed, with question_ids, the ids of the closed questions.
+questions_closed = Signal()
@@ -0,0 +1,213 @@
+"""
+Pre-rendered results of closed questions.
+
+The results of a closed question never change, so its results page and
+their JSON twin are rendered once into POLL_SNAPSHOT_DIR, each next to a
+gzip-compressed copy. serves_snapshot() answers from these files without
+touching the database, and lets browsers and proxies keep them for
+POLL_SNAPSHOT_MAX_AGE seconds.
+
+Snapshots are written when the scheduler closes questions, by the results
+view for closed questions that have none, and by the snapshot_polls
+command. They are removed when a question or its choices are saved,
+deleted or imported again, and when its votes change, as votes buffered
+before a question closed are counted after it. rebuild_snapshots rebuilds
+them after template changes.
+"""
+import functools
+import gzip
+import json
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers)
+
+from .models import Choice, Question
+from .signals import questions_closed, votes_changed
+
+CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'json': 'application/json',
+}
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+# Ids per IN (...) lookup, below the SQLite limit of query parameters.
+LOOKUP_SIZE = 500
+
+
+def enabled():
+    return bool(settings.POLL_SNAPSHOT_DIR)
+
+
+def snapshot_path(question_id, format, compressed=False):
+    return os.path.join(settings.POLL_SNAPSHOT_DIR, '{}.{}{}'.format(
+        question_id, format, '.gz' if compressed else ''))
+
+
+def render(question):
+    """
+    Return the results page and JSON of a question from count_results(),
+    by format.
+    """
+    from .api import results_json
+
+    return {
+        'html': render_to_string('polls/results.html',
+                                 {'question': question}).encode(),
+        'json': json.dumps(results_json(question),
+                           cls=DjangoJSONEncoder).encode(),
+    }
+
+
+def _write(path, content):
+    # Write a new file and move it over the old one, so readers never see
+    # a partial snapshot.
+    descriptor, temporary = tempfile.mkstemp(
+        dir=settings.POLL_SNAPSHOT_DIR, suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as output:
+        output.write(content)
+    os.replace(temporary, path)
+
+
+def save(question):
+    """
+    Write the snapshots of a closed question from count_results().
+    """
+    if not enabled():
+        return
+    os.makedirs(settings.POLL_SNAPSHOT_DIR, exist_ok=True)
+    for format, content in render(question).items():
+        _write(snapshot_path(question.pk, format), content)
+        _write(snapshot_path(question.pk, format, compressed=True),
+               gzip.compress(content, mtime=0))
+
+
+def save_closed(question_ids=None, rebuild=False):
+    """
+    Write the snapshots of closed questions, of all of them or of the
+    given ids, that have none, or of every one with rebuild.
+
+    Return the number of questions written.
+    """
+    if not enabled():
+        return 0
+    if question_ids is None:
+        question_ids = Question.objects.closed()\
+            .values_list('pk', flat=True).order_by('pk')
+    if not rebuild:
+        question_ids = [pk for pk in question_ids
+                        if not os.path.exists(snapshot_path(pk, 'html'))]
+    question_ids = list(question_ids)
+    written = 0
+    for start in range(0, len(question_ids), LOOKUP_SIZE):
+        for question in Question.objects.closed().with_results().filter(
+                pk__in=question_ids[start:start + LOOKUP_SIZE]):
+            question.count_results()
+            save(question)
+            written += 1
+    return written
+
+
+def saved_ids():
+    """
+    Return the ids of the questions with a snapshot.
+    """
+    if not enabled() or not os.path.isdir(settings.POLL_SNAPSHOT_DIR):
+        return set()
+    return {int(name.split('.', 1)[0])
+            for name in os.listdir(settings.POLL_SNAPSHOT_DIR)
+            if name.split('.', 1)[0].isdigit()}
+
+
+def remove(question_ids):
+    """
+    Remove the snapshots of questions.
+    """
+    if not enabled():
+        return
+    for pk in question_ids:
+        for format in CONTENT_TYPES:
+            for compressed in (False, True):
+                try:
+                    os.remove(snapshot_path(pk, format, compressed))
+                except FileNotFoundError:
+                    pass
+
+
+def snapshot_response(request, question_id, format):
+    """
+    Return the snapshot of a question as a response, or None if it has none.
+    """
+    compressed = bool(ACCEPTS_GZIP.search(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    try:
+        with open(snapshot_path(question_id, format, compressed),
+                  'rb') as snapshot:
+            content = snapshot.read()
+            stat = os.fstat(snapshot.fileno())
+    except FileNotFoundError:
+        return None
+    response = HttpResponse(content, content_type=CONTENT_TYPES[format])
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    response['ETag'] = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, public=True,
+                        max_age=settings.POLL_SNAPSHOT_MAX_AGE)
+    return get_conditional_response(request, etag=response['ETag'],
+                                    response=response)
+
+
+def serves_snapshot(format):
+    """
+    Decorate a view of the question with id pk to answer GET requests from
+    its snapshot in format, when it has one.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if enabled() and request.method in ('GET', 'HEAD'):
+                response = snapshot_response(request, kwargs['pk'], format)
+                if response is not None:
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@receiver(questions_closed)
+def snapshot_closed(sender, question_ids, **kwargs):
+    """
+    Write the snapshots of questions that have just closed.
+    """
+    save_closed(question_ids, rebuild=True)
+
+
+@receiver(votes_changed)
+def remove_voted(sender, question_ids, **kwargs):
+    """
+    Remove the snapshots of questions whose votes changed.
+    """
+    remove(question_ids)
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Choice)
+def remove_changed(sender, instance, **kwargs):
+    """
+    Remove the snapshot of an edited question once the edit commits.
+
+    The results view writes a new one on its next request.
+    """
+    if enabled():
+        question_id = instance.pk if sender is Question \
+            else instance.question_id
+        transaction.on_commit(lambda: remove([question_id]))
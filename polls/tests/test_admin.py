@@ -0,0 +1,152 @@
+import datetime
+
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from polls.admin import (
+    CappedCountPaginator, LargeQuestionAdmin, QuestionAdmin)
+from polls.models import Question
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def updates(queries):
+    return [query for query in queries
+            if query['sql'].startswith('UPDATE "polls_question"')]
+
+
+class QuestionAdminTests(TestCase):
+    """
+    Test the question admin.
+    """
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser(
+            'admin', 'admin@ku.th', 'password'))
+        self.changelist = reverse('admin:polls_question_changelist')
+
+    def test_changelist_columns(self):
+        """
+        Test the changelist. If yes, it shows the choices and votes of each question.
+        """
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        question.choice_set.create(choice_text='Yes', votes=3)
+        question.choice_set.create(choice_text='No', votes=2)
+        response = self.client.get(self.changelist)
+        self.assertContains(response, '<td class="field-choice_count">2</td>',
+                            html=True)
+        self.assertContains(response, '<td class="field-total_votes">5</td>',
+                            html=True)
+
+    def test_changelist_queries(self):
+        """
+        Test the changelist with more questions. If yes, it runs no more queries.
+        """
+        for number in range(3):
+            create_question(question_text='Question.', days=-1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.changelist)
+        for number in range(30):
+            create_question(question_text='Question.', days=-1).choice_set\
+                .create(choice_text='Yes')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.changelist)
+        self.assertEqual(len(many), len(few))
+
+    def test_sort_by_votable(self):
+        """
+        Test sorting by whether questions can be voted on. If yes, it is done in SQL.
+        """
+        closed = create_question(question_text='Closed.', days=-3)
+        open_question = create_question(question_text='Open.', days=-1,
+                                        duration=2)
+        index = QuestionAdmin.list_display.index('votable') + 1
+        response = self.client.get(self.changelist, {'o': '-{}'.format(index)})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [open_question, closed])
+
+    def test_close(self):
+        """
+        Test the close action. If yes, the questions are closed by one UPDATE.
+        """
+        questions = [create_question(question_text='Open.', days=-1,
+                                     duration=2) for number in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.changelist, {
+                'action': 'close',
+                '_selected_action': [question.pk for question in questions]})
+        self.assertEqual(len(updates(queries)), 1)
+        self.assertEqual(Question.objects.closed().count(), 3)
+
+    def test_close_closed(self):
+        """
+        Test the close action on a closed question. If yes, its end date and version stay the same.
+        """
+        question = create_question(question_text='Closed.', days=-3)
+        question.refresh_from_db()
+        response = self.client.post(self.changelist, {
+            'action': 'close', '_selected_action': [question.pk]},
+            follow=True)
+        self.assertContains(response, 'Closed 0 question(s).')
+        closed = Question.objects.get(pk=question.pk)
+        self.assertEqual((closed.end_date, closed.version),
+                         (question.end_date, question.version))
+
+    def test_reopen_and_extend(self):
+        """
+        Test the reopen and extend actions. If yes, the end dates and statuses move on.
+        """
+        question = create_question(question_text='Closed.', days=-3)
+        self.client.post(self.changelist, {'action': 'reopen',
+                                           '_selected_action': [question.pk]})
+        question.refresh_from_db()
+        self.assertEqual(question.status, Question.OPEN)
+        end_date = question.end_date
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.changelist, {
+                'action': 'extend', '_selected_action': [question.pk]})
+        self.assertEqual(len(updates(queries)), 1)
+        question.refresh_from_db()
+        self.assertEqual(question.end_date - end_date,
+                         datetime.timedelta(days=7))
+        self.assertEqual(question.status, Question.OPEN)
+
+
+class LargeQuestionAdminTests(TestCase):
+    """
+    Test the question admin for large tables.
+    """
+    def test_capped_count(self):
+        """
+        Test counting more questions than the cap. If yes, the count stops at the cap.
+        """
+        for number in range(3):
+            create_question(question_text='Question.', days=-1)
+        paginator = CappedCountPaginator(Question.objects.order_by('pk'), 100)
+        paginator.count_cap = 2
+        self.assertEqual(paginator.count, 2)
+
+    @override_settings(POLL_SEARCH_FTS=False)
+    def test_prefix_search(self):
+        """
+        Test searching without the full-text index. If yes, match the start of question texts in any case.
+        """
+        create_question(question_text='Favourite colour?', days=-1)
+        create_question(question_text='Your favourite food?', days=-1)
+        model_admin = LargeQuestionAdmin(Question, AdminSite())
+        queryset, duplicates = model_admin.get_search_results(
+            RequestFactory().get('/'), Question.objects.all(), 'favourite')
+        self.assertEqual([question.question_text for question in queryset],
+                         ['Favourite colour?'])
@@ -0,0 +1,191 @@
+import csv
+import datetime
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question, Vote
+from polls.results_cache import results_cache
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def export(client, table, format):
+    """
+    Return the streamed body of an export.
+    """
+    response = client.get(reverse('polls:api-export', args=(table, format)))
+    return response, b''.join(response.streaming_content).decode()
+
+
+class QuestionListApiTests(TestCase):
+    """
+    Test question list API.
+    """
+
+    def test_published_questions(self):
+        """
+        Test the question list. If yes, only published questions are listed, newest first.
+        """
+        create_question(question_text='Old question.', days=-30)
+        create_question(question_text='New question.', days=-1)
+        create_question(question_text='Future question.', days=5)
+        data = self.client.get(reverse('polls:api-questions')).json()
+        self.assertEqual([question['question_text']
+                          for question in data['questions']],
+                         ['New question.', 'Old question.'])
+        self.assertIsNone(data['next'])
+
+    def test_next_page(self):
+        """
+        Test paging through the question list. If yes, every question is listed once.
+        """
+        for number in range(25):
+            create_question(question_text='Question {}.'.format(number),
+                            days=-number - 1)
+        first = self.client.get(reverse('polls:api-questions')).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(first['questions']), 20)
+        self.assertEqual(len(second['questions']), 5)
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['questions'][-1]['question_text'],
+                         'Question 24.')
+
+    def test_etag_of_page(self):
+        """
+        Test the question list with the ETag of the index page. If yes, the JSON is returned instead of 304.
+        """
+        create_question(question_text='Question.', days=-1)
+        etag = self.client.get(reverse('polls:index'))['ETag']
+        response = self.client.get(reverse('polls:api-questions'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ResultsApiTests(TestCase):
+    """
+    Test results API.
+    """
+    def setUp(self):
+        results_cache.cache.clear()
+
+    def test_results(self):
+        """
+        Test results of a question. If yes, return votes and percentage of every choice.
+        """
+        question = create_question(question_text='Question.', days=-1)
+        question.choice_set.create(choice_text='Yes', votes=3)
+        question.choice_set.create(choice_text='No', votes=1)
+        data = self.client.get(reverse('polls:api-results',
+                                       args=(question.id,))).json()
+        self.assertEqual(data['total_votes'], 4)
+        self.assertEqual([(choice['choice_text'], choice['votes'],
+                           choice['percentage'])
+                          for choice in data['choices']],
+                         [('Yes', 3, 75.0), ('No', 1, 25.0)])
+
+    def test_future_question(self):
+        """
+        Test results of a question in the future. If yes, return not found.
+        """
+        question = create_question(question_text='Future question.', days=5)
+        response = self.client.get(reverse('polls:api-results',
+                                           args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_etag_of_page(self):
+        """
+        Test results with the ETag of the results page. If yes, the JSON is returned instead of 304.
+        """
+        question = create_question(question_text='Question.', days=-1)
+        question.choice_set.create(choice_text='Yes')
+        etag = self.client.get(reverse('polls:results',
+                                       args=(question.id,)))['ETag']
+        response = self.client.get(reverse('polls:api-results',
+                                           args=(question.id,)),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['choices'][0]['choice_text'], 'Yes')
+
+
+class ExportTests(TestCase):
+    """
+    Test bulk export.
+    """
+    def setUp(self):
+        self.question = create_question(question_text='Question.', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.user = get_user_model().objects.create_user(
+            username='voter', password='secret', is_staff=True)
+        Vote.objects.create(user=self.user, question=self.question,
+                            choice=self.choice)
+        self.client.force_login(self.user)
+
+    def test_staff_only(self):
+        """
+        Test export by a user who is not staff. If yes, return forbidden.
+        """
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('polls:api-export',
+                                           args=('votes', 'csv')))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_export(self):
+        """
+        Test export of an unknown table or format. If yes, return not found.
+        """
+        for table, format in (('users', 'csv'), ('votes', 'xml')):
+            response = self.client.get(reverse('polls:api-export',
+                                               args=(table, format)))
+            self.assertEqual(response.status_code, 404)
+
+    def test_ndjson(self):
+        """
+        Test export of votes as NDJSON. If yes, stream one object per vote.
+        """
+        response, body = export(self.client, 'votes', 'ndjson')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], [{
+            'id': Vote.objects.get().id, 'question_id': self.question.id,
+            'choice_id': self.choice.id, 'user_id': self.user.id}])
+
+    def test_csv(self):
+        """
+        Test export of choices as CSV. If yes, stream a header and one line per choice.
+        """
+        self.question.choice_set.create(choice_text='No, "never"', votes=2)
+        response, body = export(self.client, 'choices', 'csv')
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'question_id', 'choice_text',
+                                   'total_votes'])
+        self.assertEqual([row[2:] for row in rows[1:]],
+                         [['Yes', '0'], ['No, "never"', '2']])
+
+    def test_many_rows(self):
+        """
+        Test export of more questions than one chunk. If yes, every question is exported once.
+        """
+        now = timezone.now()
+        Question.objects.bulk_create(
+            Question(question_text='Question {}.'.format(number),
+                     pub_date=now, end_date=now) for number in range(4500))
+        response, body = export(self.client, 'questions', 'ndjson')
+        ids = [json.loads(line)['id'] for line in body.splitlines()]
+        self.assertEqual(ids, sorted(Question.objects.values_list('id',
+                                                                  flat=True)))
@@ -0,0 +1,138 @@
+import datetime
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+from polls import urls, views
+from polls.models import Question, Vote
+
+# The polls URLs with the async vote view, as served by mysite/asgi.py.
+urlpatterns = [
+    path('polls/', include((
+        [path('<int:question_id>/vote/', views.vote_async, name='vote'),
+         *urls.urlpatterns], 'polls'))),
+]
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncVoteTests(TransactionTestCase):
+    """
+    Test async vote view.
+    """
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='voter',
+                                                         password='secret')
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.async_client.force_login(self.user)
+
+    def vote_url(self, question):
+        return reverse('polls:vote', args=(question.id,))
+
+    def post(self, url, data=None, client=None):
+        """
+        Post a form to the ASGI handler.
+
+        The form is URL encoded, as browsers send it; the async test client
+        of Django 3.2 can not read back multipart bodies.
+        """
+        return (client or self.async_client).post(
+            url, urlencode(data or {}),
+            content_type='application/x-www-form-urlencoded')
+
+    async def test_anonymous(self):
+        """
+        Test voting without logging in. If yes, redirect to the login page.
+        """
+        response = await self.post(self.vote_url(self.question),
+                                   {'choice': self.choice.id},
+                                   client=AsyncClient())
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith('/accounts/login/?next='))
+
+    async def test_vote(self):
+        """
+        Test voting for a choice. If yes, count the vote and redirect to the results.
+        """
+        response = await self.post(self.vote_url(self.question),
+                                   {'choice': self.choice.id})
+        self.assertRedirects(response, reverse('polls:results',
+                                               args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        await sync_to_async(self.choice.refresh_from_db)()
+        self.assertEqual(self.choice.votes, 1)
+        self.assertTrue(await sync_to_async(
+            Vote.objects.filter(user=self.user, choice=self.choice).exists)())
+
+    async def test_no_choice(self):
+        """
+        Test voting without a choice. If yes, show the detail page with an error.
+        """
+        response = await self.post(self.vote_url(self.question))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['error_message'],
+                         "You didn't select a choice.")
+
+    async def test_choice_of_other_question(self):
+        """
+        Test voting with a choice from another question. If yes, nothing is counted.
+        """
+        other = await sync_to_async(create_question)(
+            question_text='Other question.', days=-1, duration=2)
+        response = await self.post(self.vote_url(other),
+                                   {'choice': self.choice.id})
+        self.assertEqual(response.context['error_message'],
+                         "You didn't select a choice.")
+        self.assertFalse(await sync_to_async(Vote.objects.exists)())
+
+    async def test_closed_question(self):
+        """
+        Test voting on a closed question. If yes, redirect to the index with an error.
+        """
+        closed = await sync_to_async(create_question)(
+            question_text='Closed question.', days=-5)
+        choice = await sync_to_async(closed.choice_set.create)(
+            choice_text='Yes')
+        response = await self.post(self.vote_url(closed), {'choice': choice.id})
+        self.assertRedirects(response, reverse('polls:index'),
+                             fetch_redirect_response=False)
+        self.assertEqual([str(message) for message
+                          in get_messages(response.asgi_request)],
+                         ["Voting is not allowed."])
+
+    async def test_missing_question(self):
+        """
+        Test voting on a question that does not exist. If yes, return not found.
+        """
+        response = await self.post(
+            reverse('polls:vote', args=(self.question.id + 1,)),
+            {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 404)
+
+    async def test_database_thread_closes_connection(self):
+        """
+        Test a call in the database thread pool with CONN_MAX_AGE 0. If yes, its connection is closed after it.
+        """
+        def query():
+            Question.objects.count()
+            return connections[DEFAULT_DB_ALIAS]
+
+        used = await views.in_database_thread(query)
+        self.assertEqual(used.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertIsNone(used.connection)
@@ -0,0 +1,162 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TransactionTestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """
+    Test answering conditional requests with 304 Not Modified.
+    """
+    def setUp(self):
+        caches['results'].clear()
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.results_url = reverse('polls:results', args=(self.question.id,))
+
+    def test_results_not_modified(self):
+        """
+        Test results with a current ETag. If yes, return 304 without any query.
+        """
+        etag = self.client.get(self.results_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_changes_results_etag(self):
+        """
+        Test results after a vote. If yes, the old ETag no longer matches.
+        """
+        etag = self.client.get(self.results_url)['ETag']
+        self.client.force_login(get_user_model().objects.create(username='voter'))
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_vote_keeps_detail_etag(self):
+        """
+        Test anonymous detail after a vote. If yes, the ETag still matches and the question row is not written.
+        """
+        url = reverse('polls:detail', args=(self.question.id,))
+        # The first response sets the CSRF cookie, which is part of the ETag.
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        version = Question.objects.get(pk=self.question.id).version
+        voter = Client()
+        voter.force_login(get_user_model().objects.create(username='voter'))
+        voter.post(reverse('polls:vote', args=(self.question.id,)),
+                   {'choice': self.choice.id})
+        self.assertEqual(Question.objects.get(pk=self.question.id).version,
+                         version)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_changes_voter_detail_etag(self):
+        """
+        Test detail of the voter after their vote. If yes, the old ETag no longer matches.
+        """
+        url = reverse('polls:detail', args=(self.question.id,))
+        self.client.force_login(get_user_model().objects.create(username='voter'))
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Current Vote: Yes')
+
+    def test_login_changes_detail_etag(self):
+        """
+        Test detail after logging out and in again. If yes, the old ETag no longer matches and the vote form works.
+        """
+        client = Client(enforce_csrf_checks=True)
+        get_user_model().objects.create_user('voter', password='secret')
+
+        def log_in():
+            token = client.get(reverse('login')).context['csrf_token']
+            client.post(reverse('login'), {
+                'username': 'voter', 'password': 'secret',
+                'csrfmiddlewaretoken': str(token)})
+
+        url = reverse('polls:detail', args=(self.question.id,))
+        log_in()
+        etag = client.get(url)['ETag']
+        client.get(reverse('logout'))
+        log_in()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = client.post(
+            reverse('polls:vote', args=(self.question.id,)),
+            {'choice': self.choice.id,
+             'csrfmiddlewaretoken': str(response.context['csrf_token'])})
+        self.assertEqual(response.status_code, 302)
+
+    def test_choice_edit_changes_results_etag(self):
+        """
+        Test results after editing a choice. If yes, the old ETag no longer matches.
+        """
+        etag = self.client.get(self.results_url)['ETag']
+        self.choice.choice_text = 'Of course'
+        self.choice.save()
+        response = self.client.get(self.results_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Of course')
+
+    def test_results_not_modified_since(self):
+        """
+        Test results with a current If-Modified-Since. If yes, return 304.
+        """
+        last_modified = self.client.get(self.results_url)['Last-Modified']
+        response = self.client.get(self.results_url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_detail_etag_depends_on_user(self):
+        """
+        Test detail for two users. If yes, they get different ETags.
+        """
+        url = reverse('polls:detail', args=(self.question.id,))
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(get_user_model().objects.create(username='voter'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_index_not_modified(self):
+        """
+        Test index with a current ETag. If yes, return 304 until a question is added.
+        """
+        url = reverse('polls:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        create_question(question_text='New question.', days=-1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'New question.')
+
+    def test_index_with_messages(self):
+        """
+        Test index with a pending message. If yes, it is always rendered.
+        """
+        url = reverse('polls:index')
+        closed = create_question(question_text='Closed.', days=-5)
+        self.client.force_login(get_user_model().objects.create(username='voter'))
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('polls:vote', args=(closed.id,)), {'choice': 1})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Voting is not allowed.')
@@ -0,0 +1,76 @@
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from polls.database import apply_pragmas, retry_on_busy
+
+
+class Flaky:
+    """
+    Callable that raises an error the first failures times it is called.
+    """
+    def __init__(self, failures, error=OperationalError('database is locked')):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return 'done'
+
+
+@override_settings(VOTE_BUSY_RETRIES=3, VOTE_BUSY_RETRY_DELAY=0)
+class RetryOnBusyTests(SimpleTestCase):
+    """
+    Test retrying writes that find the database locked.
+    """
+    def test_retry_until_done(self):
+        """
+        Test a write locked out twice. If yes, it is retried until done.
+        """
+        write = Flaky(2)
+        self.assertEqual(retry_on_busy(write)(), 'done')
+        self.assertEqual(write.calls, 3)
+
+    def test_give_up(self):
+        """
+        Test a write locked out every time. If yes, raise after the retries.
+        """
+        write = Flaky(10)
+        with self.assertRaises(OperationalError):
+            retry_on_busy(write)()
+        self.assertEqual(write.calls, 4)
+
+    def test_other_error(self):
+        """
+        Test a write failing for another reason. If yes, it is not retried.
+        """
+        write = Flaky(1, OperationalError('no such table: polls_vote'))
+        with self.assertRaises(OperationalError):
+            retry_on_busy(write)()
+        self.assertEqual(write.calls, 1)
+
+
+@override_settings(VOTE_BUSY_RETRIES=3, VOTE_BUSY_RETRY_DELAY=0)
+class DatabaseTests(TestCase):
+    """
+    Test database tuning.
+    """
+    def test_no_retry_in_transaction(self):
+        """
+        Test a locked write inside an outer transaction. If yes, it is not retried.
+        """
+        write = Flaky(1)
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            retry_on_busy(write)()
+        self.assertEqual(write.calls, 1)
+
+    def test_pragmas(self):
+        """
+        Test a new connection with SQLITE_PRAGMAS. If yes, they are applied.
+        """
+        with override_settings(SQLITE_PRAGMAS={'cache_size': -1234}):
+            apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1234)
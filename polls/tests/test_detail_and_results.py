@@ -0,0 +1,185 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question, Vote
+from polls.results_cache import results_cache
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def create_choices(question, count):
+    """
+    Create the given number of choices for the question.
+    """
+    return [question.choice_set.create(choice_text='Choice {}'.format(number))
+            for number in range(count)]
+
+
+class QuestionDetailViewTests(TestCase):
+    """
+    Test question detail view.
+    """
+    def setUp(self):
+        results_cache.cache.clear()
+        caches['template_fragments'].clear()
+
+    def test_future_question(self):
+        """
+        Test detail of a question in the future. If yes, return not found.
+        """
+        question = create_question(question_text='Future question.', days=5)
+        response = self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_query_count(self):
+        """
+        Test the number of queries. If yes, it does not grow with the choices.
+        """
+        for count in (1, 10):
+            question = create_question(question_text='Question.', days=-1)
+            create_choices(question, count)
+            # Version stamp, question and choices.
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('polls:detail',
+                                                   args=(question.id,)))
+            self.assertContains(response, 'Choice {}'.format(count - 1))
+
+    def test_query_count_cached_choices(self):
+        """
+        Test the number of queries with the choices cached. If yes, the choices are not read.
+        """
+        question = create_question(question_text='Question.', days=-1)
+        create_choices(question, 5)
+        url = reverse('polls:detail', args=(question.id,))
+        self.client.get(url)
+        # The question; its version stamp is cached by the first request.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, 'Choice 4')
+
+    def test_query_count_with_authentication(self):
+        """
+        Test the number of queries of a user. If yes, the current vote costs one query.
+        """
+        user = get_user_model().objects.create(username='voter')
+        self.client.force_login(user)
+        question = create_question(question_text='Question.', days=-1)
+        choices = create_choices(question, 5)
+        Vote.objects.create(user=user, question=question, choice=choices[3])
+        # Version stamp, session, user, question, current vote and choices.
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('polls:detail',
+                                               args=(question.id,)))
+        self.assertEqual(response.context['current_vote'], choices[3])
+
+
+class QuestionResultsViewTests(TestCase):
+    """
+    Test question results view.
+    """
+    def setUp(self):
+        results_cache.cache.clear()
+
+    def test_future_question(self):
+        """
+        Test results of a question in the future. If yes, return not found.
+        """
+        question = create_question(question_text='Future question.', days=5)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_percentages(self):
+        """
+        Test results with votes. If yes, show the share of each choice and the total.
+        """
+        question = create_question(question_text='Question.', days=-1)
+        question.choice_set.create(choice_text='Yes', votes=3)
+        question.choice_set.create(choice_text='No', votes=1)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertContains(response, '<td>75.0%</td>', html=True)
+        self.assertContains(response, '<td>25.0%</td>', html=True)
+        self.assertContains(response, '<th>4</th>', html=True)
+
+    def test_no_votes(self):
+        """
+        Test results without votes. If yes, every share is zero.
+        """
+        question = create_question(question_text='Question.', days=-1)
+        create_choices(question, 2)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertContains(response, '<td>0%</td>', count=2, html=True)
+
+    def test_query_count(self):
+        """
+        Test the number of queries. If yes, it does not grow with the choices.
+        """
+        for count in (1, 10):
+            question = create_question(question_text='Question.', days=-1)
+            create_choices(question, count)
+            # Version stamp, question and choices.
+            with self.assertNumQueries(3):
+                self.client.get(reverse('polls:results', args=(question.id,)))
+
+
+class ResultsCacheTests(TransactionTestCase):
+    """
+    Test caching of question results.
+    """
+    def setUp(self):
+        results_cache.cache.clear()
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.yes, self.no = create_choices(self.question, 2)
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_cached_results(self):
+        """
+        Test showing results twice. If yes, the second time needs no query.
+        """
+        self.client.get(self.url)
+        hits = results_cache.stats()['hits']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Choice 1')
+        self.assertEqual(results_cache.stats()['hits'], hits + 1)
+
+    def test_vote_invalidates_results(self):
+        """
+        Test voting after results were cached. If yes, results show the vote.
+        """
+        self.client.get(self.url)
+        self.client.force_login(get_user_model().objects.create(username='voter'))
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.yes.id})
+        response = self.client.get(self.url)
+        self.assertContains(response, '<td>100.0%</td>', html=True)
+
+    def test_choice_edit_invalidates_results(self):
+        """
+        Test editing a choice after results were cached. If yes, results show the edit.
+        """
+        self.client.get(self.url)
+        self.no.votes = 7
+        self.no.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, '<th>7</th>', html=True)
+
+    def test_future_question_is_not_cached(self):
+        """
+        Test results of a question in the future. If yes, nothing is cached.
+        """
+        question = create_question(question_text='Future question.', days=5)
+        self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertIsNone(results_cache.cache.get(results_cache.key(question.id)))
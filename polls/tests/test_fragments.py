@@ -0,0 +1,90 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Choice, Question, Vote
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+class FragmentCacheTests(TestCase):
+    """
+    Test caching the question rows of the index and the choices of detail.
+    """
+    def setUp(self):
+        caches['results'].clear()
+        caches['template_fragments'].clear()
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.detail_url = reverse('polls:detail', args=(self.question.id,))
+
+    def test_index_row_cached(self):
+        """
+        Test the index after a change that bumps no version. If yes, the cached row is shown.
+        """
+        self.client.get(reverse('polls:index'))
+        Question.objects.filter(pk=self.question.pk)\
+            .update(question_text='Changed.')
+        caches['results'].clear()
+        self.assertContains(self.client.get(reverse('polls:index')),
+                            'Question.')
+
+    def test_index_row_after_edit(self):
+        """
+        Test the index after editing a question. If yes, its row is rendered again.
+        """
+        self.client.get(reverse('polls:index'))
+        self.question.question_text = 'Edited.'
+        self.question.save()
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'Edited.')
+        self.assertNotContains(response, 'Question.')
+
+    def test_index_user_name(self):
+        """
+        Test the index for two users. If yes, each sees their own name around the shared rows.
+        """
+        for name in ('Ann', 'Bob'):
+            self.client.force_login(get_user_model().objects.create(
+                username=name.lower(), first_name=name))
+            response = self.client.get(reverse('polls:index'))
+            self.assertContains(response, name)
+            self.assertContains(response, 'Question.')
+
+    def test_detail_choices_after_edit(self):
+        """
+        Test detail after editing a choice. If yes, the choices are rendered again.
+        """
+        self.client.get(self.detail_url)
+        Choice.objects.filter(pk=self.choice.pk).update(choice_text='Sure')
+        self.assertContains(self.client.get(self.detail_url), 'Yes')
+        self.choice.choice_text = 'Of course'
+        self.choice.save()
+        self.assertContains(self.client.get(self.detail_url), 'Of course')
+
+    def test_detail_current_vote(self):
+        """
+        Test detail for a voter and then another user. If yes, only the voter sees their vote.
+        """
+        voter = get_user_model().objects.create(username='voter')
+        Vote.objects.cast(voter, self.question.id, self.choice.id)
+        self.client.force_login(voter)
+        self.assertContains(self.client.get(self.detail_url),
+                            'Current Vote: Yes')
+        self.client.force_login(get_user_model().objects.create(
+            username='other'))
+        response = self.client.get(self.detail_url)
+        self.assertNotContains(response, 'Current Vote: Yes')
+        self.assertContains(response, 'csrfmiddlewaretoken')
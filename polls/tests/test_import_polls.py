@@ -0,0 +1,122 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from polls.models import Choice, Question
+
+
+class ImportPollsTests(TestCase):
+    """
+    Test import_polls command.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, text):
+        """
+        Write a file to import and return its path.
+        """
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def write_jsonl(self, questions):
+        return self.write('polls.jsonl', ''.join(
+            json.dumps(question) + '\n' for question in questions))
+
+    def import_polls(self, *args):
+        out = io.StringIO()
+        call_command('import_polls', *args, stdout=out)
+        return out.getvalue()
+
+    def question(self, number, choices=('Yes', 'No')):
+        return {'external_id': 'q{}'.format(number),
+                'question_text': 'Question {}?'.format(number),
+                'pub_date': '2020-10-01T10:00:00+00:00',
+                'end_date': '2020-10-31T10:00:00+00:00',
+                'choices': list(choices)}
+
+    def test_jsonl(self):
+        """
+        Test import of a JSONL file. If yes, create every question with its choices.
+        """
+        path = self.write_jsonl(self.question(number) for number in range(25))
+        output = self.import_polls(path, '--chunk-size', '10',
+                                   '--batch-size', '7')
+        self.assertIn('25 question(s) (25 created, 0 updated, 0 unchanged)', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(Question.objects.count(), 25)
+        question = Question.objects.get(external_id='q24')
+        self.assertEqual(question.question_text, 'Question 24?')
+        self.assertEqual(question.pub_date.isoformat(),
+                         '2020-10-01T10:00:00+00:00')
+        self.assertEqual(question.status, Question.CLOSED)
+        self.assertEqual([choice.choice_text for choice
+                          in question.choice_set.order_by('pk')],
+                         ['Yes', 'No'])
+
+    def test_csv(self):
+        """
+        Test import of a CSV file. If yes, consecutive rows of a question become its choices.
+        """
+        path = self.write('polls.csv', (
+            'external_id,question_text,pub_date,end_date,choice_text\n'
+            'a,First?,2020-10-01 10:00,2020-10-02 10:00,Yes\n'
+            'a,First?,2020-10-01 10:00,2020-10-02 10:00,"No, never"\n'
+            'b,Second?,2020-10-01 10:00,2020-10-02 10:00,\n'))
+        self.import_polls(path)
+        self.assertEqual(
+            sorted(Choice.objects.values_list('question__external_id',
+                                              'choice_text')),
+            [('a', 'No, never'), ('a', 'Yes')])
+        self.assertTrue(Question.objects.filter(external_id='b').exists())
+
+    def test_rerun(self):
+        """
+        Test importing a changed file again. If yes, update questions and keep votes.
+        """
+        path = self.write_jsonl([self.question(1)])
+        self.import_polls(path)
+        question = Question.objects.get()
+        Choice.objects.filter(choice_text='Yes').update(votes=5)
+        changed = self.question(1, choices=('Yes', 'No', 'Maybe'))
+        changed['question_text'] = 'Changed?'
+        path = self.write_jsonl([changed, self.question(2)])
+        output = self.import_polls(path)
+        self.assertIn('(1 created, 1 updated, 0 unchanged) and 3 new choice(s)',
+                      output)
+        question.refresh_from_db()
+        self.assertEqual(question.question_text, 'Changed?')
+        self.assertEqual(question.version, 1)
+        self.assertEqual([(choice.choice_text, choice.votes) for choice
+                          in question.choice_set.order_by('pk')],
+                         [('Yes', 5), ('No', 0), ('Maybe', 0)])
+
+    def test_rerun_unchanged(self):
+        """
+        Test importing the same file again. If yes, nothing is written.
+        """
+        path = self.write_jsonl([self.question(1), self.question(2)])
+        self.import_polls(path)
+        # Looking up the questions and their choices, in a savepoint.
+        with self.assertNumQueries(4):
+            output = self.import_polls(path)
+        self.assertIn('(0 created, 0 updated, 2 unchanged) and 0 new choice(s)',
+                      output)
+        self.assertEqual(Question.objects.filter(version=0).count(), 2)
+
+    def test_invalid_row(self):
+        """
+        Test import of a row without a valid date. If yes, raise an error with its line.
+        """
+        question = self.question(2)
+        question['end_date'] = 'tomorrow'
+        path = self.write_jsonl([self.question(1), question])
+        with self.assertRaisesMessage(CommandError, "Line 2: invalid date"):
+            self.import_polls(path)
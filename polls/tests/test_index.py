@@ -1,9 +1,13 @@
 import datetime
+from unittest import mock
 
+from django.core.cache import caches
 from django.test import TestCase
 from django.utils import timezone
 from django.urls import reverse
 from polls.models import Question
+from polls.scheduler import status_scheduler
+from polls.views import IndexView
 
 
 def create_question(question_text, days, duration=1):
@@ -75,3 +79,78 @@ class QuestionIndexViewTests(TestCase):
             ['<Question: Past question 2.>',
              '<Question: Past question 1.>']
         )
+
+
+class QuestionIndexPaginationTests(TestCase):
+    """
+    Test pages of the question index view.
+    """
+    def setUp(self):
+        caches['results'].clear()
+        self.questions = [create_question(question_text='Question {}.'.format(number),
+                                          days=-number)
+                          for number in range(1, 8)]
+
+    def test_pages(self):
+        """
+        Test walking through the pages. If yes, every question is shown once, newest first.
+        """
+        shown = []
+        url = reverse('polls:index')
+        with mock.patch.object(IndexView, 'page_size', 3):
+            while url:
+                response = self.client.get(url)
+                shown.extend(response.context['latest_question_list'])
+                cursor = response.context['next_cursor']
+                url = cursor and '{}?after={}'.format(reverse('polls:index'), cursor)
+        self.assertEqual(shown, self.questions)
+
+    def test_same_publish_date(self):
+        """
+        Test questions published at the same time. If yes, pages split them by id.
+        """
+        same = Question.objects.create(question_text='Same time.',
+                                       pub_date=self.questions[0].pub_date,
+                                       end_date=self.questions[0].end_date)
+        with mock.patch.object(IndexView, 'page_size', 1):
+            response = self.client.get(reverse('polls:index'))
+            self.assertEqual(response.context['latest_question_list'], [same])
+            response = self.client.get(reverse('polls:index'),
+                                       {'after': response.context['next_cursor']})
+            self.assertEqual(response.context['latest_question_list'],
+                             [self.questions[0]])
+
+    def test_invalid_cursor(self):
+        """
+        Test an invalid page cursor. If yes, return not found.
+        """
+        response = self.client.get(reverse('polls:index'), {'after': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_votable(self):
+        """
+        Test closed and open questions. If yes, only open ones link to voting.
+        """
+        open_question = create_question(question_text='Open.', days=-1,
+                                        duration=2)
+        response = self.client.get(reverse('polls:index'))
+        link = 'href="{}"'
+        self.assertContains(response, link.format(
+            reverse('polls:detail', args=(open_question.id,))))
+        self.assertNotContains(response, link.format(
+            reverse('polls:detail', args=(self.questions[0].id,))))
+
+    def test_query_count(self):
+        """
+        Test the number of queries. If yes, it does not grow with the page size.
+        """
+        # Close the questions that ended on creation, which would otherwise
+        # be done by the first request.
+        status_scheduler.run_due()
+        # The first request also makes the version stamp of the index.
+        with self.assertNumQueries(2):
+            self.client.get(reverse('polls:index'))
+        for page_size in (1, 5, 50):
+            with mock.patch.object(IndexView, 'page_size', page_size):
+                with self.assertNumQueries(1):
+                    self.client.get(reverse('polls:index'))
@@ -0,0 +1,118 @@
+import datetime
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from mysite.metrics import Histogram, registry
+from polls.models import Question
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def samples(text):
+    """
+    Return {metric with labels: value} of a Prometheus text exposition.
+    """
+    return {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1])
+            for line in text.splitlines() if not line.startswith('#')}
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    """
+    Test metrics.
+    """
+    def setUp(self):
+        registry.clear()
+        caches['results'].clear()
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.question.choice_set.create(choice_text='Yes')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return samples(response.content.decode())
+
+    def test_view_metrics(self):
+        """
+        Test metrics after a request. If yes, its time, queries and templates are counted.
+        """
+        self.client.get(reverse('polls:results', args=(self.question.id,)))
+        metrics = self.scrape()
+        view = 'view="polls:results"'
+        self.assertEqual(metrics['view_request_seconds_count{%s}' % view], 1)
+        self.assertGreater(metrics['view_sql_queries_sum{%s}' % view], 0)
+        self.assertGreater(metrics['view_sql_seconds_sum{%s}' % view], 0)
+        self.assertGreater(metrics['view_template_seconds_sum{%s}' % view], 0)
+        self.assertEqual(
+            metrics['view_request_seconds_bucket{%s,le="+Inf"}' % view], 1)
+        for quantile in ('0.5', '0.95', '0.99'):
+            self.assertIn('view_request_seconds_quantile{%s,quantile="%s"}'
+                          % (view, quantile), metrics)
+
+    def test_results_cache_metrics(self):
+        """
+        Test metrics after showing results twice. If yes, the second is counted as a cache hit.
+        """
+        before = self.scrape()
+        for number in range(2):
+            self.client.get(reverse('polls:results', args=(self.question.id,)))
+        metrics = self.scrape()
+        for name in ('results_cache_hits_total', 'results_cache_misses_total'):
+            self.assertEqual(metrics[name], before[name] + 1)
+
+    def test_staff(self):
+        """
+        Test metrics for staff and other users. If yes, only staff can read them.
+        """
+        User = get_user_model()
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff',
+                                                         is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_wrong_token(self):
+        """
+        Test metrics with a wrong or non-ASCII token. If yes, deny them.
+        """
+        for authorization in ('Bearer wrong', 'Bearer \xe9'):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION=authorization)
+            self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """
+        Test requests with metrics disabled. If yes, nothing is recorded or served.
+        """
+        self.client.get(reverse('polls:index'))
+        self.assertEqual(self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            .status_code, 404)
+        self.assertFalse(re.search('_count', registry.exposition()))
+
+    def test_histogram_quantile(self):
+        """
+        Test quantiles of a histogram. If yes, interpolate inside the bucket.
+        """
+        histogram = Histogram((1, 2, 4))
+        for value in (0.5, 1.5, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(0.25), 1)
+        self.assertEqual(histogram.quantile(0.99), 2 + 2 * 0.96)
+        self.assertIsNone(Histogram((1,)).quantile(0.5))
@@ -94,3 +94,47 @@ class QuestionModelTests(TestCase):
         time = timezone.now() + datetime.timedelta(days=30)
         recent_question = Question(pub_date=timezone.now(), end_date=time)
         self.assertTrue(recent_question.can_vote())
+
+
+class QuestionQuerySetTests(TestCase):
+    """
+    Test date filters of questions in the database.
+    """
+    def setUp(self):
+        self.future = create_question(question_text='Future.', days=5)
+        self.open = create_question(question_text='Open.', days=-1, duration=2)
+        self.closed = create_question(question_text='Closed.', days=-5)
+
+    def test_published(self):
+        """
+        Test published questions. If yes, return open and closed questions.
+        """
+        self.assertCountEqual(Question.objects.published(),
+                              [self.open, self.closed])
+
+    def test_open_for_voting(self):
+        """
+        Test questions open for voting. If yes, return only the open question.
+        """
+        self.assertCountEqual(Question.objects.open_for_voting(), [self.open])
+
+    def test_closed(self):
+        """
+        Test closed questions. If yes, return only the closed question.
+        """
+        self.assertCountEqual(Question.objects.closed(), [self.closed])
+
+    def test_with_votable(self):
+        """
+        Test votable annotation. If yes, it agrees with can_vote.
+        """
+        for question in Question.objects.with_votable():
+            self.assertIs(question.votable, question.can_vote())
+
+    def test_at_given_time(self):
+        """
+        Test filters at a given time. If yes, use that time instead of now.
+        """
+        later = timezone.now() + datetime.timedelta(days=5, hours=12)
+        self.assertCountEqual(Question.objects.open_for_voting(later),
+                              [self.future])
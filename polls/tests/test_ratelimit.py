@@ -0,0 +1,136 @@
+import datetime
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.test import AsyncRequestFactory, Client, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls import views
+from polls.models import Question
+from polls.ratelimit import hit
+from polls.scheduler import status_scheduler
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+@override_settings(VOTE_RATE_LIMIT_IP=0, VOTE_RATE_LIMIT_USER=2,
+                   VOTE_RATE_LIMIT_WINDOW=60)
+class VoteRateLimitTests(TestCase):
+    """
+    Test vote rate limits.
+    """
+    def setUp(self):
+        caches['ratelimit'].clear()
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:vote', args=(self.question.id,))
+
+    def voter(self, username):
+        client = Client()
+        client.force_login(get_user_model().objects.create_user(username))
+        return client
+
+    def test_user_limit(self):
+        """
+        Test voting more often than the user limit. If yes, answer too many requests.
+        """
+        client = self.voter('voter')
+        for number in range(2):
+            response = client.post(self.url, {'choice': self.choice.id})
+            self.assertEqual(response.status_code, 302)
+        response = client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+        other = self.voter('other')
+        response = other.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 302)
+
+    def test_user_limit_across_sessions(self):
+        """
+        Test voting again after logging in again. If yes, the user limit still holds.
+        """
+        user = get_user_model().objects.create_user('voter')
+        for number in range(3):
+            client = Client()
+            client.force_login(user)
+            response = client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 429)
+
+    def test_rejected_without_queries(self):
+        """
+        Test a rejected vote. If yes, it does not touch the database.
+        """
+        client = self.voter('voter')
+        for number in range(2):
+            client.post(self.url, {'choice': self.choice.id})
+        status_scheduler.run_due()
+        with self.assertNumQueries(0):
+            response = client.post(self.url, {'choice': self.choice.id})
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(VOTE_RATE_LIMIT_IP=3, VOTE_RATE_LIMIT_USER=0,
+                       TRUSTED_PROXIES=1)
+    def test_ip_limit(self):
+        """
+        Test voters behind one forwarded address who forge hops before it. If yes, they share its limit.
+        """
+        statuses = [
+            self.voter('voter{}'.format(number)).post(
+                self.url, {'choice': self.choice.id},
+                HTTP_X_FORWARDED_FOR='10.0.0.{}, 203.0.113.7'.format(number))
+            .status_code for number in range(4)]
+        self.assertEqual(statuses, [302, 302, 302, 429])
+        response = self.voter('elsewhere').post(
+            self.url, {'choice': self.choice.id},
+            HTTP_X_FORWARDED_FOR='198.51.100.1')
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(VOTE_RATE_LIMIT_IP=3, VOTE_RATE_LIMIT_USER=0)
+    def test_ip_limit_without_proxies(self):
+        """
+        Test voters who forge X-Forwarded-For without trusted proxies. If yes, they share the limit of their address.
+        """
+        statuses = [
+            self.voter('voter{}'.format(number)).post(
+                self.url, {'choice': self.choice.id},
+                HTTP_X_FORWARDED_FOR='203.0.113.{}'.format(number))
+            .status_code for number in range(4)]
+        self.assertEqual(statuses, [302, 302, 302, 429])
+
+    @override_settings(VOTE_RATE_LIMIT_IP=1, VOTE_RATE_LIMIT_USER=0)
+    def test_async_view(self):
+        """
+        Test the async vote view. If yes, it is limited too.
+        """
+        statuses = []
+        for number in range(2):
+            request = AsyncRequestFactory().post(self.url)
+            request.user = AnonymousUser()
+            response = async_to_sync(views.vote_async)(request,
+                                                       self.question.id)
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [302, 429])
+
+    def test_sliding_window(self):
+        """
+        Test hits across windows. If yes, the previous window counts by its share left.
+        """
+        counters = [('test', 'client', 2)]
+        self.assertEqual([hit(counters, 60, now) for now in (0, 1, 2)],
+                         [0, 0, 58])
+        # A sixth of the three hits of the previous window still counts.
+        self.assertEqual(hit(counters, 60, 110), 0)
+        self.assertEqual(hit(counters, 60, 111), 9)
+        # Half of the two hits of the previous window still count.
+        self.assertEqual(hit(counters, 60, 150), 0)
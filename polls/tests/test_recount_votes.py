@@ -0,0 +1,120 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from polls.models import Choice, ChoiceVoteShard, Question, Vote, VoteRollup
+from polls.management.commands import recount_votes
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+@override_settings(VOTE_ROLLUPS=True)
+class RecountVotesTests(TestCase):
+    """
+    Test recounting votes from the votes of users.
+    """
+    def setUp(self):
+        self.questions = []
+        users = [get_user_model().objects.create_user('voter{}'.format(number))
+                 for number in range(3)]
+        for number in range(2):
+            question = create_question(question_text='Open.', days=-1,
+                                       duration=2)
+            yes = question.choice_set.create(choice_text='Yes')
+            question.choice_set.create(choice_text='No')
+            for user in users:
+                Vote.objects.cast(user, question.id, yes.id)
+            self.questions.append(question)
+        self.yes = self.questions[0].choice_set.get(choice_text='Yes')
+        Choice.objects.filter(pk=self.yes.pk).update(votes=10)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'recount.json')
+
+    def recount(self, *args):
+        out = io.StringIO()
+        call_command('recount_votes', *args, stdout=out)
+        return out.getvalue()
+
+    def test_report(self):
+        """
+        Test a recount without --fix. If yes, the counter that is off is reported and left alone.
+        """
+        out = self.recount()
+        self.assertIn('Question {} choice {}: 10 vote(s) recorded, 3 counted.'
+                      .format(self.questions[0].id, self.yes.id), out)
+        self.assertIn('Checked 6 vote(s) of 4 choice(s)', out)
+        self.assertIn('1 counter(s) off.', out)
+        self.assertEqual(Choice.objects.get(pk=self.yes.pk).votes, 10)
+
+    def test_fix(self):
+        """
+        Test a recount with --fix. If yes, the counter is corrected without touching the vote history.
+        """
+        rollups = list(VoteRollup.objects.values_list('count', flat=True))
+        self.assertIn('1 counter(s) fixed.', self.recount('--fix'))
+        self.assertEqual(Choice.objects.get(pk=self.yes.pk).votes, 3)
+        self.assertEqual(list(VoteRollup.objects.values_list('count',
+                                                             flat=True)),
+                         rollups)
+        self.assertIn('0 counter(s) off.', self.recount())
+
+    def test_fix_with_shards(self):
+        """
+        Test fixing a choice whose votes are also in shards. If yes, its total becomes the count.
+        """
+        ChoiceVoteShard.objects.create(choice=self.yes, shard_no=0, count=4)
+        self.recount('--fix')
+        total = Choice.objects.with_totals().get(pk=self.yes.pk).total_votes
+        self.assertEqual(total, 3)
+
+    def test_resume(self):
+        """
+        Test a recount that stopped after its first range. If yes, running it again does only the rest.
+        """
+        recount_range = recount_votes.recount_range
+
+        def stop_at_second(low, high, fix, batch_size):
+            if low > self.questions[0].id:
+                raise KeyboardInterrupt
+            return recount_range(low, high, fix, batch_size)
+
+        with mock.patch.object(recount_votes, 'recount_range',
+                               stop_at_second):
+            with self.assertRaises(KeyboardInterrupt):
+                self.recount('--chunk-size', '1', '--checkpoint',
+                             self.checkpoint)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(json.load(checkpoint)['done'],
+                             [self.questions[0].id])
+        out = self.recount('--chunk-size', '1', '--checkpoint',
+                           self.checkpoint)
+        self.assertIn('Resuming after 1 range(s).', out)
+        self.assertIn('Checked 6 vote(s) of 4 choice(s)', out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_of_other_options(self):
+        """
+        Test resuming with other options than the checkpoint. If yes, refuse.
+        """
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'options': {'fix': True, 'chunk_size': 5},
+                       'done': [0], 'totals': {}}, checkpoint)
+        with self.assertRaises(CommandError):
+            self.recount('--checkpoint', self.checkpoint)
@@ -0,0 +1,148 @@
+import datetime
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Choice, Question
+from polls.replicas import PIN_COOKIE, replica_pool
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def replicate(*objects):
+    """
+    Copy rows of the primary to the replica, as replication would.
+    """
+    for instance in objects:
+        type(instance).objects.using('replica').bulk_create([instance])
+
+
+@override_settings(REPLICA_DATABASES=['replica'], VOTE_RATE_LIMIT_IP=0)
+class ReplicaTests(TransactionTestCase):
+    """
+    Test reading from a replica, a second SQLite file that is only changed
+    by the tests.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # Added after the test case blocks the databases it does not use.
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.databases['broken'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'missing', 'db.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in ('replica', 'broken'):
+            connections[alias].close()
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        replica_pool.forget()
+        caches['results'].clear()
+
+    def tearDown(self):
+        call_command('flush', database='replica', interactive=False,
+                     verbosity=0)
+
+    def test_reads_from_replica(self):
+        """
+        Test the index with a replica. If yes, it shows the questions of the replica.
+        """
+        create_question(question_text='Only on the primary.', days=-1)
+        replicate(Question(question_text='Only on the replica.',
+                           pub_date=timezone.now() - datetime.timedelta(days=1),
+                           end_date=timezone.now() + datetime.timedelta(days=1),
+                           status=Question.OPEN))
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'Only on the replica.')
+        self.assertNotContains(response, 'Only on the primary.')
+
+    def test_unhealthy_replica(self):
+        """
+        Test the index with a replica that can not be read. If yes, it reads the primary.
+        """
+        create_question(question_text='Only on the primary.', days=-1)
+        with override_settings(REPLICA_DATABASES=['broken']):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'Only on the primary.')
+
+    def test_round_robin(self):
+        """
+        Test choosing among replicas. If yes, take the healthy ones in turn.
+        """
+        with override_settings(REPLICA_DATABASES=['replica', 'default']):
+            chosen = [replica_pool.choose() for number in range(4)]
+        self.assertEqual(sorted(chosen),
+                         ['default', 'default', 'replica', 'replica'])
+        self.assertNotEqual(chosen[0], chosen[1])
+        # The turn of the broken one goes to the next.
+        with override_settings(REPLICA_DATABASES=['replica', 'broken',
+                                                  'default']):
+            chosen = [replica_pool.choose() for number in range(3)]
+        self.assertEqual(sorted(chosen), ['default', 'default', 'replica'])
+        with override_settings(REPLICA_DATABASES=['broken']):
+            self.assertIsNone(replica_pool.choose())
+
+    def test_read_your_writes(self):
+        """
+        Test results after voting with a lagging replica. If yes, the voter sees their vote.
+        """
+        user = get_user_model().objects.create_user('voter')
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        replicate(Question.objects.get(pk=question.pk),
+                  Choice.objects.get(pk=choice.pk))
+        results = reverse('polls:results', args=(question.id,))
+        self.client.force_login(user)
+        response = self.client.post(reverse('polls:vote', args=(question.id,)),
+                                    {'choice': choice.id})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # Another client fills the results cache from the lagging replica.
+        response = self.client_class().get(results)
+        self.assertEqual(response.context['question'].total_votes, 0)
+        response = self.client.get(results)
+        self.assertEqual(response.context['question'].total_votes, 1)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_go_to_primary(self):
+        """
+        Test a vote. If yes, it is written to the primary only.
+        """
+        user = get_user_model().objects.create_user('voter')
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        replicate(Question.objects.get(pk=question.pk),
+                  Choice.objects.get(pk=choice.pk))
+        self.client.force_login(user)
+        self.client.post(reverse('polls:vote', args=(question.id,)),
+                         {'choice': choice.id})
+        self.assertEqual(Choice.objects.get(pk=choice.pk).votes, 1)
+        self.assertEqual(Choice.objects.using('replica').get(pk=choice.pk)
+                         .votes, 0)
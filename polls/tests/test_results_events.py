@@ -0,0 +1,135 @@
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from mysite.asgi import application
+from polls.events import results_events
+from polls.models import Choice, Question
+from polls.results_cache import results_cache
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+async def open_stream(question_id):
+    """
+    Open the event stream of a question and return its communicator and status.
+    """
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http', 'method': 'GET', 'headers': [], 'query_string': b'',
+        'path': reverse('polls:events', args=(question_id,))})
+    await communicator.send_input({'type': 'http.request'})
+    start = await communicator.receive_output(5)
+    return communicator, start['status']
+
+
+async def next_results(communicator):
+    """
+    Return the data of the next results event of a stream.
+    """
+    message = await communicator.receive_output(5)
+    fields = dict(line.split(': ', 1)
+                  for line in message['body'].decode().splitlines() if line)
+    return json.loads(fields['data'])
+
+
+async def close_stream(communicator):
+    await communicator.send_input({'type': 'http.disconnect'})
+    await communicator.wait(5)
+
+
+@override_settings(RESULTS_EVENTS_POLL_INTERVAL=0)
+class ResultsEventsTests(TransactionTestCase):
+    """
+    Test results events.
+    """
+    def setUp(self):
+        results_cache.cache.clear()
+        self.question = create_question(question_text='Question.', days=-1)
+        self.yes = self.question.choice_set.create(choice_text='Yes', votes=3)
+        self.no = self.question.choice_set.create(choice_text='No', votes=1)
+
+    def test_wsgi(self):
+        """
+        Test events under WSGI. If yes, return no content so browsers stop reconnecting.
+        """
+        response = self.client.get(reverse('polls:events',
+                                           args=(self.question.id,)))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_future_question(self):
+        """
+        Test events of a question in the future. If yes, return not found.
+        """
+        question = await sync_to_async(create_question)(
+            question_text='Future question.', days=5)
+        communicator, status = await open_stream(question.id)
+        self.assertEqual(status, 404)
+
+    async def test_current_results(self):
+        """
+        Test opening a stream. If yes, send the current results first.
+        """
+        communicator, status = await open_stream(self.question.id)
+        self.assertEqual(status, 200)
+        results = await next_results(communicator)
+        self.assertEqual(results['total_votes'], 4)
+        self.assertEqual(
+            [(choice['id'], choice['votes'], choice['percentage'])
+             for choice in results['choices']],
+            [(self.yes.id, 3, 75.0), (self.no.id, 1, 25.0)])
+        await close_stream(communicator)
+
+    async def test_vote(self):
+        """
+        Test a vote while streams are open. If yes, every stream gets the new results.
+        """
+        streams = [(await open_stream(self.question.id))[0]
+                   for number in range(3)]
+        for communicator in streams:
+            await next_results(communicator)
+        await sync_to_async(Choice.objects.add_vote)(self.question.id,
+                                                     self.no.id)
+        for communicator in streams:
+            results = await next_results(communicator)
+            self.assertEqual(results['total_votes'], 5)
+            self.assertEqual(results['choices'][1]['votes'], 2)
+        self.assertEqual(results_events.subscribers(), 3)
+        for communicator in streams:
+            await close_stream(communicator)
+        self.assertEqual(results_events.subscribers(), 0)
+
+    @override_settings(RESULTS_EVENTS_POLL_INTERVAL=0.05)
+    async def test_vote_of_other_process(self):
+        """
+        Test a vote counted without the signal, as by another process. If yes, it is found by polling.
+        """
+        communicator, status = await open_stream(self.question.id)
+        await next_results(communicator)
+        await sync_to_async(
+            Choice.objects.filter(pk=self.yes.id).update)(votes=10)
+        results = await next_results(communicator)
+        self.assertEqual(results['total_votes'], 11)
+        await close_stream(communicator)
+
+    @override_settings(RESULTS_EVENTS_KEEPALIVE=0.05)
+    async def test_keepalive(self):
+        """
+        Test an idle stream. If yes, send comments to keep it open.
+        """
+        communicator, status = await open_stream(self.question.id)
+        await next_results(communicator)
+        message = await communicator.receive_output(5)
+        self.assertEqual(message['body'], b': keepalive\n\n')
+        await close_stream(communicator)
@@ -0,0 +1,190 @@
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Choice, Question, Vote, VoteRollup, bucket_start
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def rollups(resolution):
+    return dict(((choice_id, bucket), count) for choice_id, bucket, count in
+                VoteRollup.objects.filter(resolution=resolution)
+                .values_list('choice_id', 'bucket', 'count'))
+
+
+@override_settings(VOTE_ROLLUPS=True)
+class VoteRollupTests(TestCase):
+    """
+    Test counting votes into time buckets.
+    """
+    def setUp(self):
+        self.question = create_question(question_text='Open.', days=-10,
+                                        duration=20)
+        self.yes = self.question.choice_set.create(choice_text='Yes')
+        self.no = self.question.choice_set.create(choice_text='No')
+        self.now = datetime.datetime(2020, 10, 25, 12, 30, 15,
+                                     tzinfo=datetime.timezone.utc)
+
+    def test_bucket_start(self):
+        """
+        Test the start of buckets. If yes, they start at whole UTC minutes, hours and days.
+        """
+        moment = timezone.localtime(self.now)
+        self.assertEqual(bucket_start(moment, VoteRollup.MINUTE),
+                         self.now.replace(second=0))
+        self.assertEqual(bucket_start(moment, VoteRollup.HOUR),
+                         self.now.replace(minute=0, second=0))
+        self.assertEqual(bucket_start(moment, VoteRollup.DAY),
+                         self.now.replace(hour=0, minute=0, second=0))
+
+    def test_changed_vote(self):
+        """
+        Test a vote changed from one choice to another. If yes, one bucket loses it and the other gains it.
+        """
+        user = get_user_model().objects.create_user('voter')
+        Vote.objects.cast(user, self.question.id, self.yes.id)
+        Vote.objects.cast(user, self.question.id, self.no.id)
+        bucket = bucket_start(timezone.now(), VoteRollup.MINUTE)
+        self.assertEqual(rollups(VoteRollup.MINUTE),
+                         {(self.yes.id, bucket): 0, (self.no.id, bucket): 1})
+
+    def test_single(self):
+        """
+        Test adding a vote to existing buckets. If yes, one UPDATE counts it at every resolution.
+        """
+        VoteRollup.objects.add({self.yes.id: 1}, self.now)
+        with self.assertNumQueries(1):
+            VoteRollup.objects.add({self.yes.id: 1}, self.now)
+        VoteRollup.objects.add({self.yes.id: 1},
+                               self.now + datetime.timedelta(minutes=1))
+        self.assertEqual(sorted(rollups(VoteRollup.MINUTE).values()), [1, 2])
+        self.assertEqual(list(rollups(VoteRollup.HOUR).values()), [3])
+        self.assertEqual(list(rollups(VoteRollup.DAY).values()), [3])
+
+    def test_batch(self):
+        """
+        Test adding a batch of votes, as the vote buffer does. If yes, existing and new buckets are counted in.
+        """
+        VoteRollup.objects.add({self.yes.id: 2}, self.now)
+        # A SELECT, an UPDATE and an INSERT in a savepoint.
+        with self.assertNumQueries(5):
+            VoteRollup.objects.add({self.yes.id: 1, self.no.id: 4}, self.now)
+        bucket = self.now.replace(second=0)
+        self.assertEqual(rollups(VoteRollup.MINUTE),
+                         {(self.yes.id, bucket): 3, (self.no.id, bucket): 4})
+        Choice.objects.add_votes({self.no.id: 5})
+        self.assertEqual(sum(rollups(VoteRollup.MINUTE).values()), 12)
+
+    def test_compact(self):
+        """
+        Test compacting old buckets. If yes, they are removed and coarser buckets still hold their votes.
+        """
+        for minutes in (0, 1, 91, 3 * 24 * 60):
+            VoteRollup.objects.add(
+                {self.yes.id: 1},
+                self.now - datetime.timedelta(minutes=minutes))
+        with self.settings(VOTE_ROLLUP_MINUTE_RETENTION=1,
+                           VOTE_ROLLUP_HOUR_RETENTION=2):
+            removed = VoteRollup.objects.compact(self.now)
+        self.assertEqual(removed, 3)
+        self.assertEqual(len(rollups(VoteRollup.MINUTE)), 2)
+        self.assertEqual(sorted(rollups(VoteRollup.HOUR).values()), [1, 2])
+        self.assertEqual(sorted(rollups(VoteRollup.DAY).values()), [1, 3])
+
+    def test_compact_command(self):
+        """
+        Test the compaction command. If yes, it reports the removed buckets.
+        """
+        VoteRollup.objects.add({self.yes.id: 1},
+                               timezone.now() - datetime.timedelta(days=5))
+        out = io.StringIO()
+        call_command('compact_vote_rollups', stdout=out)
+        self.assertIn('Removed 1 old vote rollup bucket(s).', out.getvalue())
+
+
+class HistoryTests(TestCase):
+    """
+    Test the results history API.
+    """
+    def setUp(self):
+        self.question = create_question(question_text='Open.', days=-10,
+                                        duration=20)
+        self.yes = self.question.choice_set.create(choice_text='Yes')
+        self.no = self.question.choice_set.create(choice_text='No')
+        self.now = bucket_start(timezone.now(), VoteRollup.HOUR)
+        self.url = reverse('polls:api-history', args=(self.question.id,))
+
+    def history(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hours(self):
+        """
+        Test the history of the last day. If yes, minutes are summed into hours.
+        """
+        for minutes, choice in ((5, self.yes), (10, self.yes), (15, self.no),
+                                (65, self.no)):
+            VoteRollup.objects.add({choice.id: 1}, self.now - datetime.
+                                   timedelta(minutes=minutes))
+        data = self.history(start=(self.now - datetime.timedelta(days=1))
+                            .isoformat())
+        self.assertEqual(data['resolution'], VoteRollup.HOUR)
+        self.assertEqual([choice['choice_text'] for choice in data['choices']],
+                         ['Yes', 'No'])
+        self.assertEqual([bucket['votes'] for bucket in data['buckets']],
+                         [[0, 1], [2, 1]])
+
+    def test_compacted(self):
+        """
+        Test the history of minutes already compacted. If yes, their hour is served.
+        """
+        VoteRollup.objects.add({self.yes.id: 1},
+                               self.now - datetime.timedelta(days=5))
+        with self.settings(VOTE_ROLLUP_MINUTE_RETENTION=1):
+            VoteRollup.objects.compact()
+        data = self.history(resolution=VoteRollup.MINUTE,
+                            start=(self.now - datetime.timedelta(days=5,
+                                                                 hours=1))
+                            .isoformat(),
+                            end=(self.now - datetime.timedelta(days=4))
+                            .isoformat())
+        self.assertEqual([bucket['votes'] for bucket in data['buckets']],
+                         [[1, 0]])
+
+    def test_queries(self):
+        """
+        Test the history with more votes in the same buckets. If yes, it runs no more queries.
+        """
+        VoteRollup.objects.add({self.yes.id: 1}, self.now)
+        with self.assertNumQueries(3):
+            self.history()
+        for number in range(20):
+            VoteRollup.objects.add({self.yes.id: 1, self.no.id: 1}, self.now)
+        with self.assertNumQueries(3):
+            data = self.history()
+        self.assertEqual(data['buckets'][-1]['votes'], [21, 20])
+
+    def test_invalid(self):
+        """
+        Test the history with bad parameters. If yes, answer not found.
+        """
+        for params in ({'start': 'yesterday'}, {'resolution': 'week'},
+                       {'start': timezone.now().isoformat(),
+                        'end': self.question.pub_date.isoformat()},
+                       {'resolution': VoteRollup.MINUTE}):
+            self.assertEqual(self.client.get(self.url, params).status_code,
+                             404, params)
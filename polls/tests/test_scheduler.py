@@ -0,0 +1,139 @@
+import datetime
+import io
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question
+from polls.scheduler import StatusScheduler
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+class QuestionStatusTests(TestCase):
+    """
+    Test status of questions.
+    """
+    def test_status_on_save(self):
+        """
+        Test saving questions. If yes, their status follows their dates.
+        """
+        self.assertEqual(create_question('Future.', days=5).status,
+                         Question.SCHEDULED)
+        self.assertEqual(create_question('Open.', days=-1, duration=2).status,
+                         Question.OPEN)
+        self.assertEqual(create_question('Closed.', days=-5).status,
+                         Question.CLOSED)
+
+    def test_status_on_date_change(self):
+        """
+        Test moving the end date of a closed question. If yes, it opens again.
+        """
+        question = create_question('Closed.', days=-5)
+        question.end_date = timezone.now() + datetime.timedelta(days=1)
+        question.save(update_fields=['end_date'])
+        question.refresh_from_db()
+        self.assertEqual(question.status, Question.OPEN)
+
+    def test_advance_statuses(self):
+        """
+        Test advancing statuses at a later time. If yes, due questions open and close.
+        """
+        future = create_question('Future.', days=1)
+        current = create_question('Open.', days=-1, duration=2)
+        current.refresh_from_db()
+        version = current.version
+        later = timezone.now() + datetime.timedelta(days=1, hours=12)
+        self.assertCountEqual(Question.objects.advance_statuses(later),
+                              [future.id, current.id])
+        future.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(future.status, Question.OPEN)
+        self.assertEqual(current.status, Question.CLOSED)
+        self.assertEqual(current.version, version + 1)
+        self.assertEqual(Question.objects.advance_statuses(later), [])
+
+
+class StatusSchedulerTests(TestCase):
+    """
+    Test status scheduler.
+    """
+    def setUp(self):
+        self.now = timezone.now()
+        self.question = Question.objects.create(
+            question_text='Question.',
+            pub_date=self.now + datetime.timedelta(minutes=1),
+            end_date=self.now + datetime.timedelta(minutes=2))
+        self.scheduler = StatusScheduler(horizon=3600)
+
+    def test_heap(self):
+        """
+        Test the scheduler between boundaries. If yes, it waits without queries.
+        """
+        self.scheduler.run_due(self.now)
+        self.assertEqual(self.scheduler.next_run(), self.question.pub_date)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.scheduler.due(
+                self.now + datetime.timedelta(seconds=30)))
+            self.assertEqual(self.scheduler.run_due(
+                self.now + datetime.timedelta(seconds=30)), [])
+
+    def test_boundaries(self):
+        """
+        Test running at the boundaries of a question. If yes, it opens and then closes.
+        """
+        self.scheduler.run_due(self.now)
+        self.assertEqual(self.scheduler.run_due(self.question.pub_date),
+                         [self.question.id])
+        self.assertEqual(Question.objects.open_for_voting().get(),
+                         self.question)
+        self.assertEqual(self.scheduler.run_due(self.question.end_date), [])
+        self.assertEqual(self.scheduler.run_due(
+            self.question.end_date + datetime.timedelta(seconds=1)),
+            [self.question.id])
+        self.assertEqual(Question.objects.closed().get(), self.question)
+
+    def test_saved_question(self):
+        """
+        Test a question saved after loading. If yes, it is added to the heap.
+        """
+        self.scheduler.run_due(self.now)
+        soon = self.now + datetime.timedelta(seconds=10)
+        question = Question(question_text='Soon.', pub_date=soon,
+                            end_date=soon + datetime.timedelta(days=1))
+        question.save()
+        self.scheduler.schedule(question, self.now)
+        self.assertEqual(self.scheduler.next_run(), soon)
+
+    def test_request(self):
+        """
+        Test a request after the publish date. If yes, the question is open for it.
+        """
+        caches['results'].clear()
+        later = self.question.pub_date + datetime.timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get(reverse('polls:index'))
+        self.assertEqual(list(response.context['latest_question_list']),
+                         [self.question])
+        self.assertTrue(response.context['latest_question_list'][0].votable)
+
+    def test_command(self):
+        """
+        Test schedule_polls --once. If yes, report the changed questions.
+        """
+        Question.objects.filter(pk=self.question.pk).update(
+            pub_date=self.now - datetime.timedelta(days=1))
+        out = io.StringIO()
+        call_command('schedule_polls', '--once', stdout=out)
+        self.assertIn('Changed the status of 1 question(s).', out.getvalue())
@@ -0,0 +1,188 @@
+import datetime
+import importlib
+import re
+from unittest import skipUnless
+
+from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.admin import LargeQuestionAdmin
+from polls.models import Choice, Question
+from polls.search import search_questions, sqlite_has_fts5
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+def texts(questions):
+    return [question.question_text for question in questions]
+
+
+class SearchTests(TestCase):
+    """
+    Test searching questions with the full-text index.
+    """
+    def setUp(self):
+        self.food = create_question(question_text='Favourite food?', days=-1,
+                                    duration=2)
+        self.food.choice_set.create(choice_text='Pizza')
+        self.colour = create_question(question_text='Favourite colour?',
+                                      days=-2)
+        self.colour.choice_set.create(choice_text='Green')
+
+    def test_prefix(self):
+        """
+        Test searching the start of words in any case. If yes, match every question with such words.
+        """
+        self.assertEqual(sorted(texts(search_questions('FAV'))),
+                         ['Favourite colour?', 'Favourite food?'])
+        self.assertEqual(texts(search_questions('fav col')),
+                         ['Favourite colour?'])
+
+    def test_ranking(self):
+        """
+        Test a word in one question text and in another's choice. If yes, the question text ranks first.
+        """
+        other = create_question(question_text='Best dinner?', days=-1)
+        other.choice_set.create(choice_text='Pizza or pasta')
+        self.food.question_text = 'Pizza tonight?'
+        self.food.save()
+        self.assertEqual(texts(search_questions('pizza')),
+                         ['Pizza tonight?', 'Best dinner?'])
+
+    def test_choices_in_sync(self):
+        """
+        Test adding, renaming and removing choices. If yes, search follows them.
+        """
+        choice = self.colour.choice_set.create(choice_text='Blue')
+        self.assertEqual(texts(search_questions('blue')),
+                         ['Favourite colour?'])
+        Choice.objects.filter(pk=choice.pk).update(choice_text='Red')
+        self.assertEqual(search_questions('blue'), [])
+        self.assertEqual(texts(search_questions('red')),
+                         ['Favourite colour?'])
+        choice.delete()
+        self.assertEqual(search_questions('red'), [])
+        self.assertEqual(texts(search_questions('green')),
+                         ['Favourite colour?'])
+
+    def test_unpublished_and_deleted(self):
+        """
+        Test a future question and a deleted one. If yes, neither is found.
+        """
+        create_question(question_text='Favourite future?', days=5)
+        self.colour.delete()
+        self.assertEqual(texts(search_questions('favourite')),
+                         ['Favourite food?'])
+
+    def test_query_syntax(self):
+        """
+        Test a search with quotes and operators. If yes, they are taken as words.
+        """
+        self.assertEqual(texts(search_questions('"food" -(')),
+                         ['Favourite food?'])
+        self.assertEqual(search_questions('?!'), [])
+
+    def test_view_pages(self):
+        """
+        Test the search page with more matches than fit. If yes, they are split into pages.
+        """
+        with self.settings(POLL_SEARCH_PAGE_SIZE=1):
+            first = self.client.get(reverse('polls:search'), {'q': 'fav'})
+            second = self.client.get(reverse('polls:search'),
+                                     {'q': 'fav', 'page': 2})
+        self.assertEqual(len(first.context['question_list']), 1)
+        self.assertEqual(first.context['next_page'], 2)
+        self.assertEqual(second.context['previous_page'], 1)
+        self.assertIsNone(second.context['next_page'])
+        self.assertNotEqual(first.context['question_list'],
+                            second.context['question_list'])
+        self.assertContains(first, 'More matches')
+
+    def test_view_votable(self):
+        """
+        Test the search page. If yes, only open questions link to voting.
+        """
+        response = self.client.get(reverse('polls:search'), {'q': 'fav'})
+        self.assertContains(response, 'href="{}"'.format(
+            reverse('polls:detail', args=(self.food.id,))))
+        self.assertNotContains(response, 'href="{}"'.format(
+            reverse('polls:detail', args=(self.colour.id,))))
+
+    def test_invalid_page(self):
+        """
+        Test the search page with a bad page number. If yes, answer not found.
+        """
+        response = self.client.get(reverse('polls:search'),
+                                   {'q': 'fav', 'page': 'x'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_out_of_range(self):
+        """
+        Test the search page with a huge page number. If yes, answer not found.
+        """
+        for page in ('0', '99999999999999999999'):
+            response = self.client.get(reverse('polls:search'),
+                                       {'q': 'fav', 'page': page})
+            self.assertEqual(response.status_code, 404)
+
+    def test_admin(self):
+        """
+        Test the admin search. If yes, it matches choices too through the index.
+        """
+        model_admin = LargeQuestionAdmin(Question, AdminSite())
+        queryset, duplicates = model_admin.get_search_results(
+            RequestFactory().get('/'), Question.objects.all(), 'green')
+        self.assertEqual(texts(queryset), ['Favourite colour?'])
+        self.assertIn('polls_question_search', str(queryset.query))
+
+
+@override_settings(POLL_SEARCH_FTS=False)
+class FallbackSearchTests(SearchTests):
+    """
+    Test searching questions with the ORM.
+    """
+    def test_admin(self):
+        """
+        Test the admin search. If yes, it matches the start of question texts only.
+        """
+        model_admin = LargeQuestionAdmin(Question, AdminSite())
+        queryset, duplicates = model_admin.get_search_results(
+            RequestFactory().get('/'), Question.objects.all(), 'green')
+        self.assertFalse(queryset.exists())
+        self.assertNotIn('polls_question_search', str(queryset.query))
+
+
+@skipUnless(connection.vendor == 'sqlite' and sqlite_has_fts5(),
+            "The full-text index needs SQLite with FTS5.")
+class SearchTriggerTests(TestCase):
+    """
+    Test the triggers that keep the full-text index in sync.
+    """
+    def test_triggers_after_migrating(self):
+        """
+        Test the database after every migration. If yes, all triggers of migration 0011 exist.
+
+        Migrations that rebuild polls_question or polls_choice drop them, and
+        must create them again.
+        """
+        migration = importlib.import_module(
+            'polls.migrations.0011_question_search')
+        expected = {match.group(1) for match in (
+            re.match(r'CREATE TRIGGER (\w+)', statement)
+            for statement in migration.CREATE_SEARCH) if match}
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                           "AND tbl_name IN ('polls_question', 'polls_choice')")
+            triggers = {name for name, in cursor.fetchall()}
+        self.assertEqual(len(expected), 6)
+        self.assertLessEqual(expected, triggers)
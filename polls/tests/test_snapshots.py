@@ -0,0 +1,172 @@
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Question
+from polls.snapshots import snapshot_path
+from polls.vote_buffer import VoteBuffer
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+class SnapshotTests(TestCase):
+    """
+    Test snapshots of closed questions.
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(POLL_SNAPSHOT_DIR=directory,
+                                     POLL_SNAPSHOT_MAX_AGE=3600)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches['results'].clear()
+        self.question = create_question(question_text='Closed.', days=-3)
+        self.question.choice_set.create(choice_text='Yes', votes=3)
+        self.question.choice_set.create(choice_text='No', votes=1)
+        self.results = reverse('polls:results', args=(self.question.id,))
+
+    def test_results_from_snapshot(self):
+        """
+        Test results of a closed question twice. If yes, the second comes from the snapshot without queries.
+        """
+        response = self.client.get(self.results)
+        self.assertContains(response, '75.0%')
+        self.assertNotContains(response, 'EventSource')
+        self.assertTrue(os.path.exists(snapshot_path(self.question.id,
+                                                     'html')))
+        with self.assertNumQueries(0):
+            snapshot = self.client.get(self.results)
+        self.assertEqual(snapshot.content, response.content)
+        self.assertIn('max-age=3600', snapshot['Cache-Control'])
+        self.assertIn('public', snapshot['Cache-Control'])
+
+    def test_compressed(self):
+        """
+        Test a snapshot for a client accepting gzip. If yes, serve the compressed copy.
+        """
+        page = self.client.get(self.results).content
+        response = self.client.get(self.results,
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.content), page)
+
+    def test_json_twin(self):
+        """
+        Test results JSON of a closed question. If yes, it comes from its snapshot.
+        """
+        self.client.get(self.results)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:api-results',
+                                               args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['total_votes'], 4)
+
+    def test_not_modified(self):
+        """
+        Test a snapshot the client has. If yes, answer not modified.
+        """
+        self.client.get(self.results)
+        etag = self.client.get(self.results)['ETag']
+        response = self.client.get(self.results, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_open_question(self):
+        """
+        Test results of an open question. If yes, no snapshot is written.
+        """
+        question = create_question(question_text='Open.', days=-1,
+                                   duration=2)
+        self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertFalse(os.path.exists(snapshot_path(question.id, 'html')))
+
+    def test_written_on_close(self):
+        """
+        Test a question closed by the scheduler. If yes, its snapshot is written.
+        """
+        question = create_question(question_text='Open.', days=-1,
+                                   duration=2)
+        Question.objects.filter(pk=question.pk).update(
+            end_date=timezone.now() - datetime.timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.advance_statuses()
+        self.assertTrue(os.path.exists(snapshot_path(question.id, 'json')))
+
+    def test_removed_on_edit(self):
+        """
+        Test editing a choice of a question with a snapshot. If yes, the snapshot is removed.
+        """
+        self.client.get(self.results)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.choice_set.create(choice_text='Maybe')
+        self.assertFalse(os.path.exists(snapshot_path(self.question.id,
+                                                      'html')))
+        self.assertContains(self.client.get(self.results), 'Maybe')
+
+    def test_removed_on_import(self):
+        """
+        Test importing a question with a snapshot again. If yes, the snapshot is removed.
+        """
+        self.client.get(self.results)
+        Question.objects.filter(pk=self.question.pk).update(external_id='q1')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'polls.jsonl')
+        with open(path, 'w') as file:
+            file.write(json.dumps({
+                'external_id': 'q1', 'question_text': 'Imported.',
+                'pub_date': self.question.pub_date.isoformat(),
+                'end_date': self.question.end_date.isoformat(),
+                'choices': ['Yes', 'No']}) + '\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_polls', path, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(snapshot_path(self.question.id,
+                                                      'html')))
+        self.assertContains(self.client.get(self.results), 'Imported.')
+
+    def test_removed_on_buffered_votes(self):
+        """
+        Test buffered votes flushed after the question closed. If yes, the snapshot is removed.
+        """
+        self.client.get(self.results)
+        buffer = VoteBuffer(flush_interval=60000)
+        self.addCleanup(buffer.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            buffer.add_vote(self.question.id,
+                            self.question.choice_set.get(choice_text='No').id)
+        buffer.flush()
+        self.assertFalse(os.path.exists(snapshot_path(self.question.id,
+                                                      'html')))
+        self.assertContains(self.client.get(self.results), '<th>5</th>',
+                            html=True)
+
+    def test_commands(self):
+        """
+        Test the snapshot commands. If yes, write missing snapshots, then rewrite all and drop stale ones.
+        """
+        out = io.StringIO()
+        call_command('snapshot_polls', stdout=out)
+        self.assertIn('Wrote the snapshots of 1 question(s).', out.getvalue())
+        open(snapshot_path(999, 'html'), 'w').close()
+        call_command('rebuild_snapshots', stdout=out)
+        self.assertIn('Wrote the snapshots of 1 question(s) and removed 1.',
+                      out.getvalue())
+        self.assertFalse(os.path.exists(snapshot_path(999, 'html')))
@@ -0,0 +1,113 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls import vote_buffer
+from polls.models import Question, Vote
+from polls.vote_buffer import VoteBuffer, journal_files
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+class VoteBufferTests(TransactionTestCase):
+    """
+    Test buffered voting.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = os.path.join(self.directory, 'vote_journal')
+        self.buffer = VoteBuffer(flush_interval=60000, flush_size=1000,
+                                 journal=self.journal)
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.yes = self.question.choice_set.create(choice_text='Yes')
+        self.no = self.question.choice_set.create(choice_text='No')
+
+    def tearDown(self):
+        self.buffer.stop()
+        shutil.rmtree(self.directory)
+
+    def test_votes_are_written_on_flush(self):
+        """
+        Test buffered votes. If yes, they reach the database only on flush.
+        """
+        for _ in range(3):
+            self.buffer.add_vote(self.question.id, self.yes.id)
+        self.buffer.add_vote(self.question.id, self.no.id)
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.votes, 0)
+        self.assertEqual(self.buffer.flush(), 4)
+        self.yes.refresh_from_db()
+        self.no.refresh_from_db()
+        self.assertEqual((self.yes.votes, self.no.votes), (3, 1))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_vote_view(self):
+        """
+        Test voting through the vote view with the buffer on. If yes, the vote is recorded now and counted on flush.
+        """
+        user = get_user_model().objects.create_user('voter')
+        self.client.force_login(user)
+        with override_settings(VOTE_BUFFER=True), \
+                mock.patch.object(vote_buffer, '_vote_buffer', self.buffer):
+            response = self.client.post(
+                reverse('polls:vote', args=(self.question.id,)),
+                {'choice': self.yes.id})
+        self.assertRedirects(response, reverse('polls:results',
+                                               args=(self.question.id,)),
+                             fetch_redirect_response=False)
+        self.assertTrue(Vote.objects.filter(user=user, choice=self.yes)
+                        .exists())
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.votes, 0)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.yes.refresh_from_db()
+        self.assertEqual(self.yes.votes, 1)
+
+    def test_choice_of_other_question(self):
+        """
+        Test buffering a choice from another question. If yes, it is rejected.
+        """
+        other = create_question(question_text='Other.', days=-1, duration=2)
+        self.assertFalse(self.buffer.add_vote(other.id, self.yes.id))
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_journal_is_removed_after_flush(self):
+        """
+        Test the journal. If yes, flushed votes are not left in it.
+        """
+        self.buffer.add_vote(self.question.id, self.yes.id)
+        self.assertEqual(len(journal_files(self.journal)), 1)
+        self.buffer.flush()
+        self.assertEqual(journal_files(self.journal), [])
+
+    def test_replay_journal(self):
+        """
+        Test replaying the journal of votes that were never flushed.
+        """
+        for _ in range(2):
+            self.buffer.add_vote(self.question.id, self.yes.id)
+        self.buffer.add_vote(self.question.id, self.no.id)
+        # Forget the buffered votes as if the process had crashed.
+        self.buffer = VoteBuffer(journal=self.journal)
+        call_command('replay_vote_journal', journal=self.journal,
+                     stdout=open(os.devnull, 'w'))
+        self.yes.refresh_from_db()
+        self.no.refresh_from_db()
+        self.assertEqual((self.yes.votes, self.no.votes), (2, 1))
+        self.assertEqual(journal_files(self.journal), [])
@@ -0,0 +1,74 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from polls.models import Choice, ChoiceVoteShard, Question
+
+
+def create_question(question_text, days, duration=1):
+    """
+    Create a question with the given question_text, given number of days offset to now.
+    """
+    time = timezone.now() + datetime.timedelta(days=days)
+    end = time + datetime.timedelta(days=duration)
+    return Question.objects.create(question_text=question_text,
+                                   pub_date=time, end_date=end)
+
+
+@override_settings(VOTE_SHARDS=8)
+class VoteShardTests(TestCase):
+    """
+    Test sharded vote counting.
+    """
+    def setUp(self):
+        self.question = create_question(question_text='Question.', days=-1,
+                                        duration=2)
+        self.choice = self.question.choice_set.create(choice_text='Yes',
+                                                      votes=5)
+
+    def test_votes_go_to_shards(self):
+        """
+        Test voting with shards. If yes, Choice.votes is not written.
+        """
+        url = reverse('polls:vote', args=(self.question.id,))
+        User = get_user_model()
+        for number in range(40):
+            self.client.force_login(
+                User.objects.create(username='voter{}'.format(number)))
+            self.client.post(url, {'choice': self.choice.id})
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 5)
+        shards = ChoiceVoteShard.objects.filter(choice=self.choice)
+        self.assertLessEqual(shards.count(), 8)
+        self.assertEqual(sum(shard.count for shard in shards), 40)
+
+    def test_total_votes(self):
+        """
+        Test total votes. If yes, it adds the shards to Choice.votes.
+        """
+        ChoiceVoteShard.objects.create(choice=self.choice, shard_no=0, count=2)
+        ChoiceVoteShard.objects.create(choice=self.choice, shard_no=3, count=4)
+        choice = Choice.objects.with_totals().get(pk=self.choice.pk)
+        self.assertEqual(choice.total_votes, 11)
+
+    def test_results_show_total_votes(self):
+        """
+        Test results page. If yes, it shows the total votes of each choice.
+        """
+        ChoiceVoteShard.objects.create(choice=self.choice, shard_no=1, count=7)
+        self.question.choice_set.create(choice_text='No')
+        response = self.client.get(reverse('polls:results',
+                                           args=(self.question.id,)))
+        self.assertContains(response, '<td>12</td>', html=True)
+        self.assertContains(response, '<td>0</td>', html=True)
+
+    def test_choice_of_other_question(self):
+        """
+        Test voting with a choice from another question. If yes, nothing is counted.
+        """
+        other = create_question(question_text='Other.', days=-1, duration=2)
+        self.assertFalse(ChoiceVoteShard.objects.add_vote(other.id,
+                                                          self.choice.id, 8))
+        self.assertFalse(ChoiceVoteShard.objects.exists())
@@ -1,10 +1,13 @@
 import datetime
+import threading
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
-from polls.models import Question
+from polls.models import Question, Vote
 
 
 def create_question(question_text, days, duration=1):
@@ -31,10 +34,139 @@ class VotingTests(TestCase):
     def test_vote_with_authentication(self):
         self.client.login(username="Daniel", password="abc007")
         question = create_question(question_text='Past Question.', days=-5)
-        response = self.client.get(reverse('polls:vote', args=question.id))
+        response = self.client.get(reverse('polls:vote', args=(question.id,)))
         self.assertEqual(response.status_code, 200)
 
     def test_vote_with_no_authentication(self):
         question = create_question(question_text='Past Question.', days=-5)
-        response = self.client.get(reverse('polls:vote', args=question.id))
-        self.assertEqual(response.status_code, 302)
\ No newline at end of file
+        response = self.client.get(reverse('polls:vote', args=(question.id,)))
+        self.assertEqual(response.status_code, 302)
+
+    def test_vote_is_recorded(self):
+        """
+        Test voting. If yes, the vote of the user is recorded and counted.
+        """
+        self.client.login(username="Daniel", password="abc007")
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        self.client.post(reverse('polls:vote', args=(question.id,)),
+                         {'choice': choice.id})
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 1)
+        vote = Vote.objects.get(question=question)
+        self.assertEqual((vote.user.username, vote.choice), ("Daniel", choice))
+        response = self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertContains(response, "Current Vote: Yes")
+
+    def test_vote_again_for_same_choice(self):
+        """
+        Test voting twice for the same choice. If yes, it is counted once.
+        """
+        self.client.login(username="Daniel", password="abc007")
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        url = reverse('polls:vote', args=(question.id,))
+        self.client.post(url, {'choice': choice.id})
+        self.client.post(url, {'choice': choice.id})
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 1)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_vote_again_writes_nothing(self):
+        """
+        Test casting the same vote again. If yes, no row is updated.
+        """
+        user = get_user_model().objects.get(username="Daniel")
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        Vote.objects.cast(user, question.id, choice.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(Vote.objects.cast(user, question.id, choice.id))
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('UPDATE')])
+
+    def test_change_vote(self):
+        """
+        Test voting for another choice. If yes, the vote moves to the new choice.
+        """
+        self.client.login(username="Daniel", password="abc007")
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        yes = question.choice_set.create(choice_text='Yes')
+        no = question.choice_set.create(choice_text='No')
+        url = reverse('polls:vote', args=(question.id,))
+        self.client.post(url, {'choice': yes.id})
+        self.client.post(url, {'choice': no.id})
+        yes.refresh_from_db()
+        no.refresh_from_db()
+        self.assertEqual((yes.votes, no.votes), (0, 1))
+        self.assertEqual(Vote.objects.get(question=question).choice, no)
+
+
+# Every test client has the same IP address.
+@override_settings(VOTE_RATE_LIMIT_IP=0)
+class ConcurrentVotingTests(TransactionTestCase):
+    """
+    Test voting from many clients at the same time.
+    """
+    def test_parallel_votes_are_not_lost(self):
+        """
+        Test hundreds of parallel votes. If yes, every vote is counted.
+        """
+        question = create_question(question_text='Hot Question.', days=-1,
+                                   duration=2)
+        choice = question.choice_set.create(choice_text='Yes')
+        url = reverse('polls:vote', args=(question.id,))
+        workers, votes_per_worker = 20, 10
+        User = get_user_model()
+        User.objects.bulk_create(User(username='voter{}'.format(number))
+                                 for number in range(workers * votes_per_worker))
+        clients = []
+        for user in User.objects.all():
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        barrier = threading.Barrier(workers)
+        status_codes = []
+
+        def cast_votes(clients):
+            barrier.wait()
+            for client in clients:
+                response = client.post(url, {'choice': choice.id})
+                status_codes.append(response.status_code)
+            connection.close()
+
+        threads = [threading.Thread(target=cast_votes,
+                                    args=(clients[number::workers],))
+                   for number in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        choice.refresh_from_db()
+        self.assertEqual(status_codes, [302] * workers * votes_per_worker)
+        self.assertEqual(choice.votes, workers * votes_per_worker)
+        self.assertEqual(Vote.objects.count(), workers * votes_per_worker)
+
+    def test_vote_for_choice_of_other_question(self):
+        """
+        Test voting with a choice from another question. If yes, nothing is counted.
+        """
+        User = get_user_model()
+        self.client.force_login(User.objects.create(username='voter'))
+        question = create_question(question_text='Question.', days=-1,
+                                   duration=2)
+        other = create_question(question_text='Other Question.', days=-1,
+                                duration=2)
+        choice = other.choice_set.create(choice_text='Yes')
+        response = self.client.post(reverse('polls:vote', args=(question.id,)),
+                                    {'choice': choice.id})
+        self.assertEqual(response.context['error_message'],
+                         "You didn't select a choice.")
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 0)
+        self.assertFalse(Vote.objects.exists())
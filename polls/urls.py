@@ -1,11 +1,31 @@
-from django.urls import path
-
-from . import views
-
-app_name = 'polls'
-urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
-    path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote'),
-]
+from django.conf import settings
+from django.urls import path
+
+from . import api, views
+from .replicas import replica_reads
+from .snapshots import serves_snapshot
+
+app_name = 'polls'
+urlpatterns = [
+    path('', replica_reads(views.IndexView.as_view()), name='index'),
+    path('search/', replica_reads(views.SearchView.as_view()),
+         name='search'),
+    path('<int:pk>/', replica_reads(views.DetailView.as_view()),
+         name='detail'),
+    path('<int:pk>/results/', replica_reads(
+        serves_snapshot('html')(views.ResultsView.as_view())),
+        name='results'),
+    path('<int:question_id>/vote/',
+         views.vote_async if settings.ASYNC_VOTE else views.vote,
+         name='vote'),
+    path('<int:pk>/events/', views.events, name='events'),
+    path('api/questions/', replica_reads(api.QuestionListJson.as_view()),
+         name='api-questions'),
+    path('api/questions/<int:pk>/results/', replica_reads(
+        serves_snapshot('json')(api.ResultsJson.as_view())),
+        name='api-results'),
+    path('api/questions/<int:pk>/history/', replica_reads(
+        api.HistoryJson.as_view()), name='api-history'),
+    path('api/export/<str:table>.<str:format>', api.export,
+         name='api-export'),
+]
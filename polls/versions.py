@@ -0,0 +1,135 @@
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Choice, Question
+from .replicas import pinned_to_primary
+from .signals import votes_changed
+
+INDEX_KEY = 'polls:index-stamp'
+
+
+def _cache():
+    # Stamps share the staleness window of the results cache.
+    return caches['results']
+
+
+def question_key(question_id):
+    return 'polls:stamp:{}'.format(question_id)
+
+
+def votes_key(question_id):
+    return 'polls:votes-stamp:{}'.format(question_id)
+
+
+def question_stamp(question_id):
+    """
+    Return (version, modified) of a published question, or None.
+
+    The version changes when the question or its choices are edited and
+    when its status changes, not on votes, see votes_stamp(). The stamp is
+    read from the cache, or with one query when it is cold. Clients pinned
+    to the primary always query it, as the cache may hold a stamp read from
+    a lagging replica.
+    """
+    stamp = None if pinned_to_primary() \
+        else _cache().get(question_key(question_id))
+    if stamp is None:
+        stamp = Question.objects.published().filter(pk=question_id)\
+            .values_list('version', 'modified').first()
+        if stamp is not None:
+            _cache().set(question_key(question_id), stamp)
+    return stamp
+
+
+def votes_stamp(question_id):
+    """
+    Return (token, changed) identifying the vote counts of a question.
+
+    Votes do not bump the version of the question, as that would write the
+    question row on every vote. Instead a new random token is made when
+    this process counts votes of the question, and when the cached one
+    expires, so votes counted by other processes show within the timeout
+    of the results cache. Clients pinned to the primary get a new token
+    every time, as their own vote may have been counted by another process.
+    Making one costs no query.
+    """
+    if pinned_to_primary():
+        return uuid.uuid4().hex, timezone.now()
+    cache = _cache()
+    stamp = cache.get(votes_key(question_id))
+    if stamp is None:
+        stamp = (uuid.uuid4().hex, timezone.now())
+        cache.set(votes_key(question_id), stamp)
+    return stamp
+
+
+def index_stamp():
+    """
+    Return (token, created) identifying the current state of the index.
+
+    A new random token is made whenever a question is edited, and when the
+    next question opens or closes, so the token only stays the same while
+    the index can not change. Making one costs one query.
+    """
+    cache = _cache()
+    stamp = cache.get(INDEX_KEY)
+    if stamp is None:
+        now = timezone.now()
+        opens = Question.objects.filter(pub_date__gt=now)\
+            .order_by('pub_date').values('pub_date')[:1]
+        closes = Question.objects.filter(end_date__gte=now)\
+            .order_by('end_date').values('end_date')[:1]
+        # Both subqueries are answered from an index in one query.
+        upcoming = Question.objects.annotate(
+            opens=Subquery(opens), closes=Subquery(closes))\
+            .values_list('opens', 'closes').first() or ()
+        timeout = cache.default_timeout
+        for moment in upcoming:
+            if moment is not None:
+                seconds = (moment - now).total_seconds()
+                timeout = seconds if timeout is None else min(timeout, seconds)
+        stamp = (uuid.uuid4().hex, now)
+        cache.set(INDEX_KEY, stamp, timeout)
+    return stamp
+
+
+def forget_stamps(question_ids, index=False):
+    """
+    Drop cached stamps once the current transaction commits.
+    """
+    keys = [question_key(pk) for pk in question_ids]
+    if index:
+        keys.append(INDEX_KEY)
+    transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+@receiver(votes_changed)
+def forget_voted_stamps(sender, question_ids, **kwargs):
+    """
+    Drop the vote stamps of questions whose votes changed.
+    """
+    _cache().delete_many([votes_key(pk) for pk in question_ids])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def bump_question_version(sender, instance, **kwargs):
+    """
+    Bump the version of an edited question and renew the index stamp.
+    """
+    Question.objects.touch([instance.pk])
+    forget_stamps([instance.pk], index=True)
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def bump_choice_question_version(sender, instance, **kwargs):
+    """
+    Bump the version of the question of an edited choice.
+    """
+    Question.objects.touch([instance.question_id])
+    forget_stamps([instance.question_id])
@@ -1,109 +1,491 @@
-from django.http import HttpResponseRedirect
-from django.shortcuts import get_object_or_404, render, redirect
-from django.urls import reverse
-from django.views import generic
-from django.utils import timezone
-from django.contrib import messages
-from .models import Choice, Question
-from django.contrib.auth import user_logged_in, user_logged_out, user_login_failed
-from django.dispatch import receiver
-
-import logging
-logging.basicConfig(level=logging.INFO)
-log = logging.getLogger("polls")
-
-
-class IndexView(generic.ListView):
-    """
-    View for index.
-    """
-    template_name = 'polls/index.html'
-    context_object_name = 'latest_question_list'
-
-    def get_queryset(self):
-        """
-        Return the last published questions.
-        """
-        return Question.objects.filter(pub_date__lte=timezone.now())\
-            .order_by('-pub_date')
-
-
-class DetailView(generic.DetailView):
-    """
-    View for detail.
-    """
-    model = Question
-    template_name = 'polls/detail.html'
-
-    def get_queryset(self):
-        """
-        Return published questions.
-        """
-        return Question.objects.filter(pub_date__lte=timezone.now())
-
-
-class ResultsView(generic.DetailView):
-    """
-    View for results.
-    """
-    model = Question
-    template_name = 'polls/results.html'
-
-
-def vote(request, question_id):
-    """
-    View for vote.
-    """
-    question = get_object_or_404(Question, pk=question_id)
-    try:
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-    except (KeyError, Choice.DoesNotExist):
-        return render(request, 'polls/detail.html', {
-            'question': question,
-            'error_message': "You didn't select a choice."})
-    else:
-        if question.can_vote():
-            selected_choice.votes += 1
-            selected_choice.save()
-            return HttpResponseRedirect(
-                reverse('polls:results', args=(question.id,))
-            )
-        else:
-            messages.error(request, "Voting is not allowed.")
-            return redirect('polls:index')
-
-
-@receiver(user_logged_in)
-def throw_login(sender, **kwargs):
-    """
-    Appears when logging in successfully.
-    """
-    log.info("You have successfully logged in.")
-
-
-@receiver(user_logged_out)
-def throw_logout(sender, **kwargs):
-    """
-    Appears when logging out successfully.
-    """
-    log.info("You have successfully logged out.")
-
-
-@receiver(user_login_failed)
-def throw_login_failed(sender, credentials, **kwargs):
-    """
-    Appears when logging in unsuccessfully.
-    """
-    log.warning("You have unsuccessfully logged in.")
-
-
-def get_client_ip(request):
-    """
-    Get ip address from client.
-    """
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
\ No newline at end of file
+import asyncio
+import contextvars
+import datetime
+import functools
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DEFAULT_DB_ALIAS, close_old_connections
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import generic
+from django.views.decorators.http import condition
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.conf import settings
+from .models import Choice, Question, Vote
+from . import snapshots
+from .ratelimit import rate_limit
+from .replicas import pinned_to_primary
+from .results_cache import results_cache
+from .search import MAX_OFFSET, search_questions
+from .versions import index_stamp, question_stamp, votes_stamp
+from .vote_buffer import get_vote_buffer
+from django.contrib.auth import user_logged_in, user_logged_out, user_login_failed
+from django.dispatch import receiver
+
+import logging
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("polls")
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(question):
+    """
+    Return the index page cursor that points after the question.
+    """
+    micros = (question.pub_date - EPOCH) // datetime.timedelta(microseconds=1)
+    return '{}-{}'.format(micros, question.pk)
+
+
+def decode_cursor(cursor):
+    """
+    Return the publish date and id encoded in an index page cursor.
+    """
+    try:
+        micros, pk = (int(part) for part in cursor.split('-'))
+        return EPOCH + datetime.timedelta(microseconds=micros), pk
+    except (ValueError, OverflowError):
+        raise Http404("Invalid page.")
+
+
+def personal(request):
+    """
+    Return the part of validators that depends on who is asking.
+
+    Return None if the page shows pending messages, which are only shown
+    once and must never be answered with 304.
+    """
+    if messages.get_messages(request):
+        return None
+    return request.user.pk or 0
+
+
+def url_name(request):
+    """
+    Return the name of the URL requested, which starts its ETags.
+
+    The JSON API reuses the conditions of the pages, and its own URL names
+    keep its ETags apart from theirs.
+    """
+    return request.resolver_match.url_name
+
+
+def index_etag(request, *args, **kwargs):
+    """
+    Return the ETag of the index.
+    """
+    user = personal(request)
+    if user is None:
+        return None
+    return '"{}-{}-{}"'.format(url_name(request), index_stamp()[0], user)
+
+
+def index_last_modified(request, *args, **kwargs):
+    """
+    Return when the index last changed, for anonymous users.
+    """
+    if personal(request) != 0:
+        return None
+    return index_stamp()[1]
+
+
+def csrf_digest(request):
+    """
+    Return a digest of the CSRF cookie, whose secret the vote form embeds.
+    """
+    secret = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return hashlib.md5(secret.encode()).hexdigest()[:12]
+
+
+def detail_etag(request, pk):
+    """
+    Return the ETag of the detail of a question.
+
+    Only users who can vote see their current vote on it, so only their
+    ETag changes with the votes. The CSRF secret, which is rotated on
+    login, is part of it, so a cached vote form never has a stale token.
+    """
+    stamp = question_stamp(pk)
+    user = personal(request)
+    if stamp is None or user is None:
+        return None
+    if user:
+        return '"detail-{}-{}-{}-{}-{}"'.format(
+            pk, stamp[0], votes_stamp(pk)[0], user, csrf_digest(request))
+    return '"detail-{}-{}-0-{}"'.format(pk, stamp[0], csrf_digest(request))
+
+
+def detail_last_modified(request, pk):
+    """
+    Return when the detail of a question last changed, for anonymous users.
+    """
+    stamp = question_stamp(pk)
+    if stamp is None or personal(request) != 0:
+        return None
+    return stamp[1]
+
+
+def results_etag(request, pk):
+    """
+    Return the ETag of the results of a question.
+    """
+    stamp = question_stamp(pk)
+    return stamp and '"{}-{}-{}-{}"'.format(url_name(request), pk, stamp[0],
+                                            votes_stamp(pk)[0])
+
+
+def results_last_modified(request, pk):
+    """
+    Return when the results of a question last changed.
+    """
+    stamp = question_stamp(pk)
+    return stamp and max(stamp[1], votes_stamp(pk)[1])
+
+
+@method_decorator(condition(index_etag, index_last_modified), name='dispatch')
+class IndexView(generic.ListView):
+    """
+    View for index.
+    """
+    template_name = 'polls/index.html'
+    context_object_name = 'latest_question_list'
+    page_size = 20
+
+    def get_queryset(self):
+        """
+        Return one page of the last published questions.
+
+        Pages use keyset pagination on (-pub_date, -id), so a deep page is as
+        cheap as the first one. Whether each question can be voted on comes
+        from its status.
+        """
+        questions = Question.objects.published().with_votable()\
+            .order_by('-pub_date', '-id')
+        cursor = self.request.GET.get('after')
+        if cursor:
+            pub_date, pk = decode_cursor(cursor)
+            # Written as a range on pub_date, which the index can serve,
+            # instead of the equivalent OR of two conditions.
+            questions = questions.filter(pub_date__lte=pub_date)\
+                .exclude(pub_date=pub_date, pk__gte=pk)
+        page = list(questions[:self.page_size + 1])
+        self.next_cursor = None
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_cursor = encode_cursor(page[-1])
+        return page
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the cursor of the next page.
+        """
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+
+class SearchView(generic.ListView):
+    """
+    View for search.
+    """
+    template_name = 'polls/search.html'
+    context_object_name = 'question_list'
+
+    def get_queryset(self):
+        """
+        Return one page of the published questions matching the words of q,
+        best first.
+
+        Pages are numbered from 1 and POLL_SEARCH_PAGE_SIZE long, and end
+        at MAX_OFFSET results. One more question is fetched to tell whether
+        there is a next page.
+        """
+        self.query = self.request.GET.get('q', '').strip()
+        try:
+            self.page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404("Invalid page.")
+        size = settings.POLL_SEARCH_PAGE_SIZE
+        offset = (self.page - 1) * size
+        if not 0 <= offset <= MAX_OFFSET:
+            raise Http404("Invalid page.")
+        questions = search_questions(self.query, offset, size + 1)
+        self.has_next = len(questions) > size and offset + size <= MAX_OFFSET
+        return questions[:size]
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the query and the numbers of the previous and next pages.
+        """
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        context['previous_page'] = self.page - 1 if self.page > 1 else None
+        context['next_page'] = self.page + 1 if self.has_next else None
+        return context
+
+
+@method_decorator(condition(detail_etag, detail_last_modified),
+                  name='dispatch')
+class DetailView(generic.DetailView):
+    """
+    View for detail.
+    """
+    model = Question
+    template_name = 'polls/detail.html'
+
+    def get_queryset(self):
+        """
+        Return published questions.
+
+        The choices are read by the template only when its cached fragment
+        of them is missing.
+        """
+        return Question.objects.published()
+
+    def get_context_data(self, **kwargs):
+        """
+        Add the current vote of the user.
+        """
+        context = super().get_context_data(**kwargs)
+        if self.request.user.is_authenticated:
+            context['current_vote'] = Choice.objects.filter(
+                vote__user=self.request.user,
+                vote__question=self.object).first()
+        return context
+
+
+@method_decorator(condition(results_etag, results_last_modified),
+                  name='dispatch')
+class ResultsView(generic.DetailView):
+    """
+    View for results.
+    """
+    model = Question
+    template_name = 'polls/results.html'
+
+    def get_queryset(self):
+        """
+        Return published questions with their choices and total votes.
+        """
+        return Question.objects.published().with_results()
+
+    def get_object(self, queryset=None):
+        """
+        Return the question with its results, from the results cache if possible.
+
+        Each choice gets its share of all votes as percentage and the
+        question gets total_votes, so the cached entry needs no more work.
+        """
+        if not pinned_to_primary():
+            # A client pinned to the primary must see its own vote, which
+            # entries filled from a lagging replica may not have.
+            question = results_cache.get(self.kwargs[self.pk_url_kwarg])
+            if question is not None:
+                return question
+        question = super().get_object(queryset)
+        question.count_results()
+        results_cache.set(question)
+        # Results read from a replica may lack the last votes.
+        if question.status == Question.CLOSED \
+                and question._state.db == DEFAULT_DB_ALIAS:
+            snapshots.save(question)
+        return question
+
+
+def get_client_ip(request):
+    """
+    Get ip address from client.
+
+    Behind TRUSTED_PROXIES proxies, it is the X-Forwarded-For hop added by
+    the farthest of them, that many hops from the right; the hops left of
+    it are sent by the client, who can write anything there. Otherwise it
+    is REMOTE_ADDR.
+    """
+    hops = [hop.strip() for hop in
+            request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    proxies = settings.TRUSTED_PROXIES
+    if proxies and len(hops) >= proxies and hops[-proxies]:
+        return hops[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def get_session_key(request):
+    """
+    Get the session key from the cookie, without loading the session.
+    """
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+
+def get_user_id(request):
+    """
+    Get the id of the logged-in user.
+    """
+    return str(request.user.pk)
+
+
+# Logged-in voters are first told apart by their session, which unlike the
+# user needs no query, so most rejected votes never reach the database.
+vote_rate_limit = rate_limit([
+    ('ip', get_client_ip, 'VOTE_RATE_LIMIT_IP'),
+    ('session', get_session_key, 'VOTE_RATE_LIMIT_USER'),
+], 'VOTE_RATE_LIMIT_WINDOW')
+
+# Once the user is loaded, votes are counted by user too, so logging in
+# again for a new session does not reset the limit.
+vote_user_rate_limit = rate_limit([
+    ('user', get_user_id, 'VOTE_RATE_LIMIT_USER'),
+], 'VOTE_RATE_LIMIT_WINDOW')
+
+
+@vote_rate_limit
+@login_required
+@vote_user_rate_limit
+def vote(request, question_id):
+    """
+    View for vote.
+    """
+    question = get_object_or_404(Question, pk=question_id)
+    try:
+        choice_id = int(request.POST['choice'])
+    except (KeyError, ValueError):
+        return render(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice."})
+    if not question.can_vote():
+        messages.error(request, "Voting is not allowed.")
+        return redirect('polls:index')
+    if not Vote.objects.cast(request.user, question.id, choice_id,
+                             get_vote_buffer()):
+        return render(request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice."})
+    return HttpResponseRedirect(
+        reverse('polls:results', args=(question.id,))
+    )
+
+
+_database_executor = None
+_database_executor_lock = threading.Lock()
+
+
+def database_executor():
+    """
+    Return the pool of ASYNC_VOTE_THREADS threads for database work of async views.
+    """
+    global _database_executor
+    with _database_executor_lock:
+        if _database_executor is None:
+            _database_executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_VOTE_THREADS,
+                thread_name_prefix='polls-database')
+    return _database_executor
+
+
+def with_old_connections_closed(function, *args, **kwargs):
+    """
+    Call a function, closing the broken connections and those older than
+    CONN_MAX_AGE of this thread before and after, as Django does around
+    each request.
+    """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def in_database_thread(function, *args, **kwargs):
+    """
+    Run a function that uses the database in the database thread pool.
+
+    It runs in a copy of the context of the caller, so the database routing
+    of the request applies, and the pool threads keep no connection past
+    CONN_MAX_AGE.
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        database_executor(), functools.partial(
+            contextvars.copy_context().run, with_old_connections_closed,
+            function, *args, **kwargs))
+
+
+@vote_rate_limit
+async def vote_async(request, question_id):
+    """
+    View for vote under ASGI.
+
+    Works like vote(), but waits for the database without holding a thread.
+    The database work runs in a pool of ASYNC_VOTE_THREADS threads, which
+    also bounds how many votes the database handles at once.
+    """
+    if not await in_database_thread(lambda: request.user.is_authenticated):
+        return redirect_to_login(request.get_full_path())
+    return await _vote_async(request, question_id)
+
+
+@vote_user_rate_limit
+async def _vote_async(request, question_id):
+    """
+    Count the vote of the logged-in user of vote_async().
+    """
+    question = await in_database_thread(get_object_or_404, Question,
+                                        pk=question_id)
+    try:
+        choice_id = int(request.POST['choice'])
+    except (KeyError, ValueError):
+        return await in_database_thread(render, request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice."})
+    if not question.can_vote():
+        messages.error(request, "Voting is not allowed.")
+        return redirect('polls:index')
+    if not await in_database_thread(Vote.objects.cast, request.user,
+                                    question.id, choice_id,
+                                    get_vote_buffer()):
+        return await in_database_thread(render, request, 'polls/detail.html', {
+            'question': question,
+            'error_message': "You didn't select a choice."})
+    return HttpResponseRedirect(
+        reverse('polls:results', args=(question.id,))
+    )
+
+
+def events(request, pk):
+    """
+    View for results events under WSGI.
+
+    The events are streamed by the ASGI application only. Answer 204, which
+    tells browsers to stop reconnecting.
+    """
+    return HttpResponse(status=204)
+
+
+@receiver(user_logged_in)
+def throw_login(sender, **kwargs):
+    """
+    Appears when logging in successfully.
+    """
+    log.info("You have successfully logged in.")
+
+
+@receiver(user_logged_out)
+def throw_logout(sender, **kwargs):
+    """
+    Appears when logging out successfully.
+    """
+    log.info("You have successfully logged out.")
+
+
+@receiver(user_login_failed)
+def throw_login_failed(sender, credentials, **kwargs):
+    """
+    Appears when logging in unsuccessfully.
+    """
+    log.warning("You have unsuccessfully logged in.")
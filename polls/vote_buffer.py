@@ -0,0 +1,217 @@
+import atexit
+import glob
+import itertools
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Choice
+from .signals import votes_changed
+
+log = logging.getLogger("polls")
+
+
+class VoteBuffer:
+    """
+    Collect votes in memory and write them to the database in batches.
+
+    Votes are counted per (question id, choice id) and flushed to
+    ``Choice.votes`` every ``flush_interval`` milliseconds or as soon as
+    ``flush_size`` votes are waiting. When ``journal`` is set, every vote
+    is also appended to a journal file of this process first, so votes
+    that were never flushed can be replayed after a crash.
+    """
+
+    def __init__(self, flush_interval=500, flush_size=1000, journal=None,
+                 fsync=False):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.journal = journal
+        self.fsync = fsync
+        self._pending = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._journal_file = None
+        self._segments = itertools.count(1)
+
+    def add_vote(self, question_id, choice_id, count=1):
+        """
+        Buffer count votes (one by default) for a choice of the question.
+
+        Inside a transaction the votes are buffered once it commits. Return
+        True if the choice belongs to the question.
+        """
+        if not Choice.objects.filter(pk=choice_id,
+                                     question_id=question_id).exists():
+            return False
+        transaction.on_commit(
+            lambda: self._buffer((question_id, choice_id), count))
+        return True
+
+    def _buffer(self, key, count):
+        with self._lock:
+            self._write_journal({key: count})
+            self._pending[key] = self._pending.get(key, 0) + count
+            self._size += abs(count)
+            full = self._size >= self.flush_size
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write all buffered votes to the database. Return the number of votes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                segment = self._close_journal()
+                pending, self._pending, self._size = self._pending, {}, 0
+            if not pending:
+                self._remove(segment)
+                return 0
+            counts = {}
+            for (question_id, choice_id), count in pending.items():
+                counts[choice_id] = counts.get(choice_id, 0) + count
+            question_ids = sorted({question_id for question_id, _ in pending})
+            try:
+                with transaction.atomic():
+                    Choice.objects.add_votes(counts)
+            except Exception:
+                log.exception("Could not flush %d buffered votes.",
+                              sum(counts.values()))
+                with self._lock:
+                    self._write_journal(pending)
+                    for key, count in pending.items():
+                        self._pending[key] = self._pending.get(key, 0) + count
+                        self._size += abs(count)
+                self._remove(segment)
+                return 0
+            self._remove(segment)
+            votes_changed.send(sender=Choice, question_ids=question_ids)
+            return sum(counts.values())
+
+    def stop(self):
+        """
+        Stop the background flusher and flush what is left.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _start(self):
+        """
+        Start the background flusher on the first vote.
+        """
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='vote-buffer',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+        Flush every flush_interval milliseconds or when the buffer is full.
+        """
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval / 1000)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Vote buffer flush failed.")
+        connection.close()
+
+    def _write_journal(self, pending):
+        """
+        Append votes to the journal of this process. Call with _lock held.
+        """
+        if not self.journal:
+            return
+        if self._journal_file is None:
+            path = '{}.{}'.format(self.journal, os.getpid())
+            self._journal_file = open(path, 'a')
+        for (question_id, choice_id), count in pending.items():
+            self._journal_file.write(
+                '{} {} {}\n'.format(question_id, choice_id, count))
+        self._journal_file.flush()
+        if self.fsync:
+            os.fsync(self._journal_file.fileno())
+
+    def _close_journal(self):
+        """
+        Close the current journal and return its new segment name.
+
+        Call with _lock held. The segment is removed once its votes are
+        committed, so only unflushed votes are ever left on disk.
+        """
+        if self._journal_file is None:
+            return None
+        path = self._journal_file.name
+        self._journal_file.close()
+        self._journal_file = None
+        segment = '{}.{}'.format(path, next(self._segments))
+        os.replace(path, segment)
+        return segment
+
+    @staticmethod
+    def _remove(segment):
+        if segment is not None:
+            os.remove(segment)
+
+
+def journal_files(journal):
+    """
+    Return every journal file and segment left by vote buffers.
+    """
+    return sorted(glob.glob(glob.escape(journal) + '.*'))
+
+
+def read_journal(path):
+    """
+    Return a mapping of choice id to votes recorded in a journal file.
+    """
+    counts = {}
+    with open(path) as journal:
+        for line in journal:
+            fields = line.split()
+            if len(fields) != 3:
+                # A partly written last line of a crashed process.
+                continue
+            choice_id, count = int(fields[1]), int(fields[2])
+            counts[choice_id] = counts.get(choice_id, 0) + count
+    return counts
+
+
+_vote_buffer = None
+_vote_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer():
+    """
+    Return the vote buffer of this process, or None if it is disabled.
+    """
+    global _vote_buffer
+    if not settings.VOTE_BUFFER:
+        return None
+    with _vote_buffer_lock:
+        if _vote_buffer is None:
+            _vote_buffer = VoteBuffer(
+                flush_interval=settings.VOTE_BUFFER_FLUSH_INTERVAL,
+                flush_size=settings.VOTE_BUFFER_FLUSH_SIZE,
+                journal=settings.VOTE_BUFFER_JOURNAL,
+                fsync=settings.VOTE_BUFFER_FSYNC)
+            if settings.VOTE_BUFFER_FLUSH_ON_EXIT:
+                atexit.register(_vote_buffer.stop)
+    return _vote_buffer